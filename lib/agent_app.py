@@ -3,9 +3,24 @@
 """
 
 import streamlit as st
-from langchain_core.messages import HumanMessage
-from rag_app import show_retriever_app
-from renault_agent import finance_agent_executor
+from app_views import show_rag_response
+from service_client import get_service_client
+
+# With RAG_SERVICE_URL set, the app is a thin client of the retrieval service
+# (rag_service.py), which runs the agent, the retriever and the models: the RAG
+# stack is only imported when this process runs them.
+client = get_service_client()
+if client is None:
+    from langchain_core.messages import HumanMessage
+    from rag_app import show_retriever_app
+    from renault_agent import get_finance_agent_executor
+    from market_store import market_store
+    from tracing import start_metrics_server
+
+    # The agent tools read the local market-data store, kept fresh in the background.
+    market_store.start_background_refresh()
+    # With TRACING enabled, metrics and recent traces are served on METRICS_PORT.
+    start_metrics_server()
 
 st.set_page_config(page_title="Renault QA Agent", layout="wide")
 
@@ -26,12 +41,18 @@ if question:
     with st.spinner("Processing..."):
         st.subheader("1/ Answer generation with Renault Agent")
         # Run agent
-        response = finance_agent_executor.invoke(
-            {"messages": [HumanMessage(content=question)]}
-        )
+        if client is not None:
+            response = client.agent(question)
+        else:
+            response = get_finance_agent_executor().invoke(
+                {"messages": [HumanMessage(content=question)]}
+            )
 
         # Show Answer
         st.markdown(response.get("output", "No answer found."))
     with st.spinner("Processing..."):
         st.subheader("2/ Answer generation with RAG without agentic module")
-        show_retriever_app(question)
+        if client is not None:
+            show_rag_response(client.answer(question))
+        else:
+            show_retriever_app(question)
@@ -0,0 +1,123 @@
+"""
+    AgentExecutor running the tool calls of one agent step concurrently.
+
+    A tool-calling model often asks for several independent tools at once (company
+    information, calendar, news...). AgentExecutor runs them one after another; this
+    executor runs them in a thread pool, so a step takes as long as its slowest tool.
+    (The async path, `ainvoke`, already gathers the tool calls.)
+"""
+
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.tools import BaseTool
+from pydantic import PrivateAttr
+
+from config.logger import logger
+from config.settings import AGENT_TOOL_WORKERS
+from tracing import run_in_context, tracer
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor whose tool calls within a step run concurrently.
+
+    Observations are returned in the order of the actions, as with AgentExecutor.
+    The latency of every tool call is logged and accumulated in `tool_latencies`, and
+    with TRACING enabled each call is a span of the agent's trace (see tracing.py).
+    """
+
+    max_workers: int = AGENT_TOOL_WORKERS
+    _pool: Optional[ThreadPoolExecutor] = PrivateAttr(default=None)
+    _pool_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _latencies: Dict[str, List[float]] = PrivateAttr(default_factory=lambda: defaultdict(list))
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="agent-tool")
+            return self._pool
+
+    @property
+    def tool_latencies(self) -> Dict[str, List[float]]:
+        return self._latencies
+
+    def _call(self, inputs: Dict[str, str], run_manager: Optional[CallbackManagerForChainRun] = None) -> Dict[str, Any]:
+        with tracer.span("agent.invoke"):
+            return super()._call(inputs, run_manager)
+
+    async def _acall(self, inputs: Dict[str, str], run_manager: Optional[AsyncCallbackManagerForChainRun] = None) -> Dict[str, Any]:
+        with tracer.span("agent.invoke"):
+            return await super()._acall(inputs, run_manager)
+
+    def _timed_action(self, name_to_tool_map, color_mapping, agent_action, run_manager) -> AgentStep:
+        start = time.perf_counter()
+        with tracer.span(f"tool.{agent_action.tool}") as span:
+            step = super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+            if tracer.enabled:
+                span.set(bytes=len(str(step.observation)))
+        elapsed = time.perf_counter() - start
+        self._latencies[agent_action.tool].append(elapsed)
+        logger.info(f"Tool {agent_action.tool} took {elapsed * 1000:.0f}ms")
+        return step
+
+    def _perform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> AgentStep:
+        # Only submit the call: the step is completed in _iter_next_step, once every
+        # action of the step has been submitted.
+        # The call runs in the current context, so its span is a child of the agent's.
+        future = self.pool.submit(
+            run_in_context(self._timed_action), name_to_tool_map, color_mapping, agent_action, run_manager
+        )
+        return AgentStep(action=agent_action, observation=future)
+
+    async def _aperform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> AgentStep:
+        with tracer.span(f"tool.{agent_action.tool}") as span:
+            step = await super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+            if tracer.enabled:
+                span.set(bytes=len(str(step.observation)))
+        return step
+
+    def _iter_next_step(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Iterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        pending = []
+        for output in super()._iter_next_step(
+            name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+        ):
+            if isinstance(output, AgentStep) and isinstance(output.observation, Future):
+                pending.append(output.observation)
+            else:
+                yield output
+        for future in pending:
+            yield future.result()
+
+    def report(self) -> None:
+        for tool, latencies in sorted(self._latencies.items()):
+            logger.info(
+                f"{tool}: {len(latencies)} calls, mean {sum(latencies) / len(latencies) * 1000:.0f}ms, "
+                f"max {max(latencies) * 1000:.0f}ms"
+            )
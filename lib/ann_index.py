@@ -0,0 +1,336 @@
+"""
+    Local approximate nearest neighbour index over the chunk embeddings.
+
+    The chunks of a PGVector collection are synced from the `langchain_pg_embedding`
+    table into a memory-mapped float32 matrix of L2-normalized vectors, partitioned
+    with an inverted file (IVF): k-means centroids and one list of rows per centroid.
+    A query probes the `nprobe` closest lists to collect candidates (first tier),
+    then ranks the candidates by exact cosine similarity (second tier).
+
+    Script to launch to rebuild the index after an ingestion:
+    `python .\\lib\\ann_index.py`
+"""
+
+import json
+import os
+import shutil
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from config.logger import logger
+from config.settings import ANN_INDEX_DIR, ANN_NPROBE, COLLECTION_NAME, CONNECTION_STRING
+from metadata_filters import MetadataPartitions, normalize_filter
+
+# Below this size a flat scan is as fast as probing lists and always exact.
+MIN_IVF_SIZE = 5_000
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int = 10, sample_size: int = 50_000, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means on a sample of normalized vectors.
+
+    Returns:
+        np.ndarray: (n_clusters, dim) normalized centroids.
+    """
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for cluster in range(n_clusters):
+            members = sample[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids = normalize(centroids)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index over normalized vectors, with exact cosine rerank.
+
+    Layout of an index directory:
+        - `vectors.f32`: normalized vectors, rows sorted by list.
+        - `centroids.npy`, `offsets.npy`: list centroids, and start row of each list.
+        - `docs.jsonl`: id, text and metadata of each row.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[dict],
+        centroids: Optional[np.ndarray] = None,
+        offsets: Optional[np.ndarray] = None,
+    ) -> None:
+        self.vectors = vectors
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.centroids = centroids
+        self.offsets = offsets
+        self._partitions: Optional[MetadataPartitions] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[dict],
+        n_lists: Optional[int] = None,
+    ) -> "IVFIndex":
+        """
+        Build an index in memory.
+
+        Args:
+            vectors (np.ndarray): (n, dim) embeddings, not necessarily normalized.
+            ids, texts, metadatas: Chunk ID, text and metadata of each row.
+            n_lists (int): Number of IVF lists. Defaults to sqrt(n) above
+                MIN_IVF_SIZE rows, and to a flat index below.
+
+        Returns:
+            IVFIndex: The index.
+        """
+        vectors = normalize(np.asarray(vectors, dtype=np.float32))
+        if n_lists is None:
+            n_lists = int(np.sqrt(len(vectors))) if len(vectors) >= MIN_IVF_SIZE else 0
+        if not n_lists:
+            return cls(vectors, list(ids), list(texts), list(metadatas))
+
+        centroids = kmeans(vectors, n_lists)
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        return cls(
+            vectors[order],
+            [ids[i] for i in order],
+            [texts[i] for i in order],
+            [metadatas[i] for i in order],
+            centroids,
+            offsets,
+        )
+
+    def save(self, path: str) -> None:
+        """
+        Write the index to `path`, replacing the previous one atomically.
+        """
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.ascontiguousarray(self.vectors, dtype=np.float32).tofile(os.path.join(tmp_path, "vectors.f32"))
+        if self.centroids is not None:
+            np.save(os.path.join(tmp_path, "centroids.npy"), self.centroids)
+            np.save(os.path.join(tmp_path, "offsets.npy"), self.offsets)
+        with open(os.path.join(tmp_path, "docs.jsonl"), "w", encoding="utf-8") as f:
+            for doc_id, text_, metadata in zip(self.ids, self.texts, self.metadatas):
+                f.write(json.dumps({"id": doc_id, "text": text_, "metadata": metadata}, ensure_ascii=False) + "\n")
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"rows": len(self), "dim": int(self.vectors.shape[1])}, f)
+
+        old_path = f"{path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.isdir(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        """
+        Load an index, memory-mapping its vectors.
+        """
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        vectors = np.memmap(
+            os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r", shape=(meta["rows"], meta["dim"])
+        )
+        ids, texts, metadatas = [], [], []
+        with open(os.path.join(path, "docs.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                ids.append(row["id"])
+                texts.append(row["text"])
+                metadatas.append(row["metadata"])
+        centroids = offsets = None
+        if os.path.isfile(os.path.join(path, "centroids.npy")):
+            centroids = np.load(os.path.join(path, "centroids.npy"))
+            offsets = np.load(os.path.join(path, "offsets.npy"))
+        return cls(vectors, ids, texts, metadatas, centroids, offsets)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """
+        First tier: rows of the `nprobe` lists closest to the query.
+        """
+        if self.centroids is None:
+            return np.arange(len(self))
+        lists = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+
+    @property
+    def partitions(self) -> MetadataPartitions:
+        if self._partitions is None:
+            self._partitions = MetadataPartitions(self.metadatas)
+        return self._partitions
+
+    def search(
+        self, query: np.ndarray, k: int, nprobe: int = ANN_NPROBE, filter_rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Return the `k` most similar rows as (row, cosine similarity) pairs.
+
+        Args:
+            filter_rows (np.ndarray): Restrict the search to these sorted rows. The
+                subset is intersected with the probed lists, and scanned exactly when
+                that leaves fewer than `k` rows or saves nothing.
+        """
+        query = normalize(np.asarray(query, dtype=np.float32))
+        rows = None
+        if filter_rows is not None and self.centroids is not None:
+            rows = self.candidates(query, nprobe)
+            rows = rows[np.isin(rows, filter_rows, assume_unique=True)]
+        if filter_rows is not None and (rows is None or len(rows) < k or len(filter_rows) <= len(rows)):
+            rows = filter_rows
+        if rows is not None:
+            scores = self.vectors[rows] @ query
+        elif self.centroids is None:
+            scores = self.vectors @ query
+        else:
+            rows = self.candidates(query, nprobe)
+            # Second tier: exact cosine similarity of the candidates.
+            scores = self.vectors[rows] @ query
+        if not len(scores):
+            return []
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i if rows is None else rows[i]), float(scores[i])) for i in top]
+
+
+def sync_from_pgvector(engine: Engine, collection_name: str, batch_size: int = 10_000) -> IVFIndex:
+    """
+    Build an index from the chunks of a PGVector collection.
+
+    Args:
+        engine (Engine): Engine of the PGVector database.
+        collection_name (str): Name of the collection.
+        batch_size (int): Rows fetched per round trip.
+
+    Returns:
+        IVFIndex: The index.
+    """
+    query = text(
+        "SELECT e.id, e.document, e.cmetadata, e.embedding::text AS embedding "
+        "FROM langchain_pg_embedding e JOIN langchain_pg_collection c ON e.collection_id = c.uuid "
+        "WHERE c.name = :collection_name ORDER BY e.id"
+    )
+    ids, texts, metadatas, vectors = [], [], [], []
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(
+            query, {"collection_name": collection_name}
+        )
+        for row in result:
+            ids.append(row.id)
+            texts.append(row.document)
+            metadatas.append(row.cmetadata or {})
+            vectors.append(np.array(row.embedding[1:-1].split(","), dtype=np.float32))
+    logger.info(f"Synced {len(ids)} chunks from PGVector collection {collection_name}")
+    if not ids:
+        raise ValueError(f"PGVector collection {collection_name} has no chunks")
+    return IVFIndex.build(np.vstack(vectors), ids, texts, metadatas)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Read-only VectorStore serving similarity search from an IVFIndex.
+
+    Chunks are written through PGVector, then synced with `sync_from_pgvector`.
+    It can replace PGVector as the `vectorstore` of a MultiVectorRetriever.
+
+    Args:
+        embeddings (Embeddings): Model used to embed the queries.
+        index (IVFIndex): The index.
+        nprobe (int): Number of IVF lists probed per query.
+    """
+
+    def __init__(self, embeddings: Embeddings, index: IVFIndex, nprobe: int = ANN_NPROBE) -> None:
+        self._embeddings = embeddings
+        self.index = index
+        self.nprobe = nprobe
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("LocalVectorStore is read-only: write to PGVector, then sync the index")
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        ids = ids or [str(i) for i in range(len(texts))]
+        metadatas = metadatas or [{} for _ in texts]
+        index = IVFIndex.build(np.asarray(embedding.embed_documents(texts)), ids, texts, metadatas)
+        return cls(embedding, index, **kwargs)
+
+    def _document(self, row: int) -> Document:
+        return Document(id=self.index.ids[row], page_content=self.index.texts[row], metadata=self.index.metadatas[row])
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Return the `k` closest chunks with their cosine distance, like PGVector.
+        Accepts the metadata `filter` of PGVector (see metadata_filters.py).
+        """
+        filter_ = normalize_filter(kwargs.get("filter"))
+        filter_rows = self.index.partitions.rows(filter_) if filter_ else None
+        hits = self.index.search(
+            np.asarray(embedding), k, nprobe=kwargs.get("nprobe", self.nprobe), filter_rows=filter_rows
+        )
+        return [(self._document(row), 1.0 - score) for row, score in hits]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embeddings.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embeddings.embed_query(query), k, **kwargs)
+
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1.0 - distance
+
+
+def index_path(collection_name: str = COLLECTION_NAME) -> str:
+    return os.path.join(ANN_INDEX_DIR, str(collection_name))
+
+
+def main():
+    engine = create_engine(CONNECTION_STRING)
+    index = sync_from_pgvector(engine, COLLECTION_NAME)
+    index.save(index_path(COLLECTION_NAME))
+    logger.info(f"Saved local ANN index of {len(index)} chunks to {index_path(COLLECTION_NAME)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+    Semantic cache of RAG answers, keyed by the embedding of the question.
+
+    A question whose embedding is close enough (cosine similarity above a threshold)
+    to a cached question gets the cached answer, without retrieval nor LLM call.
+    Both questions must also name the same numbers and source types: "la marge
+    opérationnelle 2022" and "... 2023" are close embeddings but different answers.
+    Entries are evicted in LRU order and after a TTL, and the whole cache is dropped
+    when the docstore collection changes.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config.logger import logger
+from config.settings import (
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_VERSION_CHECK,
+)
+from metadata_filters import filter_clauses, parse_filters
+
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+
+# Numbers of a question and the source types it names.
+QuestionSignature = Tuple[FrozenSet[str], Tuple[str, ...]]
+
+
+def question_signature(question: str) -> QuestionSignature:
+    """
+    Return what two questions must share for one to get the cached answer of the
+    other: their numbers (years, amounts) and the source types they restrict to.
+    """
+    source_types = filter_clauses(parse_filters(question)).get("source_type", [])
+    return frozenset(NUMBER_PATTERN.findall(question)), tuple(source_types)
+
+
+@dataclass
+class CacheEntry:
+    vector: np.ndarray
+    response: Any
+    created: float
+    compute_seconds: float
+    signature: QuestionSignature
+
+
+class SemanticAnswerCache:
+    """
+    LRU/TTL cache of answers, looked up by question similarity.
+
+    Args:
+        embeddings (Embeddings): Model embedding the questions.
+        threshold (float): Minimum cosine similarity for a hit.
+        max_entries (int): Entries kept, least recently used ones are evicted first.
+        ttl_seconds (float): Lifetime of an entry.
+        version_fn (Callable): Returns a fingerprint of the indexed data. The cache is
+            cleared when it changes. Called from a background thread, at most every
+            `version_check_seconds`.
+        version_check_seconds (float): Minimum delay between two version checks.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl_seconds: float = ANSWER_CACHE_TTL,
+        version_fn: Optional[Callable[[], str]] = None,
+        version_check_seconds: float = ANSWER_CACHE_VERSION_CHECK,
+    ) -> None:
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version_fn = version_fn
+        self.version_check_seconds = version_check_seconds
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._version: Optional[str] = None
+        self._version_checked = 0.0
+        self._version_checking = False
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def _check_version(self) -> None:
+        # Called with the lock held. The fingerprint scans the whole collection: it is
+        # computed in a background thread, so no lookup waits on it.
+        if (
+            self.version_fn is None
+            or self._version_checking
+            or time.monotonic() - self._version_checked < self.version_check_seconds
+        ):
+            return
+        self._version_checking = True
+        threading.Thread(target=self._refresh_version, name="answer-cache-version", daemon=True).start()
+
+    def _refresh_version(self) -> None:
+        try:
+            version: Optional[str] = self.version_fn()
+        except Exception as e:
+            logger.warning(f"Could not fingerprint the docstore collection: {e}")
+            version = None
+        with self._lock:
+            self._version_checking = False
+            self._version_checked = time.monotonic()
+            if version is None:
+                return
+            if self._version is not None and version != self._version:
+                logger.info("Docstore collection changed, clearing the answer cache")
+                self._entries.clear()
+            self._version = version
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for question in [q for q, entry in self._entries.items() if now - entry.created > self.ttl_seconds]:
+            del self._entries[question]
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, question: str, vector: Optional[np.ndarray] = None) -> Optional[CacheEntry]:
+        """
+        Return the cache entry of the most similar question with the same numbers and
+        source types, if similar enough.
+
+        Args:
+            question (str): User question.
+            vector (np.ndarray): Normalized embedding of the question, if already known.
+
+        Returns:
+            CacheEntry: The entry, or None on a miss.
+        """
+        signature = question_signature(question)
+        with self._lock:
+            self._check_version()
+            self._evict_expired()
+            entry = self._entries.get(question)
+            if entry is not None:
+                self._entries.move_to_end(question)
+                return entry
+            candidates: List[Tuple[str, CacheEntry]] = [
+                (cached, e) for cached, e in self._entries.items() if e.signature == signature
+            ]
+        if not candidates:
+            return None
+
+        # Score outside the lock: the other lookups do not wait for the matrix product.
+        vector = self._embed(question) if vector is None else vector
+        scores = np.vstack([e.vector for _, e in candidates]) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        question, entry = candidates[best]
+        with self._lock:
+            if self._entries.get(question) is entry:
+                self._entries.move_to_end(question)
+        return entry
+
+    def store(self, question: str, response: Any, compute_seconds: float = 0.0, vector: Optional[np.ndarray] = None) -> None:
+        """
+        Cache the answer of a question.
+        """
+        vector = self._embed(question) if vector is None else vector
+        with self._lock:
+            self._entries[question] = CacheEntry(
+                vector, response, time.monotonic(), compute_seconds, question_signature(question)
+            )
+            self._entries.move_to_end(question)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, question: str, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached answer of a similar question, or compute and cache it.
+
+        Args:
+            question (str): User question.
+            compute (Callable): Produces the answer on a miss.
+
+        Returns:
+            The response.
+        """
+        vector = self._embed(question)
+        entry = self.lookup(question, vector)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+                self.saved_seconds += entry.compute_seconds
+            logger.info(
+                f"Answer cache hit (hit rate {self.hit_rate:.0%}, {self.saved_seconds:.2f}s saved so far)"
+            )
+            if isinstance(entry.response, dict) and "question" in entry.response:
+                # The answer of a similar question, returned for the one asked.
+                return {**entry.response, "question": question}
+            return entry.response
+
+        start = time.perf_counter()
+        response = compute()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.misses += 1
+        self.store(question, response, elapsed, vector)
+        return response
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "saved_seconds": self.saved_seconds,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,30 @@
+"""
+    Streamlit rendering shared by the apps.
+
+    Only streamlit is imported, so the thin client of the retrieval service
+    (RAG_SERVICE_URL set) renders answers without loading the RAG stack.
+"""
+
+from typing import Any, Dict
+
+
+def show_rag_response(response: Dict[str, Any]) -> None:
+    """
+    Display a RAG answer with its sources.
+
+    Args:
+        response (dict): "response" and "context", whose "texts" are Documents and
+            "images" base64 JPEG thumbnails (see `thumbnail_images`).
+    """
+    import streamlit as st
+
+    st.write(response['response'])
+    st.subheader("Context:")
+    for text in response['context']['texts']:
+        st.write("Source:", text.metadata.get('source', 'Unknown'))
+        st.write("Chunk:", text.page_content)
+        st.write("---")
+
+    # Display images if any
+    for i, image in enumerate(response['context']['images']):
+        st.image(f"data:image/jpeg;base64,{image}", caption=f"Image {i+1}")
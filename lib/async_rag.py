@@ -0,0 +1,94 @@
+"""
+    Async query path: answers many questions concurrently on one event loop.
+
+    Retrieval goes through async PGVector and `PostgresByteStore.amget`, and the answer
+    through the async LLM call, so a question waiting on Postgres or on the model does
+    not hold a thread.
+
+    Script to answer questions, one per line on stdin:
+    `python .\\lib\\async_rag.py --concurrency 16 < questions.txt`
+"""
+
+import argparse
+import asyncio
+import sys
+from typing import List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.retrievers import BaseRetriever
+
+from config.logger import logger
+from config.settings import ASYNC_RAG_CONCURRENCY, HYBRID_SEARCH, LOCAL_ANN_INDEX, RERANK
+from rag_app import build_rag_chain
+from registry import registry
+from tracing import tracer
+
+
+def get_async_retriever() -> BaseRetriever:
+    """
+    Return the shared retriever of the async path.
+    """
+    return registry.async_retriever(local_index=LOCAL_ANN_INDEX, hybrid=HYBRID_SEARCH, rerank=RERANK)
+
+
+async def aget_response_with_sources(retriever: BaseRetriever, question: str, llm: Optional[BaseChatModel] = None) -> dict:
+    """
+    Async version of `get_response_with_sources`.
+
+    Args:
+        retriever (BaseRetriever): Retriever from `get_async_retriever()`.
+        question (str): User question.
+        llm (BaseChatModel): Chat model, defaults to the configured model.
+
+    Returns:
+        dict: The "context", "question" and "response" of the question.
+    """
+    with tracer.span("rag.query", question_chars=len(question)):
+        return await build_rag_chain(retriever, llm).ainvoke(question)
+
+
+async def answer_many(
+    questions: List[str],
+    retriever: Optional[BaseRetriever] = None,
+    llm: Optional[BaseChatModel] = None,
+    concurrency: int = ASYNC_RAG_CONCURRENCY,
+) -> List[dict]:
+    """
+    Answer questions concurrently, at most `concurrency` at a time.
+
+    Args:
+        questions (List[str]): Questions to answer.
+        retriever (BaseRetriever): Defaults to `get_async_retriever()`.
+        llm (BaseChatModel): Chat model, defaults to the configured model.
+        concurrency (int): Maximum number of questions in flight, which also bounds
+            the Postgres connections and LLM requests used at once.
+
+    Returns:
+        List[dict]: Responses, in the order of the questions.
+    """
+    retriever = retriever or get_async_retriever()
+    chain = build_rag_chain(retriever, llm)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(question: str) -> dict:
+        async with semaphore:
+            with tracer.span("rag.query", question_chars=len(question)):
+                return await chain.ainvoke(question)
+
+    return await asyncio.gather(*(answer(question) for question in questions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer questions read from stdin, one per line.")
+    parser.add_argument("--concurrency", type=int, default=ASYNC_RAG_CONCURRENCY, help="Questions in flight")
+    args = parser.parse_args()
+
+    questions = [line.strip() for line in sys.stdin if line.strip()]
+    logger.info(f"Answering {len(questions)} questions, {args.concurrency} at a time")
+    responses = asyncio.run(answer_many(questions, concurrency=args.concurrency))
+    for response in responses:
+        print(f"Q: {response['question']}\nA: {response['response']}\n")
+
+
+if __name__ == "__main__":
+    main()
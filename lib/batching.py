@@ -0,0 +1,205 @@
+"""
+    Batching of concurrent embedding requests into shared model calls.
+
+    A sentence-transformers forward pass over 32 texts costs little more than over
+    one on CPU, so texts of requests arriving together are embedded in one call.
+    A request found alone in the queue is sent to the model at once: a single user
+    pays no wait. When others are pending too, they open a batch, which is sent once
+    it holds `max_batch_size` texts or `max_wait_ms` after it was opened, whichever
+    is first. Requests arriving while the model runs make up the next batch.
+
+    EmbeddingBatcher serves the `/embed` endpoint of the retrieval service, and
+    MicroBatchEmbeddings batches the `embed_query` calls of concurrent questions.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from config.logger import logger
+from config.settings import EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS
+from tracing import tracer
+
+
+@dataclass
+class _Request:
+    texts: List[str]
+    future: Future = field(default_factory=Future)
+
+
+class EmbeddingBatcher:
+    """
+    Embeds the texts of concurrent callers in batches, from one worker thread.
+
+    Args:
+        embeddings (Embeddings): Model the batches are sent to, with `embed_documents`.
+        max_batch_size (int): Texts per batch. A request larger than this is sent alone.
+        max_wait_ms (float): Time a batch of concurrent requests waits for more. With 0,
+            a batch only holds the requests queued while the previous one ran.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_size: int = EMBED_BATCH_MAX_SIZE,
+        max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS,
+    ) -> None:
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts with those of the other pending requests, blocking until done.
+
+        Args:
+            texts (List[str]): Texts to embed.
+
+        Returns:
+            List[List[float]]: One vector per text.
+
+        Raises:
+            RuntimeError: The batcher is closed, or its worker stopped.
+        """
+        if not texts:
+            return []
+        request = _Request(list(texts))
+        # Under the lock, no request can be queued behind the stop marker of `close`.
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The embedding batcher is closed")
+            self._queue.put(request)
+        return request.future.result()
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        batch, size = [first], len(first.texts)
+        if self._queue.empty():
+            # Alone: waiting would only add latency.
+            return batch
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                # Past the deadline, still take the requests queued meanwhile.
+                request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Stop once this batch is done.
+                self._queue.put(None)
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self) -> None:
+        batch: List[_Request] = []
+        try:
+            while True:
+                first = self._queue.get()
+                if first is None:
+                    return
+                batch = self._collect(first)
+                self._embed_batch(batch)
+        except BaseException as e:
+            # The worker dies (SystemExit, KeyboardInterrupt...): fail the waiting
+            # callers instead of leaving them blocked forever.
+            self._fail_pending(batch, e)
+            raise
+
+    def _embed_batch(self, batch: List[_Request]) -> None:
+        texts = [text for request in batch for text in request.texts]
+        try:
+            with tracer.span("embed_batch", requests=len(batch), texts=len(texts)):
+                vectors = self.embeddings.embed_documents(texts)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        self.requests += len(batch)
+        self.batches += 1
+        self.texts += len(texts)
+        start = 0
+        for request in batch:
+            request.future.set_result(vectors[start : start + len(request.texts)])
+            start += len(request.texts)
+
+    def _fail_pending(self, batch: List[_Request], error: BaseException) -> None:
+        with self._lock:
+            self._closed = True
+        pending = list(batch)
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                pending.append(request)
+        for request in pending:
+            if not request.future.done():
+                request.future.set_exception(RuntimeError(f"The embedding worker stopped: {error!r}"))
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.texts / self.batches if self.batches else 0.0
+
+    def close(self) -> None:
+        """
+        Stop the worker once the pending requests are embedded. Later calls to
+        `embed` raise a RuntimeError.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join()
+        logger.info(f"Embedded {self.texts} texts of {self.requests} requests in {self.batches} batches")
+
+
+class MicroBatchEmbeddings(Embeddings):
+    """
+    `Embeddings` whose `embed_query` calls from concurrent threads are embedded
+    together, in one `embed_documents` call of the wrapped model per batch.
+
+    Queries are embedded like documents, which is the same for models without a
+    query instruction, like all-MiniLM-L6-v2. `embed_documents` goes straight to the
+    wrapped model: ingestion already sends large batches.
+
+    Args:
+        embeddings (Embeddings): Wrapped model.
+        max_batch_size (int): Queries per batch.
+        max_wait_ms (float): Time a batch of concurrent queries waits for more. A lone
+            query is embedded at once.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_size: int = EMBED_BATCH_MAX_SIZE,
+        max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS,
+    ) -> None:
+        self.embeddings = embeddings
+        self.batcher = EmbeddingBatcher(embeddings, max_batch_size, max_wait_ms)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.embed([text])[0]
+
+    def close(self) -> None:
+        self.batcher.close()
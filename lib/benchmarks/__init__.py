@@ -0,0 +1,6 @@
+"""
+    Benchmarks for the ingestion and query paths.
+
+    Run them from the lib folder so that the project modules are importable, e.g.:
+    `python -m benchmarks.retriever_latency`
+"""
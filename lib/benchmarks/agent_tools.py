@@ -0,0 +1,67 @@
+"""
+    Latency of an agent step calling every market-data tool, offline.
+
+    The market-data store is filled from a fake yfinance backend with a fixed latency
+    per call, in a temporary directory:
+    - refresh cold / incremental: first fill of the store, then a refresh fetching only
+      what is new or expired.
+    - sequential / parallel: one agent step calling every tool with AgentExecutor and
+      ParallelAgentExecutor, the tools reading the local store.
+
+    `python -m benchmarks.agent_tools --latency 0.3`
+"""
+
+import argparse
+import tempfile
+import time
+
+from langchain.agents import AgentExecutor
+from langchain_core.messages import HumanMessage
+
+import renault_agent
+from config.logger import logger
+from agent_executor import ParallelAgentExecutor
+from market_data import MarketDataClient
+from market_store import MarketStore
+from benchmarks.fakes import FakeMarketBackend, ScriptedAgent
+
+TICKER = "RNO.PA"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per fake Yahoo call")
+    args = parser.parse_args()
+
+    client = MarketDataClient(FakeMarketBackend(latency=args.latency))
+    with tempfile.TemporaryDirectory() as root:
+        store = MarketStore(root, client)
+        renault_agent.market_store = store
+        for name in ("cold", "incremental"):
+            start = time.perf_counter()
+            store.refresh_all([TICKER])
+            logger.info(f"refresh {name:<11} {(time.perf_counter() - start) * 1000:.0f}ms")
+        client.report()
+
+        market_tools = [t for t in renault_agent.tools if t.name != "company_retriever_tool"]
+        tool_calls = [
+            (t.name, {"ticker": TICKER, "start_date": "2024-01-01", "end_date": "2024-12-31"})
+            if t.name == "stock_price_history"
+            else (t.name, {"ticker": TICKER})
+            for t in market_tools
+        ]
+        agent = ScriptedAgent(tool_calls=tool_calls)
+        inputs = {"messages": [HumanMessage(content="Give me everything about Renault's stock.")]}
+        for name, executor in [
+            ("sequential", AgentExecutor(agent=agent, tools=market_tools)),
+            ("parallel", ParallelAgentExecutor(agent=agent, tools=market_tools)),
+        ]:
+            start = time.perf_counter()
+            executor.invoke(inputs)
+            logger.info(f"{name:<10} {len(market_tools)} tools in {(time.perf_counter() - start) * 1000:.0f}ms")
+            if isinstance(executor, ParallelAgentExecutor):
+                executor.report()
+
+
+if __name__ == "__main__":
+    main()
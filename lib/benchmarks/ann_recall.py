@@ -0,0 +1,103 @@
+"""
+    Recall@k and latency of the local ANN index.
+
+    Offline, on synthetic clustered embeddings, against an exact scan:
+    `python -m benchmarks.ann_recall --rows 50000`
+
+    Against PGVector, on the real collection (needs the Postgres container and an
+    ingested collection): `python -m benchmarks.ann_recall --pgvector`
+"""
+
+import argparse
+import statistics
+import time
+from typing import Callable, List, Set
+
+import numpy as np
+
+from config.logger import logger
+from config.settings import COLLECTION_NAME
+from ann_index import IVFIndex, LocalVectorStore, sync_from_pgvector
+
+
+def clustered_vectors(n_rows: int, dim: int, n_topics: int = 200, seed: int = 0) -> np.ndarray:
+    """
+    Embeddings grouped around topics, closer to real chunk embeddings than uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(n_topics, dim)).astype(np.float32)
+    return topics[rng.integers(n_topics, size=n_rows)] + 0.6 * rng.normal(size=(n_rows, dim)).astype(np.float32)
+
+
+def measure(search: Callable[[np.ndarray], List[str]], queries: np.ndarray, truth: List[Set[str]], k: int):
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(set(found[:k]) & expected) / k)
+    return statistics.mean(recalls), statistics.median(latencies) * 1000
+
+
+def offline(args) -> None:
+    vectors = clustered_vectors(args.rows, args.dim)
+    ids = [str(i) for i in range(args.rows)]
+    empty = [""] * args.rows
+    exact = IVFIndex.build(vectors, ids, empty, [{}] * args.rows, n_lists=0)
+    ivf = IVFIndex.build(vectors, ids, empty, [{}] * args.rows, n_lists=int(np.sqrt(args.rows)))
+    queries = clustered_vectors(args.queries, args.dim, seed=1)
+    truth = [{exact.ids[row] for row, _ in exact.search(q, args.k)} for q in queries]
+
+    recall, p50 = measure(lambda q: [exact.ids[r] for r, _ in exact.search(q, args.k)], queries, truth, args.k)
+    logger.info(f"exact scan       recall@{args.k}={recall:.3f} p50={p50:.2f}ms")
+    for nprobe in args.nprobe:
+        recall, p50 = measure(
+            lambda q: [ivf.ids[r] for r, _ in ivf.search(q, args.k, nprobe=nprobe)], queries, truth, args.k
+        )
+        logger.info(f"ivf nprobe={nprobe:<4} recall@{args.k}={recall:.3f} p50={p50:.2f}ms")
+
+
+def against_pgvector(args) -> None:
+    from registry import registry
+
+    retriever = registry.retriever()
+    pgvector = retriever.vectorstore
+    index = sync_from_pgvector(retriever.docstore.engine, COLLECTION_NAME)
+    local = LocalVectorStore(pgvector.embeddings, index)
+
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(index), size=min(args.queries, len(index)), replace=False)
+    # Perturbed chunk embeddings stand in for questions about the chunks.
+    queries = np.asarray(index.vectors[rows]) + 0.05 * rng.normal(size=(len(rows), index.vectors.shape[1]))
+
+    def pg_search(query):
+        return [doc.id for doc in pgvector.similarity_search_by_vector(query.tolist(), k=args.k)]
+
+    truth = [set(pg_search(q)) for q in queries]
+    recall, p50 = measure(pg_search, queries, truth, args.k)
+    logger.info(f"pgvector         recall@{args.k}={recall:.3f} p50={p50:.2f}ms")
+    for nprobe in args.nprobe:
+        recall, p50 = measure(
+            lambda q: [doc.id for doc in local.similarity_search_by_vector(q, k=args.k, nprobe=nprobe)],
+            queries, truth, args.k,
+        )
+        logger.info(f"local nprobe={nprobe:<4} recall@{args.k}={recall:.3f} p50={p50:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384, help="all-MiniLM-L6-v2 dimension")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--pgvector", action="store_true", help="Compare with PGVector on the real collection")
+    args = parser.parse_args()
+    if args.pgvector:
+        against_pgvector(args)
+    else:
+        offline(args)
+
+
+if __name__ == "__main__":
+    main()
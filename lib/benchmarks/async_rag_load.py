@@ -0,0 +1,106 @@
+"""
+    p50/p99 latency of the RAG query path at increasing concurrency.
+
+    The model, PGVector and the docstore are replaced by stand-ins with fixed latencies,
+    so the benchmark measures how each path overlaps waits, not the backends:
+    - sync: `chain.invoke` from a thread pool of `concurrency` workers.
+    - async: `answer_many`, one event loop, `concurrency` questions in flight.
+
+    `python -m benchmarks.async_rag_load --levels 1 4 16 64 --requests 200`
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+from langchain.retrievers.multi_vector import MultiVectorRetriever
+
+from config.logger import logger
+from config.settings import ID_KEY
+from async_rag import answer_many
+from rag_app import build_rag_chain
+from benchmarks.corpus import PAGE_SIZE, synthetic_documents
+from benchmarks.fakes import FakeChatModel, FakeDocStore, FakeVectorStore
+from benchmarks.retriever_latency import QUESTIONS
+
+
+def build_stub_retriever(vector_latency: float, docstore_latency: float) -> MultiVectorRetriever:
+    parents = synthetic_documents(4, size=PAGE_SIZE)
+    docstore = FakeDocStore(latency=docstore_latency)
+    docstore.mset([(f"parent-{i}", doc) for i, doc in enumerate(parents)])
+    chunks = [
+        doc.model_copy(update={"metadata": {ID_KEY: f"parent-{i}"}}) for i, doc in enumerate(parents)
+    ]
+    return MultiVectorRetriever(
+        vectorstore=FakeVectorStore(chunks, latency=vector_latency),
+        docstore=docstore,
+        id_key=ID_KEY,
+    )
+
+
+def run_sync(chain, questions: List[str], concurrency: int) -> List[float]:
+    def timed(question: str) -> float:
+        start = time.perf_counter()
+        chain.invoke(question)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(timed, questions))
+
+
+def run_async(retriever, llm, questions: List[str], concurrency: int) -> List[float]:
+    latencies = []
+
+    async def timed_answers() -> None:
+        # Same semaphore bound as answer_many, timing each question from its start.
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed(question: str) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                await answer_many([question], retriever, llm, concurrency=1)
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(timed(question) for question in questions))
+
+    asyncio.run(timed_answers())
+    return latencies
+
+
+def report(name: str, concurrency: int, latencies: List[float], elapsed: float) -> None:
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    logger.info(
+        f"{name:<5} c={concurrency:>3} p50={p50:>7.1f}ms p99={p99:>7.1f}ms "
+        f"{len(latencies) / elapsed:>7.1f} questions/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64], help="Concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Questions per level")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--vector-latency", type=float, default=0.005)
+    parser.add_argument("--docstore-latency", type=float, default=0.003)
+    args = parser.parse_args()
+
+    retriever = build_stub_retriever(args.vector_latency, args.docstore_latency)
+    llm = FakeChatModel(latency=args.llm_latency)
+    chain = build_rag_chain(retriever, llm)
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.requests)]
+
+    for concurrency in args.levels:
+        start = time.perf_counter()
+        latencies = run_sync(chain, questions, concurrency)
+        report("sync", concurrency, latencies, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        latencies = run_async(retriever, llm, questions, concurrency)
+        report("async", concurrency, latencies, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
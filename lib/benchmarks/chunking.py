@@ -0,0 +1,54 @@
+"""
+    Compare the character splitter with the token-aware chunker on the annual report.
+
+    For each chunker: time to split every page, number of chunks, and number of chunks
+    longer than the embedding model's input limit (silently truncated at embed time).
+    `python -m benchmarks.chunking --workers 1 4`
+"""
+
+import argparse
+import time
+from typing import List
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+
+from config.logger import logger
+from config.settings import CHUNK_MAX_TOKENS, local_files
+from chunker import TextChunker, TokenChunker
+from benchmarks.corpus import PAGE_SIZE, synthetic_documents
+
+
+def load_pages(pdf: str, repeat: int) -> List[Document]:
+    pages = PyPDFLoader(pdf).load() if pdf else synthetic_documents(200, size=PAGE_SIZE)
+    return pages * repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pdf", default=next(iter(local_files()), ""), help="PDF to split, empty for a synthetic corpus")
+    parser.add_argument("--repeat", type=int, default=5, help="Times the pages are repeated")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    pages = load_pages(args.pdf, args.repeat)
+    ids = [str(i) for i in range(len(pages))]
+    chunkers = {"character": TextChunker(chunk_size=500, chunk_overlap=50)}
+    for workers in args.workers:
+        chunkers[f"token x{workers}"] = TokenChunker(workers=workers)
+    tokenizer = chunkers[f"token x{args.workers[0]}"].tokenizer
+
+    for name, chunker in chunkers.items():
+        start = time.perf_counter()
+        chunks = chunker.split(pages, ids)
+        elapsed = time.perf_counter() - start
+        lengths = [len(encoding.ids) for encoding in tokenizer.encode_batch([c.page_content for c in chunks])]
+        truncated = sum(length > CHUNK_MAX_TOKENS for length in lengths)
+        logger.info(
+            f"{name:<10} {len(pages) / elapsed:>8.0f} pages/s, {len(chunks)} chunks, "
+            f"max {max(lengths)} tokens, {truncated} over {CHUNK_MAX_TOKENS} tokens"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+    Serialize/deserialize throughput and stored size of the docstore codecs.
+
+    Compares the legacy pickle path with the binary codec, with and without zstd:
+    `python -m benchmarks.codec_throughput`
+"""
+
+import argparse
+import time
+from typing import Any, Callable, List
+
+from config.logger import logger
+from serialization import BinaryCodec, Codec, PickleCodec, zstandard
+from benchmarks.corpus import TRANSCRIPT_SIZE, synthetic_documents, synthetic_image_b64
+
+
+def throughput(fn: Callable[[Any], Any], values: List[Any], total_bytes: int, repeat: int) -> float:
+    """
+    Return the throughput of `fn` over `values`, in MB/s of `total_bytes`.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for value in values:
+            fn(value)
+    elapsed = time.perf_counter() - start
+    return total_bytes * repeat / elapsed / 1e6
+
+
+def bench_codec(codec: Codec, label: str, codec_label: str, values: List[Any], raw_size: int, repeat: int) -> None:
+    encoded = [codec.encode(value) for value in values]
+    stored = sum(len(data) for data in encoded)
+    logger.info(
+        f"{label:<12} {codec_label:<12} "
+        f"encode={throughput(codec.encode, values, raw_size, repeat):8.1f} MB/s "
+        f"decode={throughput(codec.decode, encoded, raw_size, repeat):8.1f} MB/s "
+        f"size={stored / raw_size:6.1%} of raw"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=500, help="Number of pages")
+    parser.add_argument("--images", type=int, default=20, help="Number of table images")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the corpus")
+    args = parser.parse_args()
+
+    corpora = {
+        "pages": synthetic_documents(args.docs),
+        "transcripts": synthetic_documents(max(args.docs // 50, 1), size=TRANSCRIPT_SIZE),
+        "images": [synthetic_image_b64(seed=i) for i in range(args.images)],
+    }
+    codecs = {"pickle": PickleCodec(), "binary": BinaryCodec()}
+    if zstandard is not None:
+        codecs["binary+zstd"] = BinaryCodec(compression="zstd")
+    else:
+        logger.warning("zstandard is not installed, skipping the zstd codec")
+
+    for label, values in corpora.items():
+        raw_size = sum(len(v.page_content if hasattr(v, "page_content") else v) for v in values)
+        for codec_label, codec in codecs.items():
+            bench_codec(codec, label, codec_label, values, raw_size, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+    Prompt size and end-to-end latency with and without context assembly.
+
+    The retriever returns whole parents like the real one: annual-report pages, one of
+    them twice, and two copies of a results-presentation transcript. The stub LLM's
+    latency grows with the prompt size (`--ms-per-1k-tokens`), like a real model's
+    prefill, and it records the prompt token counts:
+    - whole parents: every parent concatenated, as before.
+    - assembled: deduplicated, ranked passages within CONTEXT_TOKEN_BUDGET.
+
+    `python -m benchmarks.context_budget --budget 6000`
+"""
+
+import argparse
+import statistics
+import time
+
+from langchain.retrievers.multi_vector import MultiVectorRetriever
+
+from config.logger import logger
+from config.settings import CONTEXT_TOKEN_BUDGET, ID_KEY
+import context_budget
+from context_budget import ContextAssembler
+from rag_app import build_rag_chain
+from benchmarks.corpus import PAGE_SIZE, TRANSCRIPT_SIZE, synthetic_documents
+from benchmarks.fakes import FakeChatModel, FakeDocStore, FakeVectorStore
+from benchmarks.retriever_latency import QUESTIONS
+
+
+def build_parent_retriever() -> MultiVectorRetriever:
+    pages = synthetic_documents(3, size=PAGE_SIZE)
+    transcript = synthetic_documents(1, size=TRANSCRIPT_SIZE, seed=1)[0]
+    transcript.metadata = {"source": "https://www.youtube.com/watch?v=results", "title": "Résultats 2023"}
+    parents = pages + [pages[0], transcript, transcript.model_copy()]
+    docstore = FakeDocStore()
+    docstore.mset([(f"parent-{i}", doc) for i, doc in enumerate(parents)])
+    chunks = [doc.model_copy(update={"metadata": {ID_KEY: f"parent-{i}"}}) for i, doc in enumerate(parents)]
+    return MultiVectorRetriever(vectorstore=FakeVectorStore(chunks), docstore=docstore, id_key=ID_KEY, search_kwargs={"k": len(chunks)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget", type=int, default=CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=20.0, help="Prefill time of the stub LLM")
+    args = parser.parse_args()
+
+    context_budget._assembler = ContextAssembler(budget=args.budget)
+    retriever = build_parent_retriever()
+    for name, assemble in [("whole parents", False), ("assembled", True)]:
+        llm = FakeChatModel(latency=0.05, seconds_per_1k_tokens=args.ms_per_1k_tokens / 1000)
+        chain = build_rag_chain(retriever, llm=llm, assemble=assemble)
+        latencies = []
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            chain.invoke(question)
+            latencies.append(time.perf_counter() - start)
+        logger.info(
+            f"{name:<14} prompt tokens p50={statistics.median(llm.prompt_tokens):>7.0f} "
+            f"latency p50={statistics.median(latencies) * 1000:>7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+    Synthetic corpora shaped like the Renault documents, for benchmarks.
+"""
+
+import base64
+import random
+from typing import List
+
+from langchain_core.documents import Document
+
+WORDS = (
+    "renault groupe marge opérationnelle chiffre d'affaires résultat net ampere alpine dacia "
+    "renaulution stratégie électrique véhicules ventes europe flux de trésorerie dividende "
+    "plan objectifs croissance coûts performance 2021 2022 2023 2024 milliards euros hausse "
+    "baisse production usine batterie mobilize partenariat nissan alliance marché prix"
+).split()
+
+# Sizes of the real corpus: an annual-report page is a few thousand characters,
+# a results-presentation transcript tens of thousands.
+PAGE_SIZE = 3_000
+TRANSCRIPT_SIZE = 40_000
+IMAGE_SIZE = 150_000
+
+
+def synthetic_text(size: int, rng: random.Random) -> str:
+    """
+    Generate French-looking text of roughly `size` characters, in sentences.
+    """
+    words = []
+    length = 0
+    while length < size:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 25))).capitalize() + "."
+        words.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(words)
+
+
+def synthetic_documents(n_docs: int, size: int = PAGE_SIZE, seed: int = 0) -> List[Document]:
+    """
+    Generate annual-report-like pages with the metadata stamped by the loaders.
+
+    Args:
+        n_docs (int): Number of documents.
+        size (int): Approximate number of characters per document.
+        seed (int): Random seed, the corpus is deterministic.
+
+    Returns:
+        List[Document]: The documents.
+    """
+    rng = random.Random(seed)
+    return [
+        Document(
+            page_content=synthetic_text(size, rng),
+            metadata={
+                "source": f"data/raw_pdf_data/Rapport_d_activite_{2020 + i % 5}.pdf",
+                "title": f"Rapport_d_activite_{2020 + i % 5}.pdf",
+                "year": 2020 + i % 5,
+                "page": i,
+            },
+        )
+        for i in range(n_docs)
+    ]
+
+
+def synthetic_transcripts(n_docs: int, size: int = TRANSCRIPT_SIZE, seed: int = 1) -> List[Document]:
+    """
+    Generate results-presentation transcripts with the metadata of CustomYouTubeLoader.
+    """
+    rng = random.Random(seed)
+    return [
+        Document(
+            page_content=synthetic_text(size, rng),
+            metadata={
+                "source": f"https://www.youtube.com/watch?v=results{2021 + i % 4}",
+                "title": f"Résultats_financiers_{2021 + i % 4}",
+                "year": str(2021 + i % 4),
+            },
+        )
+        for i in range(n_docs)
+    ]
+
+
+def synthetic_image_b64(size: int = IMAGE_SIZE, seed: int = 0) -> str:
+    """
+    Generate a base64 string with a PNG signature, the size of an extracted table image.
+    """
+    rng = random.Random(seed)
+    raw = b"\x89PNG\r\n\x1a\n" + rng.randbytes(size)
+    return base64.b64encode(raw).decode("utf-8")
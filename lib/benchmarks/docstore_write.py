@@ -0,0 +1,72 @@
+"""
+    Rows per second of PostgresByteStore.mset against a local Postgres.
+
+    Needs the Postgres container of docker-compose.db.yml. The rows are written to a
+    dedicated collection that is emptied before and after each run:
+    `python -m benchmarks.docstore_write --sizes 1000 10000 100000 --with-merge`
+"""
+
+import argparse
+import time
+from typing import List
+
+from sqlalchemy import delete
+
+from config.logger import logger
+from config.settings import CONNECTION_STRING
+from registry import registry
+from store import ByteStore, PostgresByteStore
+from benchmarks.corpus import synthetic_documents
+
+COLLECTION = "benchmark_docstore"
+
+
+def merge_mset(store: PostgresByteStore, items: List) -> None:
+    """
+    The previous mset: one session.merge (SELECT then INSERT/UPDATE) per item.
+    """
+    with store.Session() as session:
+        for key, value, filename in items:
+            session.merge(ByteStore(**store.prepare_row((key, value, filename))))
+        session.commit()
+
+
+def clear(store: PostgresByteStore) -> None:
+    with store.Session() as session:
+        session.execute(delete(ByteStore).where(ByteStore.collection_name == COLLECTION))
+        session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--batch-size", type=int, default=None, help="Rows per upsert statement")
+    parser.add_argument("--workers", type=int, default=None, help="Serialization threads")
+    parser.add_argument("--with-merge", action="store_true", help="Also time the per-item merge path")
+    args = parser.parse_args()
+
+    engine, async_engine = registry.engines(CONNECTION_STRING)
+    store = PostgresByteStore(CONNECTION_STRING, COLLECTION, engine=engine, async_engine=async_engine)
+    if args.batch_size:
+        store.batch_size = args.batch_size
+    if args.workers:
+        store.workers = args.workers
+
+    for size in args.sizes:
+        docs = synthetic_documents(size, size=1_000)
+        items = [(f"doc-{i}", doc, doc.metadata["source"]) for i, doc in enumerate(docs)]
+        modes = {"bulk upsert": store.mset}
+        if args.with_merge:
+            modes["merge"] = lambda items: merge_mset(store, items)
+
+        for name, mset in modes.items():
+            clear(store)
+            start = time.perf_counter()
+            mset(items)
+            elapsed = time.perf_counter() - start
+            logger.info(f"{name:<12} n={size:>7} {size / elapsed:>10.0f} rows/s ({elapsed:.2f}s)")
+    clear(store)
+
+
+if __name__ == "__main__":
+    main()
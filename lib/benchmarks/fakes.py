@@ -0,0 +1,350 @@
+"""
+    Deterministic stand-ins for the external models and services, for benchmarks.
+"""
+
+import asyncio
+import os
+import random
+import string
+import threading
+import time
+import zlib
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain.agents import BaseMultiActionAgent
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.stores import InMemoryStore
+from langchain_core.vectorstores import VectorStore
+from sqlalchemy import create_engine
+from tokenizers import Tokenizer, normalizers, pre_tokenizers, processors
+from tokenizers.models import WordPiece
+
+from store import PostgresByteStore
+from benchmarks.corpus import WORDS
+
+
+class FakeRateLimitError(Exception):
+    """Raised by the fake models to simulate a 429 from the provider."""
+
+
+def fake_vision_chain(latency: float = 0.5, failure_rate: float = 0.0, seed: int = 0) -> RunnableLambda:
+    """
+    Build a Runnable with the interface of `build_vision_chain()`.
+
+    Args:
+        latency (float): Seconds per call.
+        failure_rate (float): Share of calls failing with FakeRateLimitError.
+        seed (int): Seed of the failures.
+
+    Returns:
+        RunnableLambda: Turns {"image": base64} into a description, sync or async.
+    """
+    rng = random.Random(seed)
+
+    def describe(inputs: dict) -> str:
+        time.sleep(latency)
+        if rng.random() < failure_rate:
+            raise FakeRateLimitError("rate limit exceeded")
+        return f"Table describing {len(inputs['image'])} bytes of Renault figures."
+
+    async def adescribe(inputs: dict) -> str:
+        await asyncio.sleep(latency)
+        if rng.random() < failure_rate:
+            raise FakeRateLimitError("rate limit exceeded")
+        return f"Table describing {len(inputs['image'])} bytes of Renault figures."
+
+    return RunnableLambda(describe, afunc=adescribe)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering after a fixed latency, with real sync and async paths.
+
+    With `seconds_per_1k_tokens`, the latency also grows with the prompt size, like
+    the prefill of a real model. Prompt sizes are recorded in `prompt_tokens`.
+    """
+
+    latency: float = 0.2
+    seconds_per_1k_tokens: float = 0.0
+    answer: str = "Renault's operating margin was 7.9% in 2023."
+    prompt_tokens: List[int] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _latency(self, messages: List[BaseMessage]) -> float:
+        from context_budget import b64_image_tokens, token_counter
+
+        tokens = 0
+        for message in messages:
+            parts = message.content if isinstance(message.content, list) else [message.content]
+            for part in parts:
+                if isinstance(part, str):
+                    tokens += token_counter.count(part)
+                elif part.get("type") == "text":
+                    tokens += token_counter.count(part["text"])
+                elif part.get("type") == "image_url":
+                    tokens += b64_image_tokens(part["image_url"]["url"].split(",", 1)[1])
+        self.prompt_tokens.append(tokens)
+        return self.latency + self.seconds_per_1k_tokens * tokens / 1000
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._latency(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._latency(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Bag-of-words embeddings hashed into `dim` buckets, deterministic and instant.
+
+    Like a small sentence-embedding model, it matches topics well but is blind to
+    figures: numbers are dropped before hashing.
+    """
+
+    def __init__(self, dim: int = 384) -> None:
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            word = word.strip(".,;:!?()%'\"")
+            if word and not any(c.isdigit() for c in word):
+                vector[zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class ForwardPassEmbeddings(HashingEmbeddings):
+    """
+    HashingEmbeddings costing like a sentence-transformers model on CPU: each call
+    runs one forward pass of `seconds_per_call` plus `seconds_per_text` per text, and
+    the model runs one pass at a time.
+    """
+
+    def __init__(self, dim: int = 384, seconds_per_call: float = 0.008, seconds_per_text: float = 0.0005) -> None:
+        super().__init__(dim)
+        self.seconds_per_call = seconds_per_call
+        self.seconds_per_text = seconds_per_text
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _forward(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.calls += 1
+            time.sleep(self.seconds_per_call + self.seconds_per_text * len(texts))
+            return [self._embed(text) for text in texts]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._forward(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._forward([text])[0]
+
+
+class OverlapScorer:
+    """
+    Stand-in for a reranking model: scores texts by the share of query words they
+    contain, figures included, and sleeps `seconds_per_pair` per text like a CPU
+    cross-encoder.
+    """
+
+    def __init__(self, seconds_per_pair: float = 0.004) -> None:
+        self.seconds_per_pair = seconds_per_pair
+
+    def score(self, query: str, texts: Sequence[str]) -> np.ndarray:
+        time.sleep(self.seconds_per_pair * len(texts))
+        terms = {word.strip(".,;:!?()%'\"") for word in query.lower().split()}
+        return np.asarray([
+            len(terms & {word.strip(".,;:!?()%'\"") for word in text.lower().split()}) / len(terms)
+            for text in texts
+        ])
+
+
+def fake_tokenizer() -> Tokenizer:
+    """
+    WordPiece tokenizer built offline, shaped like the embedding model's: known words
+    are one token, other words are split into characters, and [CLS]/[SEP] are added.
+    """
+    alphabet = sorted({c for word in WORDS for c in word} | set(string.ascii_letters + string.digits + string.punctuation))
+    vocab = ["[UNK]", "[CLS]", "[SEP]"] + sorted(set(WORDS)) + alphabet + [f"##{c}" for c in alphabet]
+    tokenizer = Tokenizer(WordPiece({token: i for i, token in enumerate(vocab)}, unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.Lowercase()
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", 1), ("[SEP]", 2)]
+    )
+    return tokenizer
+
+
+def sqlite_docstore(directory: str, collection_name: str = "bench") -> PostgresByteStore:
+    """
+    PostgresByteStore on a SQLite file of `directory`, standing in for Postgres.
+    Only the sync methods are meant to be used: the async engine is a sync one.
+    """
+    conninfo = f"sqlite:///{os.path.join(directory, 'docstore.sqlite3')}"
+    return PostgresByteStore(conninfo, collection_name, engine=None, async_engine=create_engine(conninfo))
+
+
+class FakeVectorStore(VectorStore):
+    """
+    Stand-in for PGVector: returns the first `k` chunks after a fixed latency.
+
+    Args:
+        chunks (List[Document]): Chunks returned by every search.
+        latency (float): Seconds per search.
+    """
+
+    def __init__(self, chunks: List[Document], latency: float = 0.005) -> None:
+        self.chunks = chunks
+        self.latency = latency
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs: Any):
+        return cls([Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas or [{} for _ in texts])])
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        time.sleep(self.latency)
+        return self.chunks[:k]
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        await asyncio.sleep(self.latency)
+        return self.chunks[:k]
+
+
+class FakeDocStore(InMemoryStore):
+    """
+    Stand-in for PostgresByteStore: an in-memory store with a fixed read latency.
+    """
+
+    def __init__(self, latency: float = 0.003) -> None:
+        super().__init__()
+        self.latency = latency
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        time.sleep(self.latency)
+        return super().mget(keys)
+
+    async def amget(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        await asyncio.sleep(self.latency)
+        return [self.store.get(key) for key in keys]
+
+
+class FakeTicker:
+    """
+    yfinance-like ticker returning small fixed data after a fixed latency per call.
+    """
+
+    def __init__(self, symbol: str, latency: float) -> None:
+        self.symbol = symbol
+        self.latency = latency
+        self.calls = 0
+
+    def _wait(self) -> None:
+        self.calls += 1
+        time.sleep(self.latency)
+
+    def get_info(self) -> dict:
+        self._wait()
+        return {"symbol": self.symbol, "longName": "Renault SA", "sector": "Consumer Cyclical", "currentPrice": 45.2}
+
+    def get_calendar(self) -> dict:
+        self._wait()
+        return {"Dividend Date": "2025-05-20", "Earnings Date": ["2025-07-31"]}
+
+    def get_news(self) -> list:
+        self._wait()
+        return [{"title": f"{self.symbol} news {i}"} for i in range(5)]
+
+    def _holders(self) -> pd.DataFrame:
+        self._wait()
+        return pd.DataFrame({"Holder": ["Fund A", "Fund B"], "pctHeld": [0.02, 0.01], "Shares": [5_000_000, 2_500_000]})
+
+    def get_mutualfund_holders(self) -> pd.DataFrame:
+        return self._holders()
+
+    def get_institutional_holders(self) -> pd.DataFrame:
+        return self._holders()
+
+    def get_upgrades_downgrades(self) -> pd.DataFrame:
+        self._wait()
+        dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=50, freq="W", name="GradeDate")
+        return pd.DataFrame(
+            {
+                "Firm": [f"Bank {i % 7}" for i in range(len(dates))],
+                "ToGrade": ["Buy", "Hold"] * (len(dates) // 2),
+                "FromGrade": ["Hold", "Buy"] * (len(dates) // 2),
+                "Action": ["up", "down", "main", "init", "reit"] * (len(dates) // 5),
+            },
+            index=dates,
+        ).sort_index(ascending=False)
+
+    def history(self, start: Optional[str] = None, period: str = "max", **kwargs: Any) -> pd.DataFrame:
+        self._wait()
+        dates = pd.bdate_range("2020-01-01", pd.Timestamp.today().normalize(), tz="Europe/Paris", name="Date")
+        close = 40 + 10 * np.sin(np.arange(len(dates)) / 50)
+        frame = pd.DataFrame({"Open": close, "High": close + 0.5, "Low": close - 0.5, "Close": close, "Volume": 1_000_000}, index=dates)
+        return frame if start is None else frame[frame.index >= pd.Timestamp(start, tz="Europe/Paris")]
+
+    def get_splits(self) -> pd.Series:
+        self._wait()
+        return pd.Series([2.0], index=pd.DatetimeIndex(["1999-07-01"], name="Date"), name="Stock Splits")
+
+
+class FakeMarketBackend:
+    """
+    Market backend of FakeTickers, to run the agent tools offline.
+
+    Args:
+        latency (float): Seconds per ticker call, like a Yahoo round trip.
+    """
+
+    def __init__(self, latency: float = 0.3) -> None:
+        self.latency = latency
+        self.tickers = {}
+
+    def ticker(self, symbol: str) -> FakeTicker:
+        if symbol not in self.tickers:
+            self.tickers[symbol] = FakeTicker(symbol, self.latency)
+        return self.tickers[symbol]
+
+
+class ScriptedAgent(BaseMultiActionAgent):
+    """
+    Agent asking for all `tool_calls` in its first step, then finishing.
+    """
+
+    tool_calls: List[Tuple[str, dict]]
+
+    @property
+    def input_keys(self) -> List[str]:
+        return ["messages"]
+
+    def plan(self, intermediate_steps, callbacks=None, **kwargs: Any):
+        if intermediate_steps:
+            return AgentFinish({"output": f"Used {len(intermediate_steps)} tools."}, log="")
+        return [AgentAction(tool, tool_input, log="") for tool, tool_input in self.tool_calls]
+
+    async def aplan(self, intermediate_steps, callbacks=None, **kwargs: Any):
+        return self.plan(intermediate_steps, callbacks, **kwargs)
@@ -0,0 +1,106 @@
+"""
+    Latency and recall of year-filtered search as the corpus grows to many years.
+
+    Offline, on the local index over synthetic clustered embeddings, with a fixed
+    number of chunks per year. The filter pushed down to the index is compared with
+    over-fetching then filtering the results, recall measured against an exact scan
+    of the year:
+    `python -m benchmarks.filtered_search --chunks-per-year 5000 --years 2 5 10 20`
+
+    Against PGVector, on the real collection, for each year it holds (needs the
+    Postgres container and an ingested collection):
+    `python -m benchmarks.filtered_search --pgvector`
+"""
+
+import argparse
+import statistics
+import time
+from typing import Callable
+
+import numpy as np
+
+from config.logger import logger
+from ann_index import IVFIndex, LocalVectorStore
+from metadata_filters import normalize_filter
+from benchmarks.ann_recall import clustered_vectors
+from benchmarks.fakes import HashingEmbeddings
+
+
+def median_ms(search: Callable[[np.ndarray], list], queries: np.ndarray) -> float:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies) * 1000
+
+
+def offline(args) -> None:
+    queries = clustered_vectors(args.queries, args.dim, seed=1)
+    for n_years in args.years:
+        n_rows = args.chunks_per_year * n_years
+        vectors = clustered_vectors(n_rows, args.dim)
+        metadatas = [{"year": 2024 - i % n_years, "source_type": "pdf"} for i in range(n_rows)]
+        index = IVFIndex.build(vectors, [str(i) for i in range(n_rows)], [""] * n_rows, metadatas)
+        store = LocalVectorStore(HashingEmbeddings(args.dim), index)
+        year_filter = normalize_filter({"year": 2024})
+        store.similarity_search_by_vector(queries[0], k=args.k, filter=year_filter)  # builds the partitions
+
+        def post_filter(query):
+            # Without push-down: over-fetch, then drop the other years.
+            docs = store.similarity_search_by_vector(query, k=args.k * n_years)
+            return [doc for doc in docs if doc.metadata["year"] == 2024][:args.k]
+
+        def pushed_down(query):
+            return store.similarity_search_by_vector(query, k=args.k, filter=year_filter)
+
+        year_rows = index.partitions.rows(year_filter)
+        year_vectors = index.vectors[year_rows]
+        truth = [{index.ids[year_rows[i]] for i in np.argsort(-(year_vectors @ q))[:args.k]} for q in queries]
+        for name, search in [("post-filter", post_filter), ("pushed-down", pushed_down)]:
+            recall = statistics.mean(
+                len({doc.id for doc in search(q)} & expected) / args.k for q, expected in zip(queries, truth)
+            )
+            logger.info(
+                f"{n_years:>3} years {n_rows:>8} chunks  {name:<11} recall@{args.k}={recall:.3f} "
+                f"p50={median_ms(search, queries):.2f}ms"
+            )
+
+
+def against_pgvector(args) -> None:
+    from sqlalchemy import text
+
+    from registry import registry
+
+    retriever = registry.retriever()
+    pgvector = retriever.vectorstore
+    with retriever.docstore.engine.connect() as connection:
+        years = connection.execute(
+            text("SELECT DISTINCT cmetadata ->> 'year' FROM langchain_pg_embedding WHERE cmetadata ? 'year'")
+        ).scalars().all()
+    queries = [pgvector.embeddings.embed_query(q) for q in ["marge opérationnelle", "ventes de véhicules électriques"]]
+    unfiltered = median_ms(lambda q: pgvector.similarity_search_by_vector(q, k=args.k), queries)
+    logger.info(f"unfiltered  p50={unfiltered:.2f}ms")
+    for year in sorted(years):
+        year_filter = normalize_filter({"year": year})
+        filtered = median_ms(lambda q: pgvector.similarity_search_by_vector(q, k=args.k, filter=year_filter), queries)
+        logger.info(f"year {year}   p50={filtered:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks-per-year", type=int, default=5_000)
+    parser.add_argument("--years", type=int, nargs="+", default=[2, 5, 10, 20])
+    parser.add_argument("--dim", type=int, default=384, help="all-MiniLM-L6-v2 dimension")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--pgvector", action="store_true", help="Run on the real collection")
+    args = parser.parse_args()
+    if args.pgvector:
+        against_pgvector(args)
+    else:
+        offline(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+    Recall@k and latency of vector-only and hybrid (BM25 + vector, RRF) retrieval.
+
+    Known-item queries: each query is built from one chunk and labeled with it.
+    - figure: a figure and a year of the chunk, with a few of its words, like
+      "chiffre d'affaires de 41,2 milliards en 2023".
+    - topic: a few words of the chunk, no figure.
+
+    Offline, on a synthetic corpus with hashing embeddings (blind to figures, like
+    MiniLM is mostly) and the local vectorstore:
+    `python -m benchmarks.hybrid_recall --chunks 20000`
+
+    On the real collection, queries made of the rarest terms of sampled chunks (needs
+    the Postgres container and an ingested collection):
+    `python -m benchmarks.hybrid_recall --pgvector`
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.vectorstores import VectorStore
+
+from config.logger import logger
+from config.settings import COLLECTION_NAME
+from ann_index import IVFIndex, LocalVectorStore
+from hybrid import BM25Index, HybridVectorStore, analyze, sync_bm25_from_pgvector
+from benchmarks.corpus import synthetic_documents
+from benchmarks.fakes import HashingEmbeddings
+
+# (query, id of the chunk answering it)
+LabeledQuery = Tuple[str, str]
+
+
+def measure(store: VectorStore, queries: List[LabeledQuery], k: int) -> Tuple[float, float]:
+    latencies, hits = [], 0
+    for query, expected in queries:
+        start = time.perf_counter()
+        found = store.similarity_search(query, k=k)
+        latencies.append(time.perf_counter() - start)
+        hits += expected in {doc.id for doc in found}
+    return hits / len(queries), statistics.median(latencies) * 1000
+
+
+def compare(dense: VectorStore, bm25: BM25Index, queries_by_kind: dict, k: int) -> None:
+    hybrid = HybridVectorStore(dense, bm25)
+    for kind, queries in queries_by_kind.items():
+        for name, store in [("vector", dense), ("hybrid", hybrid)]:
+            recall, p50 = measure(store, queries, k)
+            logger.info(f"{kind:<7} {name:<7} recall@{k}={recall:.3f} p50={p50:.2f}ms")
+
+
+def offline(args) -> None:
+    rng = random.Random(0)
+    documents = synthetic_documents(args.chunks, size=800)
+    ids, texts, metadatas = [], [], []
+    figure_queries, topic_queries = [], []
+    for i, doc in enumerate(documents):
+        figure = f"{rng.randint(1, 99)},{rng.randint(0, 9)}"
+        year = doc.metadata["year"]
+        text_ = f"{doc.page_content} Le chiffre d'affaires atteint {figure} milliards d'euros en {year}."
+        ids.append(str(i))
+        texts.append(text_)
+        metadatas.append(doc.metadata)
+        if len(figure_queries) < args.queries:
+            words = rng.sample(doc.page_content.split(), 3)
+            figure_queries.append((f"chiffre d'affaires de {figure} milliards en {year} {' '.join(words)}", str(i)))
+            topic_queries.append((" ".join(rng.sample(doc.page_content.split(), 8)), str(i)))
+
+    embeddings = HashingEmbeddings(args.dim)
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    ivf = IVFIndex.build(vectors, ids, texts, metadatas, n_lists=int(np.sqrt(len(ids))))
+    bm25 = BM25Index.build(ids, texts, metadatas)
+    logger.info(f"Indexed {len(ids)} chunks in {time.perf_counter() - start:.1f}s")
+    compare(LocalVectorStore(embeddings, ivf), bm25, {"figure": figure_queries, "topic": topic_queries}, args.k)
+
+
+def against_pgvector(args) -> None:
+    from registry import registry
+
+    retriever = registry.retriever()
+    bm25 = sync_bm25_from_pgvector(retriever.docstore.engine, COLLECTION_NAME)
+    rng = np.random.default_rng(0)
+    queries = []
+    for row in rng.choice(len(bm25), size=min(args.queries, len(bm25)), replace=False):
+        # The rarest terms of the chunk stand in for a question about its specifics.
+        terms = {t for t in analyze(bm25.texts[row]) if t in bm25.vocabulary}
+        rare = sorted(terms, key=lambda t: -bm25.idf[bm25.vocabulary[t]])[:5]
+        if rare:
+            queries.append((" ".join(rare), bm25.ids[row]))
+    compare(retriever.vectorstore, bm25, {"rare": queries}, args.k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=384, help="all-MiniLM-L6-v2 dimension")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--pgvector", action="store_true", help="Run on the real collection")
+    args = parser.parse_args()
+    if args.pgvector:
+        against_pgvector(args)
+    else:
+        offline(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+    Cost of the image parents of retrieval results, with and without lazy handles.
+
+    A docstore in SQLite holds text parents and JPEG table images. Each request reads
+    the parents of a retrieval result (2 images, 2 texts) and builds the prompt images:
+    - eager: `mget` of the full base64 images, then decode and resize every time.
+    - lazy: `mget_handles` reads thumbnails only; prompt images are fetched and
+      resized once, then served from the resize cache by content hash.
+
+    `python -m benchmarks.image_payloads --images 200 --requests 300`
+"""
+
+import argparse
+import base64
+import io
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from config.logger import logger
+from config.settings import PROMPT_IMAGE_SIZE
+from images import prompt_images
+from utils import _resize_base64_image, parse_docs
+from benchmarks.corpus import synthetic_documents
+from benchmarks.fakes import sqlite_docstore
+
+
+def table_image_b64(seed: int, size=(1600, 1000)) -> str:
+    """
+    A JPEG the size of an extracted table, with enough detail not to compress to nothing.
+    """
+    rng = np.random.default_rng(seed)
+    pixels = np.full((size[1], size[0], 3), 255, dtype=np.uint8)
+    pixels[::25] = 0  # table rows
+    pixels[:, ::160] = 0  # table columns
+    pixels = np.clip(pixels.astype(np.int16) - rng.integers(0, 60, pixels.shape), 0, 255).astype(np.uint8)
+    buffered = io.BytesIO()
+    Image.fromarray(pixels).save(buffered, format="JPEG", quality=90)
+    return base64.b64encode(buffered.getvalue()).decode("ascii")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--texts", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = sqlite_docstore(tmp_dir)
+        images = [(f"image-{i}", table_image_b64(i), f"Rapport_{2020 + i % 5}/table-{i}-1.jpg") for i in range(args.images)]
+        texts = [(f"text-{i}", doc, "report.pdf") for i, doc in enumerate(synthetic_documents(args.texts))]
+        start = time.perf_counter()
+        store.mset(images + texts)
+        logger.info(f"Stored {args.images} images and {args.texts} texts in {time.perf_counter() - start:.1f}s")
+
+        # Popular questions come back: draw results from a skewed distribution.
+        rng = random.Random(0)
+        weights = [1 / (rank + 1) for rank in range(args.images)]
+        requests = [
+            [key for key, _, _ in rng.choices(images, weights, k=2)] + [key for key, _, _ in rng.sample(texts, 2)]
+            for _ in range(args.requests)
+        ]
+
+        def eager(keys):
+            context = parse_docs(store.mget(keys))
+            return [_resize_base64_image(image, PROMPT_IMAGE_SIZE) for image in context["images"]]
+
+        def lazy(keys):
+            return prompt_images(parse_docs(store.mget_handles(keys))["images"])
+
+        for name, build in [("eager", eager), ("lazy", lazy)]:
+            latencies = []
+            for keys in requests:
+                start = time.perf_counter()
+                build(keys)
+                latencies.append(time.perf_counter() - start)
+            logger.info(
+                f"{name:<6} p50={statistics.median(latencies) * 1000:.1f}ms "
+                f"mean={statistics.mean(latencies) * 1000:.1f}ms"
+            )
+
+        handles = store.mget_handles([key for key, _, _ in images])
+        full = sum(len(image) for _, image, _ in images)
+        thumbnails = sum(len(handle.thumbnail) for handle in handles)
+        logger.info(f"per image: full {full / args.images / 1024:.0f}KiB base64, thumbnail {thumbnails / args.images / 1024:.1f}KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+    Pages per second of the PDF extraction with a growing number of worker processes.
+
+    Every run extracts from scratch into a temporary directory, with its own manifest.
+    `python -m benchmarks.pdf_extraction --workers 1 2 4 --max-pages 16`
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from PyPDF2 import PdfReader, PdfWriter
+
+from config.logger import logger
+from config.settings import PDF_PAGES_PER_TASK, local_files
+from extract_unstructured_data_from_pdf import extract_all
+
+
+def truncate_pdf(file_path: str, max_pages: int, output_dir: str) -> str:
+    """
+    Copy the first `max_pages` pages of a PDF to `output_dir`.
+    """
+    reader = PdfReader(file_path)
+    writer = PdfWriter()
+    for page in reader.pages[:max_pages]:
+        writer.add_page(page)
+    output_path = os.path.join(output_dir, os.path.basename(file_path))
+    with open(output_path, "wb") as f:
+        writer.write(f)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", nargs="+", default=local_files()[:1], help="PDFs to extract")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--max-pages", type=int, default=16, help="Pages kept per PDF, 0 for all")
+    parser.add_argument("--pages-per-task", type=int, default=PDF_PAGES_PER_TASK)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as input_dir:
+        files = [truncate_pdf(f, args.max_pages, input_dir) for f in args.files] if args.max_pages else args.files
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as output_dir:
+                start = time.perf_counter()
+                n_pages = extract_all(files, output_dir, workers=workers, pages_per_task=args.pages_per_task)
+                elapsed = time.perf_counter() - start
+            logger.info(f"workers={workers:>2} {n_pages} pages in {elapsed:.1f}s, {n_pages / elapsed:.2f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
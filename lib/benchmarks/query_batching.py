@@ -0,0 +1,102 @@
+"""
+    QPS and latency of query embedding and retrieval with micro-batching, at
+    increasing concurrency.
+
+    The model is a stand-in costing like MiniLM on CPU (one forward pass at a time, see
+    ForwardPassEmbeddings). Clients are threads, like concurrent Streamlit sessions or
+    service requests:
+    - embed_query: `embed_query` calls alone, one forward pass per question, or through
+      MicroBatchEmbeddings at each `--waits` max wait.
+    - retrieve: FilteredMultiVectorRetriever over the local index, without and with
+      micro-batching at EMBED_BATCH_MAX_WAIT_MS.
+
+    `python -m benchmarks.query_batching --levels 1 4 16 64 --waits 0 2 5 10`
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config.logger import logger
+from config.settings import EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS, ID_KEY
+from ann_index import IVFIndex, LocalVectorStore
+from batching import MicroBatchEmbeddings
+from metadata_filters import FilteredMultiVectorRetriever
+from benchmarks.corpus import PAGE_SIZE, synthetic_documents
+from benchmarks.fakes import FakeDocStore, ForwardPassEmbeddings
+from benchmarks.retriever_latency import QUESTIONS
+
+
+def build_retriever(embeddings: Embeddings, n_parents: int) -> FilteredMultiVectorRetriever:
+    parents = synthetic_documents(n_parents, size=PAGE_SIZE)
+    docstore = FakeDocStore(latency=0.0)
+    ids = [f"parent-{i}" for i in range(n_parents)]
+    docstore.mset(list(zip(ids, parents)))
+    texts = [doc.page_content for doc in parents]
+    metadatas = [{**doc.metadata, ID_KEY: doc_id} for doc, doc_id in zip(parents, ids)]
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    return FilteredMultiVectorRetriever(
+        vectorstore=LocalVectorStore(embeddings, IVFIndex.build(vectors, ids, texts, metadatas)),
+        docstore=docstore,
+        id_key=ID_KEY,
+        infer_filters=False,
+    )
+
+
+def measure(call: Callable[[str], object], concurrency: int, n_requests: int) -> str:
+    def timed(i: int) -> float:
+        start = time.perf_counter()
+        call(QUESTIONS[i % len(QUESTIONS)])
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, range(n_requests)))
+    qps = n_requests / (time.perf_counter() - start)
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+    return f"{qps:>7.1f} q/s p50={p50:>6.1f}ms p95={p95:>6.1f}ms"
+
+
+def batched(model: ForwardPassEmbeddings, max_wait_ms: float) -> MicroBatchEmbeddings:
+    return MicroBatchEmbeddings(model, max_batch_size=EMBED_BATCH_MAX_SIZE, max_wait_ms=max_wait_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--waits", type=float, nargs="+", default=[0.0, 2.0, 5.0, 10.0], help="Max waits (ms) to compare")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--parents", type=int, default=200)
+    parser.add_argument("--ms-per-call", type=float, default=8.0, help="Forward pass cost of the stub model")
+    parser.add_argument("--ms-per-text", type=float, default=0.5)
+    args = parser.parse_args()
+
+    model = ForwardPassEmbeddings(seconds_per_call=args.ms_per_call / 1000, seconds_per_text=args.ms_per_text / 1000)
+    configs: List[Optional[float]] = [None, *args.waits]
+    for concurrency in args.levels:
+        for max_wait_ms in configs:
+            embeddings = model if max_wait_ms is None else batched(model, max_wait_ms)
+            result = measure(embeddings.embed_query, concurrency, args.requests)
+            name = "alone" if max_wait_ms is None else f"wait={max_wait_ms:g}ms"
+            batch = "" if max_wait_ms is None else f" mean batch={embeddings.batcher.mean_batch_size:.1f}"
+            logger.info(f"embed_query clients={concurrency:<3} {name:<11} {result}{batch}")
+            if max_wait_ms is not None:
+                embeddings.close()
+
+    for concurrency in args.levels:
+        for max_wait_ms in [None, EMBED_BATCH_MAX_WAIT_MS]:
+            embeddings = model if max_wait_ms is None else batched(model, max_wait_ms)
+            retriever = build_retriever(embeddings, args.parents)
+            result = measure(retriever.invoke, concurrency, args.requests)
+            name = "alone" if max_wait_ms is None else f"wait={max_wait_ms:g}ms"
+            logger.info(f"retrieve    clients={concurrency:<3} {name:<11} {result}")
+            if max_wait_ms is not None:
+                embeddings.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+    Accuracy/latency trade-off of the reranking stage as the candidate depth grows.
+
+    The corpus repeats each page across `--variants` years with different figures,
+    like successive annual reports. Known-item queries name the projects of a page
+    with a figure and a year of one of its chunks, like "ampera scenic 41,2 2023".
+    The first stage is the local vectorstore with hashing embeddings (blind to
+    figures, like MiniLM is mostly): it finds the page but not the year. For each
+    depth, `depth` chunks are fetched and reranked and recall@top_n is measured,
+    first without a latency budget, then with `--budget-ms`.
+
+    Offline, with a stub scorer costing `--ms-per-pair` per candidate:
+    `python -m benchmarks.rerank --chunks 20000`
+
+    With a real model (needs sentence-transformers and the model weights):
+    `python -m benchmarks.rerank --scorer cross-encoder`
+"""
+
+import argparse
+import random
+import statistics
+import string
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from config.logger import logger
+from ann_index import IVFIndex, LocalVectorStore
+from rerank import SCORERS, Reranker
+from benchmarks.corpus import synthetic_documents
+from benchmarks.fakes import HashingEmbeddings, OverlapScorer
+
+# (query, id of the chunk answering it)
+LabeledQuery = Tuple[str, str]
+
+
+def build_corpus(n_chunks: int, n_queries: int, variants: int) -> Tuple[List[str], List[str], List[dict], List[LabeledQuery]]:
+    """
+    Families of `variants` chunks sharing their wording and differing by their
+    figures, like the same page of successive annual reports.
+    """
+    rng = random.Random(0)
+    ids, texts, metadatas, queries = [], [], [], []
+    for family, doc in enumerate(synthetic_documents(n_chunks // variants, size=300)):
+        # Names of the page's projects and sites, which set pages apart.
+        names = ["".join(rng.choice(string.ascii_lowercase) for _ in range(8)) for _ in range(3)]
+        doc.page_content = f"{doc.page_content} Projets {' '.join(names)}."
+        for variant in range(variants):
+            figure = f"{rng.randint(1, 99)},{rng.randint(0, 9)}"
+            year = 2015 + variant
+            ids.append(f"{family}-{variant}")
+            texts.append(f"{doc.page_content} Le chiffre d'affaires atteint {figure} milliards d'euros en {year}.")
+            metadatas.append({**doc.metadata, "year": year})
+        if len(queries) < n_queries:
+            variant = rng.randrange(variants)
+            figure = texts[-variants + variant].split("atteint ")[1].split(" ")[0]
+            queries.append((f"{' '.join(names)} {figure} {2015 + variant}", ids[-variants + variant]))
+    return ids, texts, metadatas, queries
+
+
+def measure(store: LocalVectorStore, reranker: Reranker, queries: List[LabeledQuery], rerank: bool) -> Tuple[float, float]:
+    latencies, hits = [], 0
+    for query, expected in queries:
+        start = time.perf_counter()
+        if rerank:
+            found = reranker.rerank(query, store.similarity_search(query, k=reranker.candidates))
+        else:
+            found = store.similarity_search(query, k=reranker.top_n)
+        latencies.append(time.perf_counter() - start)
+        hits += expected in {doc.id for doc in found}
+    return hits / len(queries), statistics.median(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--variants", type=int, default=10, help="Years of each page")
+    parser.add_argument("--top-n", type=int, default=4)
+    parser.add_argument("--depths", type=int, nargs="+", default=[8, 16, 30, 60, 100])
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    parser.add_argument("--scorer", choices=["stub", *SCORERS], default="stub")
+    parser.add_argument("--ms-per-pair", type=float, default=4.0, help="Cost of the stub scorer")
+    args = parser.parse_args()
+
+    ids, texts, metadatas, queries = build_corpus(args.chunks, args.queries, args.variants)
+    embeddings = HashingEmbeddings()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    store = LocalVectorStore(embeddings, IVFIndex.build(vectors, ids, texts, metadatas, n_lists=int(np.sqrt(len(ids)))))
+    scorer = OverlapScorer(args.ms_per_pair / 1000) if args.scorer == "stub" else SCORERS[args.scorer]()
+
+    recall, p50 = measure(store, Reranker(scorer, top_n=args.top_n), queries, rerank=False)
+    logger.info(f"no rerank          recall@{args.top_n}={recall:.3f} p50={p50:>7.1f}ms")
+    for budget in [0, args.budget_ms]:
+        for depth in args.depths:
+            reranker = Reranker(scorer, candidates=depth, top_n=args.top_n, latency_budget_ms=budget)
+            reranker.rerank(queries[0][0], store.similarity_search(queries[0][0], k=depth))  # warm-up and first estimate
+            recall, p50 = measure(store, reranker, queries, rerank=True)
+            logger.info(
+                f"depth={depth:<4} budget={budget or '-':<6} recall@{args.top_n}={recall:.3f} "
+                f"p50={p50:>7.1f}ms reranked={reranker.depth()}"
+            )
+
+
+if __name__ == "__main__":
+    main()
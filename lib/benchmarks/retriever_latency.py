@@ -0,0 +1,76 @@
+"""
+    Compare cold and warm per-query retrieval latency.
+
+    Cold: every query builds its own registry, as `get_retriever()` used to do, so the
+    embedding model is reloaded and new connection pools are opened.
+    Warm: every query goes through the process-wide registry.
+
+    Needs the Postgres container of docker-compose.db.yml:
+    `python -m benchmarks.retriever_latency --queries 10`
+"""
+
+import argparse
+import statistics
+import time
+from typing import Callable, List
+
+from config.logger import logger
+from registry import ComponentRegistry
+
+QUESTIONS = [
+    "Quels sont les objectifs du plan Renaulution ?",
+    "Quelle est la marge opérationnelle du groupe en 2023 ?",
+    "Quel est le chiffre d'affaires de Renault en 2024 ?",
+]
+
+
+def time_queries(run_query: Callable[[str], None], n_queries: int) -> List[float]:
+    """
+    Time `n_queries` calls of `run_query`.
+
+    Args:
+        run_query (Callable): Runs the retrieval of one question.
+        n_queries (int): Number of queries to run.
+
+    Returns:
+        List[float]: Per-query latencies in seconds.
+    """
+    latencies = []
+    for i in range(n_queries):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        start = time.perf_counter()
+        run_query(question)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def cold_query(question: str) -> None:
+    registry = ComponentRegistry()
+    registry.retriever().invoke(question)
+    registry.close()
+
+
+def report(name: str, latencies: List[float]) -> None:
+    logger.info(
+        f"{name}: n={len(latencies)} "
+        f"mean={statistics.mean(latencies) * 1000:.1f}ms "
+        f"p50={statistics.median(latencies) * 1000:.1f}ms "
+        f"max={max(latencies) * 1000:.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=10, help="Number of queries per mode")
+    args = parser.parse_args()
+
+    report("cold", time_queries(cold_query, args.queries))
+
+    warm = ComponentRegistry()
+    warm.retriever().invoke(QUESTIONS[0])  # load the model and fill the pool
+    report("warm", time_queries(lambda question: warm.retriever().invoke(question), args.queries))
+    warm.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+    Throughput of the retrieval service under concurrent clients.
+
+    The service runs in process on a local port, over stand-ins: an embedding model
+    costing like MiniLM on CPU (one forward pass at a time, see ForwardPassEmbeddings),
+    the local vector index, an in-memory docstore and a stub LLM. Clients are threads
+    sending HTTP requests, like Streamlit workers:
+    - embed: one question per `/embed` request, each embedded alone
+      (EMBED_BATCH_MAX_SIZE=1) or batched with the concurrent ones.
+    - answer: `/answer`, retrieval and the RAG chain, with the questions embedded
+      alone or micro-batched (QUERY_MICRO_BATCHING, `--no-query-batching`).
+
+    `python -m benchmarks.service_throughput --levels 1 4 16 64 --requests 400`
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+import numpy as np
+
+from config.logger import logger
+from config.settings import EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS, ID_KEY, QUERY_MICRO_BATCHING
+from ann_index import IVFIndex, LocalVectorStore
+from batching import EmbeddingBatcher, MicroBatchEmbeddings
+from metadata_filters import FilteredMultiVectorRetriever
+from rag_service import RAGService, ServiceServer
+from service_client import RAGServiceClient
+from benchmarks.corpus import PAGE_SIZE, synthetic_documents
+from benchmarks.fakes import FakeChatModel, FakeDocStore, ForwardPassEmbeddings
+from benchmarks.retriever_latency import QUESTIONS
+
+
+def build_service(model: ForwardPassEmbeddings, n_parents: int, llm_latency: float, query_batching: bool) -> RAGService:
+    parents = synthetic_documents(n_parents, size=PAGE_SIZE)
+    docstore = FakeDocStore(latency=0.002)
+    docstore.mset([(f"parent-{i}", doc) for i, doc in enumerate(parents)])
+    ids = [f"parent-{i}" for i in range(n_parents)]
+    texts = [doc.page_content for doc in parents]
+    metadatas = [{**doc.metadata, ID_KEY: doc_id} for doc, doc_id in zip(parents, ids)]
+    vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+    query_embeddings = MicroBatchEmbeddings(model) if query_batching else model
+    retriever = FilteredMultiVectorRetriever(
+        vectorstore=LocalVectorStore(query_embeddings, IVFIndex.build(vectors, ids, texts, metadatas)),
+        docstore=docstore,
+        id_key=ID_KEY,
+    )
+    return RAGService(retriever=retriever, embeddings=model, llm=FakeChatModel(latency=llm_latency))
+
+
+def run_clients(call: Callable[[RAGServiceClient, str], None], url: str, concurrency: int, n_requests: int) -> str:
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def request(i: int) -> None:
+        start = time.perf_counter()
+        call(RAGServiceClient(url), QUESTIONS[i % len(QUESTIONS)])
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(request, range(n_requests)))
+    elapsed = time.perf_counter() - start
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+    return f"{n_requests / elapsed:>7.1f} req/s p50={p50:>7.1f}ms p95={p95:>7.1f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--parents", type=int, default=200)
+    parser.add_argument("--ms-per-call", type=float, default=8.0, help="Forward pass cost of the stub model")
+    parser.add_argument("--ms-per-text", type=float, default=0.5)
+    parser.add_argument("--llm-ms", type=float, default=50.0)
+    parser.add_argument("--no-query-batching", dest="query_batching", action="store_false", default=QUERY_MICRO_BATCHING)
+    args = parser.parse_args()
+
+    model = ForwardPassEmbeddings(seconds_per_call=args.ms_per_call / 1000, seconds_per_text=args.ms_per_text / 1000)
+    service = build_service(model, args.parents, args.llm_ms / 1000, args.query_batching)
+    server = ServiceServer(service, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    for name, max_batch_size in [("embed unbatched", 1), ("embed batched", EMBED_BATCH_MAX_SIZE)]:
+        for concurrency in args.levels:
+            service.batcher.close()
+            service.batcher = EmbeddingBatcher(model, max_batch_size=max_batch_size, max_wait_ms=EMBED_BATCH_MAX_WAIT_MS)
+            result = run_clients(lambda client, question: client.embed([question]), url, concurrency, args.requests)
+            logger.info(f"{name:<16} clients={concurrency:<3} {result} mean batch={service.batcher.mean_batch_size:.1f}")
+    for concurrency in args.levels:
+        result = run_clients(lambda client, question: client.answer(question), url, concurrency, args.requests)
+        logger.info(f"{'answer':<16} clients={concurrency:<3} {result}")
+    server.shutdown()
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
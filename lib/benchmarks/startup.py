@@ -0,0 +1,81 @@
+"""
+    Startup time of the entrypoints, measured with `python -X importtime`.
+
+    Each module is imported in a fresh interpreter, `--repeat` times. Reported per
+    module: the median cumulative import time and wall-clock time of the process,
+    and the packages costing the most, by the time spent in their own modules.
+
+    `python -m benchmarks.startup`
+    `python -m benchmarks.startup --modules rag_app renault_agent --top 10`
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from config.logger import logger
+
+ENTRYPOINTS = ["config.settings", "registry", "retriever", "rag_app", "async_rag", "renault_agent"]
+LIB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# "import time:   self [us] | cumulative | imported package", nesting in the name's indent.
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def import_profile(module: str) -> Tuple[float, float, Dict[str, float]]:
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+        Tuple[float, float, Dict[str, float]]: Cumulative import time of the module
+        and wall-clock time of the process in ms, and the self time of each top-level
+        package in ms.
+    """
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=LIB_DIR, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if process.returncode != 0:
+        raise RuntimeError(f"Cannot import {module}: {process.stderr.strip().splitlines()[-1]}")
+    cumulative_ms, packages = 0.0, Counter()
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us) / 1000
+        if name == module and not indent:
+            cumulative_ms = int(cumulative_us) / 1000
+    return cumulative_ms, wall_ms, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=ENTRYPOINTS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Heaviest packages shown per module")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        imports, walls, packages = [], [], Counter()
+        for _ in range(args.repeat):
+            cumulative_ms, wall_ms, run_packages = import_profile(module)
+            imports.append(cumulative_ms)
+            walls.append(wall_ms)
+            packages.update(run_packages)
+        heaviest: List[str] = [f"{name} {ms / args.repeat:.0f}ms" for name, ms in packages.most_common(args.top)]
+        logger.info(
+            f"{module:<16} import={statistics.median(imports):>7.0f}ms "
+            f"process={statistics.median(walls):>7.0f}ms  heaviest: {', '.join(heaviest)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+    Offline benchmark suite of the ingestion and query paths, with JSON results and a
+    comparison against a stored baseline.
+
+    Everything runs in process on deterministic stand-ins: synthetic report pages and
+    transcripts (corpus.py), a local WordPiece tokenizer, hashing embeddings, a stub
+    LLM, and PostgresByteStore on SQLite (fakes.py). Cases:
+    - chunking: token-aware and character chunkers over pages and transcripts.
+    - embedding: CachedEmbeddings cold (every text embedded) and warm (all cached).
+    - docstore: mset of the parents, mget and mget_handles of a retrieval result.
+    - retrieval: FilteredMultiVectorRetriever over the local index, vector and hybrid.
+    - end_to_end: the RAG chain with context assembly and the stub LLM.
+
+    Throughputs are the median of `--repeat` runs, latencies percentiles over the
+    queries. Metrics ending in `_per_s` are better higher, in `_ms` better lower; the
+    others (chunk counts) describe the output and are expected not to change.
+
+    `python -m benchmarks.suite --save-baseline` stores benchmarks/baseline.json.
+    `python -m benchmarks.suite --output results.json --fail-on-regression` compares
+    with it and exits with 1 if a metric got worse by more than `--tolerance`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config.logger import logger
+from config.settings import ID_KEY
+from ann_index import IVFIndex, LocalVectorStore
+from chunker import TextChunker, TokenChunker
+from embeddings import CachedEmbeddings, EmbeddingCache
+from hybrid import BM25Index, HybridVectorStore
+from metadata_filters import FilteredMultiVectorRetriever
+from rag_app import build_rag_chain
+from benchmarks.corpus import PAGE_SIZE, TRANSCRIPT_SIZE, synthetic_documents, synthetic_transcripts
+from benchmarks.fakes import FakeChatModel, HashingEmbeddings, fake_tokenizer, sqlite_docstore
+from benchmarks.retriever_latency import QUESTIONS
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+Metrics = Dict[str, float]
+
+
+def median_seconds(run: Callable[[], None], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def latency_metrics(run: Callable[[str], None], n_queries: int) -> Metrics:
+    latencies = []
+    for i in range(n_queries):
+        start = time.perf_counter()
+        run(QUESTIONS[i % len(QUESTIONS)])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": float(np.percentile(latencies, 50)), "p95_ms": float(np.percentile(latencies, 95))}
+
+
+class Suite:
+    """
+    Corpus and components shared by the cases, built once.
+
+    Args:
+        pages (int): Annual-report pages of the corpus.
+        transcripts (int): Transcripts of the corpus.
+        queries (int): Queries per latency measurement.
+        repeat (int): Runs per throughput measurement.
+        work_dir (str): Directory of the SQLite docstore and embedding caches.
+    """
+
+    def __init__(self, pages: int, transcripts: int, queries: int, repeat: int, work_dir: str) -> None:
+        self.queries = queries
+        self.repeat = repeat
+        self.work_dir = work_dir
+        self.documents = synthetic_documents(pages, size=PAGE_SIZE) + synthetic_transcripts(transcripts, size=TRANSCRIPT_SIZE)
+        self.doc_ids = [f"doc-{i}" for i in range(len(self.documents))]
+        self.tokenizer = fake_tokenizer()
+        self.embeddings = HashingEmbeddings()
+        self.chunks: List[Document] = []
+        self.store = sqlite_docstore(work_dir)
+        self._retrievers: Dict[bool, FilteredMultiVectorRetriever] = {}
+
+    def chunking(self) -> Metrics:
+        metrics = {}
+        for name, chunker in [
+            ("token", TokenChunker(tokenizer=self.tokenizer, workers=1)),
+            ("character", TextChunker(chunk_size=500, chunk_overlap=50)),
+        ]:
+            chunks = chunker.split(self.documents, self.doc_ids)
+            seconds = median_seconds(lambda: chunker.split(self.documents, self.doc_ids), self.repeat)
+            metrics[f"{name}_docs_per_s"] = len(self.documents) / seconds
+            metrics[f"{name}_chunks"] = len(chunks)
+            if name == "token":
+                self.chunks = chunks
+        return metrics
+
+    def embedding(self) -> Metrics:
+        texts = [chunk.page_content for chunk in self.chunks]
+        runs = iter(range(self.repeat))
+
+        def cold() -> None:
+            cache = EmbeddingCache(os.path.join(self.work_dir, "embeddings"), f"cold-{next(runs)}")
+            CachedEmbeddings(self.embeddings, "bench", cache=cache).embed_documents(texts)
+
+        warm = CachedEmbeddings(self.embeddings, "bench", cache=EmbeddingCache(os.path.join(self.work_dir, "embeddings"), "warm"))
+        warm.embed_documents(texts)
+        return {
+            "cold_texts_per_s": len(texts) / median_seconds(cold, self.repeat),
+            "warm_texts_per_s": len(texts) / median_seconds(lambda: warm.embed_documents(texts), self.repeat),
+        }
+
+    def docstore(self) -> Metrics:
+        items = list(zip(self.doc_ids, self.documents))
+        seconds = median_seconds(lambda: self.store.mset(items), self.repeat)
+        rng = np.random.default_rng(0)
+        results = [[self.doc_ids[i] for i in rng.choice(len(self.doc_ids), size=4, replace=False)] for _ in range(self.queries)]
+        metrics = {"write_rows_per_s": len(items) / seconds}
+        for name, read in [("mget", self.store.mget), ("mget_handles", self.store.mget_handles)]:
+            latencies = []
+            for keys in results:
+                start = time.perf_counter()
+                read(keys)
+                latencies.append((time.perf_counter() - start) * 1000)
+            metrics[f"{name}_p50_ms"] = float(np.percentile(latencies, 50))
+        return metrics
+
+    def retriever(self, hybrid: bool) -> FilteredMultiVectorRetriever:
+        if hybrid not in self._retrievers:
+            ids = [str(i) for i in range(len(self.chunks))]
+            texts = [chunk.page_content for chunk in self.chunks]
+            metadatas = [chunk.metadata for chunk in self.chunks]
+            vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+            vectorstore = LocalVectorStore(self.embeddings, IVFIndex.build(vectors, ids, texts, metadatas))
+            if hybrid:
+                vectorstore = HybridVectorStore(vectorstore, BM25Index.build(ids, texts, metadatas))
+            self._retrievers[hybrid] = FilteredMultiVectorRetriever(
+                vectorstore=vectorstore, docstore=self.store, id_key=ID_KEY
+            )
+        return self._retrievers[hybrid]
+
+    def retrieval(self) -> Metrics:
+        metrics = {}
+        for name, hybrid in [("vector", False), ("hybrid", True)]:
+            retriever = self.retriever(hybrid)
+            for metric, value in latency_metrics(retriever.invoke, self.queries).items():
+                metrics[f"{name}_{metric}"] = value
+        return metrics
+
+    def end_to_end(self) -> Metrics:
+        chain = build_rag_chain(self.retriever(hybrid=True), llm=FakeChatModel(latency=0.0))
+        return latency_metrics(chain.invoke, self.queries)
+
+    def run(self, cases: List[str]) -> Dict[str, Metrics]:
+        results = {}
+        # Later cases use the chunks of the chunking case.
+        for case in ["chunking"] + [case for case in cases if case != "chunking"]:
+            start = time.perf_counter()
+            metrics = getattr(self, case)()
+            if case in cases:
+                results[case] = {metric: round(value, 3) for metric, value in metrics.items()}
+                logger.info(f"{case}: {results[case]} ({time.perf_counter() - start:.1f}s)")
+        return results
+
+
+CASES = ["chunking", "embedding", "docstore", "retrieval", "end_to_end"]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Metrics], baseline: Dict[str, Metrics], tolerance: float) -> List[str]:
+    """
+    Log each metric next to its baseline value and return the regressions.
+
+    Args:
+        results: Metrics of this run, by case.
+        baseline: Metrics of the baseline run, by case.
+        tolerance: Relative change allowed before a timing counts as a regression.
+
+    Returns:
+        List[str]: "case.metric" of the metrics worse than the baseline by more than
+        `tolerance`, and of the output metrics that changed.
+    """
+    regressions = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(case, {}).get(metric)
+            if base is None:
+                continue
+            change = (value - base) / base if base else 0.0
+            if metric.endswith("_per_s"):
+                worse = change < -tolerance
+            elif metric.endswith("_ms"):
+                worse = change > tolerance
+            else:
+                worse = value != base
+            if worse:
+                regressions.append(f"{case}.{metric}")
+            logger.info(f"{case}.{metric:<24} {base:>12.3f} -> {value:>12.3f} ({change:+.1%}){'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--transcripts", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="JSON file receiving the results")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Relative slowdown counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = Suite(args.pages, args.transcripts, args.queries, args.repeat, work_dir).run(args.cases)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": {k: getattr(args, k) for k in ("pages", "transcripts", "queries", "repeat")},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Results written to {args.output}")
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Baseline written to {args.baseline}")
+        return
+    if not os.path.isfile(args.baseline):
+        logger.info(f"No baseline in {args.baseline}, run with --save-baseline to store one")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline["meta"]["params"] != report["meta"]["params"]:
+        logger.warning(f"Baseline measured with {baseline['meta']['params']}, metrics may not be comparable")
+    regressions = compare(results, baseline["results"], args.tolerance)
+    logger.info(f"{len(regressions)} regressions against the baseline of commit {baseline['meta']['commit']}")
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
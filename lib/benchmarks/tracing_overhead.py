@@ -0,0 +1,63 @@
+"""
+    Overhead of the tracing layer on the query path.
+
+    - per span: cost of opening and closing a span, tracing disabled and enabled.
+    - per query: the RAG chain over a stub retriever and LLM (no latency, so the
+      chain's own cost is all there is), tracing disabled and enabled.
+
+    `python -m benchmarks.tracing_overhead --queries 300`
+"""
+
+import argparse
+import statistics
+import time
+
+from config.logger import logger
+from rag_app import build_rag_chain
+from tracing import tracer
+from benchmarks.context_budget import build_parent_retriever
+from benchmarks.fakes import FakeChatModel
+from benchmarks.retriever_latency import QUESTIONS
+
+
+def span_cost(n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        with tracer.span("bench", keys=1) as span:
+            span.set(rows=1)
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--spans", type=int, default=100_000)
+    args = parser.parse_args()
+
+    retriever = build_parent_retriever()
+    retriever.docstore.latency = 0.0
+    retriever.vectorstore.latency = 0.0
+    tracer.trace_file = None
+    for enabled in [False, True]:
+        tracer.enabled = enabled
+        tracer.reset()
+        name = "enabled" if enabled else "disabled"
+        logger.info(f"{name:<8} per span {span_cost(args.spans) * 1e6:.2f}us")
+        tracer.reset()
+        chain = build_rag_chain(retriever, llm=FakeChatModel(latency=0.0))
+        latencies = []
+        for i in range(args.queries):
+            question = QUESTIONS[i % len(QUESTIONS)]
+            start = time.perf_counter()
+            with tracer.span("rag.query"):
+                chain.invoke(question)
+            latencies.append(time.perf_counter() - start)
+        spans = sum(len(trace["spans"]) for trace in tracer.recent) / max(len(tracer.recent), 1)
+        logger.info(
+            f"{name:<8} per query p50={statistics.median(latencies) * 1000:.2f}ms "
+            f"mean={statistics.mean(latencies) * 1000:.2f}ms ({spans:.0f} spans per trace)"
+        )
+
+
+if __name__ == "__main__":
+    main()
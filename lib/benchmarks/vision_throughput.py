@@ -0,0 +1,56 @@
+"""
+    Throughput of image description: sequential calls with a fixed sleep (the
+    previous behaviour) against the concurrent, rate-limited DescriptionEngine.
+
+    Uses a fake vision model, no API key is needed:
+    `python -m benchmarks.vision_throughput --images 20 --latency 0.5`
+"""
+
+import argparse
+import time
+
+from config.logger import logger
+from get_unstructured_data_descriptions import DescriptionEngine
+from benchmarks.corpus import synthetic_image_b64
+from benchmarks.fakes import fake_vision_chain
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per model call")
+    parser.add_argument("--sleep", type=float, default=2.0, help="Sleep of the sequential path")
+    parser.add_argument("--rate", type=float, default=4.0, help="Requests per second of the engine")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="Share of calls rate-limited")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    images = [synthetic_image_b64(size=10_000, seed=i) for i in range(args.images)]
+
+    chain = fake_vision_chain(args.latency)
+    start = time.perf_counter()
+    for image in images:
+        chain.invoke({"image": image})
+        time.sleep(args.sleep)
+    elapsed = time.perf_counter() - start
+    logger.info(f"sequential         {args.images / elapsed:6.2f} images/s ({elapsed:.1f}s)")
+
+    for concurrency in args.concurrency:
+        engine = DescriptionEngine(
+            chain=fake_vision_chain(args.latency, failure_rate=args.failure_rate),
+            requests_per_second=args.rate,
+            burst=concurrency,
+            concurrency=concurrency,
+            use_cache=False,
+        )
+        start = time.perf_counter()
+        engine.describe_many(images)
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"engine c={concurrency:<3}       {args.images / elapsed:6.2f} images/s ({elapsed:.1f}s, "
+            f"{engine.calls} calls incl. retries)"
+        )
+
+
+if __name__ == "__main__":
+    main()
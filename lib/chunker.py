@@ -2,10 +2,25 @@
     Module for text chunking
 """
 
-from typing import List
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from config.settings import ID_KEY
+from tokenizers import Tokenizer
+from config.settings import (
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_WORKERS,
+    CHUNKER,
+    EMBEDDING_MODEL_NAME,
+    ID_KEY,
+)
+
+# End of a sentence followed by whitespace, or a paragraph break.
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])\s+|\n\s*\n")
 
 
 class TextChunker:
@@ -17,6 +32,8 @@ class TextChunker:
             chunk_size (int): Size of each text chunk.
             chunk_overlap (int): Overlap between chunks.
         """
+        # Part of the ingestion hash: changing it re-chunks every parent (see ingestion.py).
+        self.fingerprint = f"character:{chunk_size}:{chunk_overlap}"
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
@@ -42,4 +59,158 @@ class TextChunker:
             for sub_doc in sub_docs:
                 sub_doc.metadata[ID_KEY] = doc_id
             chunks.extend(sub_docs)
-        return chunks
\ No newline at end of file
+        return chunks
+
+
+class TokenChunker:
+    """
+    One-pass, token-aware chunker.
+
+    Chunk sizes are counted in tokens of the embedding model's tokenizer, so no chunk
+    exceeds the model's input limit and gets silently truncated at embed time. All
+    documents are tokenized in one batched call, sentence boundaries are found with a
+    single regex scan of each text, and chunks are packed greedily up to the last
+    sentence boundary that fits (or cut at the limit inside a longer sentence).
+
+    Args:
+        max_tokens (int): Input limit of the embedding model, special tokens included.
+        overlap_tokens (int): Tokens repeated at the start of the next chunk.
+        model_name (str): Hugging Face model whose tokenizer counts the tokens.
+        tokenizer (tokenizers.Tokenizer): Tokenizer to use instead of loading the model's.
+        workers (int): Processes to split large batches with, 1 to stay in process.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        model_name: str = EMBEDDING_MODEL_NAME,
+        tokenizer: Optional[Tokenizer] = None,
+        workers: int = CHUNK_WORKERS,
+    ):
+        if tokenizer is None:
+            repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+            tokenizer = Tokenizer.from_pretrained(repo_id)
+        # Counting must see every token: the saved tokenizer may truncate or pad.
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+        self.tokenizer = tokenizer
+        self.chunk_tokens = max_tokens - tokenizer.num_special_tokens_to_add(is_pair=False)
+        self.overlap_tokens = min(overlap_tokens, self.chunk_tokens // 2)
+        self.workers = workers
+        # Part of the ingestion hash: changing it re-chunks every parent (see ingestion.py).
+        self.fingerprint = f"token:{model_name}:{max_tokens}:{overlap_tokens}"
+
+    def split(self, documents: List[Document], doc_ids: List[str]) -> List[Document]:
+        """
+        Splits a list of documents into chunks of at most `max_tokens` tokens, tagged with their document ID.
+
+        Args:
+            documents (List[Document]): A list of LangChain Document objects to split.
+            doc_ids (List[str]): A list of unique identifiers corresponding to each document.
+
+        Returns:
+            List[Document]: The chunks, in document order, with the metadata of their
+            document plus `start_index` and the document ID.
+        """
+        if self.workers > 1 and len(documents) >= 2 * self.workers:
+            shard_size = -(-len(documents) // self.workers)
+            shards = [
+                (documents[i:i + shard_size], doc_ids[i:i + shard_size])
+                for i in range(0, len(documents), shard_size)
+            ]
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                return [chunk for chunks in executor.map(self._split_shard, shards) for chunk in chunks]
+        return self._split_shard((documents, doc_ids))
+
+    def _split_shard(self, shard: Tuple[List[Document], List[str]]) -> List[Document]:
+        documents, doc_ids = shard
+        encodings = self.tokenizer.encode_batch([doc.page_content for doc in documents], add_special_tokens=False)
+        chunks = []
+        for doc, doc_id, encoding in zip(documents, doc_ids, encodings):
+            text = doc.page_content
+            if not encoding.offsets:
+                continue
+            offsets = np.asarray(encoding.offsets, dtype=np.int64)
+            boundaries = self._sentence_boundaries(text, offsets[:, 0])
+            word_ids = np.asarray([-1 if w is None else w for w in encoding.word_ids])
+            word_starts = np.flatnonzero(np.r_[True, word_ids[1:] != word_ids[:-1]])
+            for start, end in self._pack(len(offsets), boundaries, word_starts):
+                char_start, char_end = int(offsets[start, 0]), int(offsets[end - 1, 1])
+                chunks.append(
+                    Document(
+                        page_content=text[char_start:char_end],
+                        metadata={**doc.metadata, "start_index": char_start, ID_KEY: doc_id},
+                    )
+                )
+        return chunks
+
+    @staticmethod
+    def _sentence_boundaries(text: str, token_starts: np.ndarray) -> np.ndarray:
+        """
+        Token indices at which a sentence or paragraph starts.
+        """
+        char_positions = [match.end() for match in SENTENCE_BOUNDARY.finditer(text)]
+        return np.unique(np.searchsorted(token_starts, char_positions))
+
+    def _pack(self, n_tokens: int, boundaries: np.ndarray, word_starts: np.ndarray) -> Iterator[Tuple[int, int]]:
+        """
+        Yield (start, end) token ranges of the chunks.
+        """
+        start = 0
+        while start < n_tokens:
+            end = self._chunk_end(start, n_tokens, boundaries, word_starts)
+            yield start, end
+            if end >= n_tokens:
+                return
+            next_start = end
+            if self.overlap_tokens:
+                # Start the overlap on a sentence boundary, else on a word, when one falls inside it.
+                overlap_start = max(end - self.overlap_tokens, 0)
+                candidate = self._first_after(boundaries, overlap_start, end)
+                if candidate is None:
+                    candidate = self._first_after(word_starts, overlap_start, end)
+                if candidate is None:
+                    candidate = overlap_start
+                # Only overlap when the next chunk gets past this one. Otherwise (a long
+                # sentence after a boundary at `end`) it would end at `end` again and only
+                # repeat a suffix of this chunk.
+                if start < candidate < end and self._chunk_end(candidate, n_tokens, boundaries, word_starts) > end:
+                    next_start = candidate
+            start = next_start
+
+    def _chunk_end(self, start: int, n_tokens: int, boundaries: np.ndarray, word_starts: np.ndarray) -> int:
+        """
+        End of the chunk starting at `start`: the last sentence boundary that fits,
+        else the last word start, else the token limit.
+        """
+        limit = start + self.chunk_tokens
+        if limit >= n_tokens:
+            return n_tokens
+        end = self._last_before(boundaries, start, limit)
+        if end is None:
+            end = self._last_before(word_starts, start, limit)
+        if end is None:
+            end = limit
+        return end
+
+    @staticmethod
+    def _last_before(positions: np.ndarray, low: int, high: int) -> Optional[int]:
+        """Largest position in (low, high], or None."""
+        i = np.searchsorted(positions, high, side="right") - 1
+        return int(positions[i]) if i >= 0 and positions[i] > low else None
+
+    @staticmethod
+    def _first_after(positions: np.ndarray, low: int, high: int) -> Optional[int]:
+        """Smallest position in [low, high), or None."""
+        i = np.searchsorted(positions, low, side="left")
+        return int(positions[i]) if i < len(positions) and positions[i] < high else None
+
+
+def get_chunker():
+    """
+    Return the chunker selected by the CHUNKER setting: "token" or "character".
+    """
+    if CHUNKER == "character":
+        return TextChunker(chunk_size=500, chunk_overlap=50)
+    return TokenChunker()
@@ -1,15 +1,206 @@
+"""
+    Local cache of loaded documents and generated descriptions.
+
+    Entries live in one SQLite database (WAL mode), so concurrent threads and processes
+    read and write it safely and every write is atomic. Entries are grouped by namespace
+    and tagged with a version: bumping `CACHE_VERSION` invalidates them. An entry can
+    also be bound to a source file, and is invalidated when the file's mtime (or content
+    hash) changes. The database is kept under `CACHE_MAX_BYTES` by evicting the least
+    recently used entries.
+"""
+
 import os
 import hashlib
 import pickle
+import sqlite3
+import threading
+import time
 from typing import List, Optional, Any
 
-from config.settings import CACHE_DIR
+from config.settings import CACHE_DB, CACHE_DIR, CACHE_MAX_BYTES, CACHE_VERSION
+from tracing import tracer
 from config.logger import logger
 
+_MISSING = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    version TEXT NOT NULL,
+    source_signature TEXT,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+def source_signature(path: str, mode: str = "mtime") -> Optional[str]:
+    """
+    Fingerprint a source file: its mtime and size, or the SHA-256 of its content.
+
+    Args:
+        path: Path of the source file.
+        mode: "mtime" (cheap) or "hash" (survives touches and copies).
+
+    Returns:
+        The signature, or None if the file does not exist.
+    """
+    if not os.path.isfile(path):
+        return None
+    if mode == "hash":
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return "sha256:" + digest.hexdigest()
+    stat = os.stat(path)
+    return f"mtime:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class DiskCache:
+    """
+    Size-bounded LRU cache backed by SQLite, safe across threads and processes.
+
+    Args:
+        path: SQLite database file.
+        max_bytes: Maximum total size of the cached values.
+        version: Entries written with another version are misses.
+    """
+
+    def __init__(self, path: str = CACHE_DB, max_bytes: int = CACHE_MAX_BYTES, version: str = CACHE_VERSION) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = version
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and per process: connections must not cross a fork.
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _count(self, counter: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    def get(self, key: str, namespace: str = "default", source: Optional[str] = None, source_mode: str = "mtime", default: Any = None) -> Any:
+        """
+        Return a cached value.
+
+        Args:
+            key: Key of the entry.
+            namespace: Namespace of the entry.
+            source: Source file the entry was computed from, if any. The entry is a
+                miss if the file changed since it was cached.
+            source_mode: How the source is fingerprinted, "mtime" or "hash".
+            default: Returned on a miss.
+
+        Returns:
+            The cached value, or `default`.
+        """
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT version, source_signature, value FROM entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        signature = source_signature(source, source_mode) if source else None
+        if row is None or row[0] != self.version or row[1] != signature:
+            self._count("misses")
+            return default
+        connection.execute(
+            "UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?", (time.time(), namespace, key)
+        )
+        self._count("hits")
+        return pickle.loads(row[2])
+
+    def set(self, key: str, value: Any, namespace: str = "default", source: Optional[str] = None, source_mode: str = "mtime") -> None:
+        """
+        Cache a value, then evict least recently used entries if the cache is too large.
+
+        Args: see `get`.
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        signature = source_signature(source, source_mode) if source else None
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, version, source_signature, value, size, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, key, self.version, signature, data, len(data), time.time()),
+            )
+            self._evict(connection)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for namespace, key, size in connection.execute(
+            "SELECT namespace, key, size FROM entries ORDER BY accessed"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            connection.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+            total -= size
+            evicted += 1
+        self._count("evictions", evicted)
+        logger.info(f"Evicted {evicted} cache entries")
+
+    def delete(self, key: str, namespace: str = "default") -> None:
+        self._connection().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """
+        Delete every entry, or every entry of a namespace.
+        """
+        if namespace is None:
+            self._connection().execute("DELETE FROM entries")
+        else:
+            self._connection().execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> dict:
+        """
+        Return the hit, miss and eviction counters of this process, and the cache size.
+        """
+        entries, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+cache = DiskCache()
+tracer.register_cache("documents", cache)
+
 
 def get_cache_path(url: str) -> str:
     """
-    Generate a unique cache file path for a given URL.
+    Generate the path of the pickle file the previous cache used for a URL.
 
     Args:
         url: The YouTube video URL.
@@ -20,34 +211,46 @@ def get_cache_path(url: str) -> str:
     return os.path.join(CACHE_DIR, hashlib.md5(url.encode()).hexdigest() + ".pickle")
 
 
-def load_from_cache(url: str) -> Optional[List[Any]]:
+def load_from_cache(url: str, namespace: str = "default", source: Optional[str] = None) -> Optional[List[Any]]:
     """
     Load transcript data from cache if available.
 
+    Entries of the previous per-URL pickle files are moved into the cache on first read.
+
     Args:
-        url: The YouTube video URL.
+        url: The YouTube video URL, or any cache key.
+        namespace: Namespace of the entry.
+        source: Source file the data was loaded from, to invalidate it when the file changes.
 
     Returns:
         Cached list of documents, or None if cache does not exist.
     """
-    cache_path = get_cache_path(url)
-    if os.path.exists(cache_path):
-        with open(cache_path, "rb") as f:
-            logger.info(f"Loading from cache: {url}")
-            return pickle.load(f)
+    data = cache.get(url, namespace=namespace, source=source, default=_MISSING)
+    if data is not _MISSING:
+        logger.info(f"Loading from cache: {url}")
+        return data
+
+    # A legacy file cannot tell whether its source changed since: only migrate unbound entries.
+    legacy_path = get_cache_path(url)
+    if source is None and os.path.exists(legacy_path):
+        with open(legacy_path, "rb") as f:
+            data = pickle.load(f)
+        save_to_cache(url, data, namespace=namespace, source=source)
+        os.remove(legacy_path)
+        logger.info(f"Migrated legacy cache file of {url}")
+        return data
     return None
 
 
-def save_to_cache(url: str, data: List[Any]) -> None:
+def save_to_cache(url: str, data: List[Any], namespace: str = "default", source: Optional[str] = None) -> None:
     """
     Save transcript data to cache.
 
     Args:
-        url: The YouTube video URL.
+        url: The YouTube video URL, or any cache key.
         data: List of LangChain Documents.
+        namespace: Namespace of the entry.
+        source: Source file the data was loaded from.
     """
-    os.makedirs(CACHE_DIR, exist_ok=True)
-    cache_path = get_cache_path(url)
-    with open(cache_path, "wb") as f:
-        pickle.dump(data, f)
-    logger.info(f"Saved to cache: {url}")
\ No newline at end of file
+    cache.set(url, data, namespace=namespace, source=source)
+    logger.info(f"Saved to cache: {url}")
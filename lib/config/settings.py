@@ -1,12 +1,15 @@
 """
     Configuration module for environment variables, file paths, database settings, and LLM initialization.
 
+    Importing it is cheap: the chat models and the list of local PDFs are only built
+    when first used, through `get_model()`, `get_vision_model()` and `local_files()`.
+    `from config.settings import model` still works and builds the model at that point.
 """
+import functools
 import os
 from pathlib import Path
+from typing import List
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain_openai import ChatOpenAI
 
 # Define BASEDIR for the Project
 BASEDIR = Path(__file__).parents[2]
@@ -31,10 +34,16 @@ DATA_EXTRACTED_PATH = os.getenv("DATA_EXTRACTED_PATH", "data/extracted_data")
 PDF_FOLDER = os.getenv("DATA_FOLDER_PATH", "data/raw_pdf_data")
 TRANSCRIPTS_DIR = os.getenv("TRANSCRIPTS_DIR", "transcripts")
 
-LOCAL_FILES = [
-    os.path.relpath(os.path.join(BASEDIR, PDF_FOLDER, f), BASEDIR)
-    for f in os.listdir(os.path.join(BASEDIR, PDF_FOLDER))
-]
+
+@functools.lru_cache(maxsize=None)
+def local_files() -> List[str]:
+    """
+    Return the PDFs of PDF_FOLDER, relative to BASEDIR (LOCAL_FILES).
+    """
+    return [
+        os.path.relpath(os.path.join(BASEDIR, PDF_FOLDER, f), BASEDIR)
+        for f in os.listdir(os.path.join(BASEDIR, PDF_FOLDER))
+    ]
 
 
 # ------------------------ POSTGRES ------------------------
@@ -45,27 +54,127 @@ PG_PASSWORD = os.getenv("PG_VECTOR_PASSWORD")
 COLLECTION_NAME = os.getenv("PGDATABASE")
 
 CONNECTION_STRING = f"postgresql+psycopg://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:5432/{COLLECTION_NAME}"
+PG_POOL_SIZE = int(os.getenv("PG_POOL_SIZE", "5"))
+PG_MAX_OVERFLOW = int(os.getenv("PG_MAX_OVERFLOW", "10"))
+DOCSTORE_CODEC = os.getenv("DOCSTORE_CODEC", "binary")  # binary or pickle (legacy)
+DOCSTORE_COMPRESSION = os.getenv("DOCSTORE_COMPRESSION") or None  # None or zstd
+DOCSTORE_BATCH_SIZE = int(os.getenv("DOCSTORE_BATCH_SIZE", "1000"))
+DOCSTORE_WORKERS = int(os.getenv("DOCSTORE_WORKERS", "4"))
+
+
+# ------------------------ EMBEDDINGS ------------------------
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+CHUNKER = os.getenv("CHUNKER", "token")  # token (sized for the embedding model) or character
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))  # input limit of all-MiniLM-L6-v2
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "1"))
 
 
 # ------------------------ LLM  ------------------------
 
 llm_provider = os.getenv("LLM", "OPENAI").upper()
 
-if llm_provider == "OPENAI":
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    model = ChatOpenAI(api_key=openai_api_key, model="gpt-4o-mini", temperature=0)
-    vision_model = model
-elif llm_provider == "GROQ":
-    groq_api_key = os.getenv("GROQ_API_KEY")
-    model = ChatGroq(api_key=groq_api_key, model="llama3-8b-8192", temperature=0)
-    vision_model = ChatGroq(api_key=groq_api_key, model="llama-3.2-90b-vision-preview", temperature=0)
-else:
+if llm_provider not in ("OPENAI", "GROQ"):
     raise ValueError(f"Unsupported LLM provider: {llm_provider}")
 
 
+@functools.lru_cache(maxsize=None)
+def get_model():
+    """
+    Return the chat model of the configured provider (`model`), built on first use.
+    """
+    if llm_provider == "OPENAI":
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(api_key=os.getenv("OPENAI_API_KEY"), model="gpt-4o-mini", temperature=0)
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(api_key=os.getenv("GROQ_API_KEY"), model="llama3-8b-8192", temperature=0)
+
+
+@functools.lru_cache(maxsize=None)
+def get_vision_model():
+    """
+    Return the multimodal chat model describing images (`vision_model`), built on first use.
+    """
+    if llm_provider == "OPENAI":
+        return get_model()
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(api_key=os.getenv("GROQ_API_KEY"), model="llama-3.2-90b-vision-preview", temperature=0)
+
+
+# Attributes computed on first access (PEP 562).
+_LAZY_ATTRIBUTES = {"model": get_model, "vision_model": get_vision_model, "LOCAL_FILES": local_files}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # ------------------------ OTHER CONSTANTS ------------------------
 
 CACHE_DIR = "cache"
+CACHE_DB = os.path.join(CACHE_DIR, "cache.sqlite3")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(1024 ** 3)))
+CACHE_VERSION = os.getenv("CACHE_VERSION", "1")  # bump to invalidate every cached entry
+EMBEDDING_CACHE_DIR = os.path.join(CACHE_DIR, "embeddings")
+ANN_INDEX_DIR = os.path.join(CACHE_DIR, "ann_index")
+LOCAL_ANN_INDEX = os.getenv("LOCAL_ANN_INDEX", "false").lower() == "true"
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+BM25_INDEX_DIR = os.path.join(CACHE_DIR, "bm25_index")
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "20"))  # results of each ranking fused by RRF
+RRF_K = int(os.getenv("RRF_K", "60"))
+METADATA_FILTERS = os.getenv("METADATA_FILTERS", "true").lower() == "true"  # infer year/source filters from questions
+RERANK = os.getenv("RERANK", "none")  # "none", "cross-encoder" or "late-interaction" (needs sentence-transformers)
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))  # chunks fetched and rescored
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "4"))  # chunks kept after reranking
+RERANK_LATENCY_BUDGET_MS = float(os.getenv("RERANK_LATENCY_BUDGET_MS", "300"))  # 0 to rescore every candidate
+RERANK_TOKEN_CACHE_SIZE = int(os.getenv("RERANK_TOKEN_CACHE_SIZE", "4096"))  # chunks, late-interaction only
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+IMAGE_BATCH_SIZE = int(os.getenv("IMAGE_BATCH_SIZE", "16"))
+IMAGE_THUMBNAIL_SIZE = (256, 256)  # stored with each image parent
+PROMPT_IMAGE_SIZE = (1300, 600)  # images sent to the multimodal LLM fit in this box
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))  # prompt context, images included
+CONTEXT_PASSAGE_TOKENS = int(os.getenv("CONTEXT_PASSAGE_TOKENS", "200"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+PROMPT_ENCODING = os.getenv("PROMPT_ENCODING", "o200k_base")  # tiktoken encoding of gpt-4o-mini
+IMAGE_BASE_TOKENS = int(os.getenv("IMAGE_BASE_TOKENS", "85"))
+IMAGE_TILE_TOKENS = int(os.getenv("IMAGE_TILE_TOKENS", "170"))  # per 512px tile
+IMAGE_RESIZE_CACHE_SIZE = int(os.getenv("IMAGE_RESIZE_CACHE_SIZE", "128"))
+VISION_REQUESTS_PER_SECOND = float(os.getenv("VISION_REQUESTS_PER_SECOND", "1"))
+VISION_BURST = int(os.getenv("VISION_BURST", "2"))
+VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "4"))
+MARKET_DATA_DIR = os.getenv("MARKET_DATA_DIR", "data/market_data")
+MARKET_SYMBOLS = os.getenv("MARKET_SYMBOLS", "RNO.PA,^FCHI").split(",")
+MARKET_REFRESH_INTERVAL = float(os.getenv("MARKET_REFRESH_INTERVAL", "900"))  # seconds, 0 to disable
+AGENT_TOOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", "8"))
+ASYNC_RAG_CONCURRENCY = int(os.getenv("ASYNC_RAG_CONCURRENCY", "16"))
+RAG_SERVICE_URL = os.getenv("RAG_SERVICE_URL", "")  # e.g. http://localhost:8600, the app then calls rag_service.py
+RAG_SERVICE_HOST = os.getenv("RAG_SERVICE_HOST", "127.0.0.1")  # no authentication: use another interface only behind an authenticating proxy
+RAG_SERVICE_PORT = int(os.getenv("RAG_SERVICE_PORT", "8600"))
+RAG_SERVICE_TIMEOUT = float(os.getenv("RAG_SERVICE_TIMEOUT", "120"))  # seconds per request, client side
+QUERY_MICRO_BATCHING = os.getenv("QUERY_MICRO_BATCHING", "true").lower() == "true"  # embed concurrent questions together
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))  # texts per batched model call
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))  # wait for more requests before a call
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds
+ANSWER_CACHE_VERSION_CHECK = float(os.getenv("ANSWER_CACHE_VERSION_CHECK", "30"))  # seconds
+TRACING = os.getenv("TRACING", "false").lower() == "true"  # spans, metrics and traces of the query path
+TRACE_FILE = os.getenv("TRACE_FILE", "logs/traces.jsonl")  # one JSON trace per request, empty to disable
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))  # recent traces kept in memory
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # serves /metrics and /traces when tracing, 0 to disable
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # traces hold questions and answers: another interface only behind a proxy
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", "2"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
 CHROMA_PATH = "chroma"
 ID_KEY = "doc_id"
 LOG_FILE = "youtube_transcripts.log"
\ No newline at end of file
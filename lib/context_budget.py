@@ -0,0 +1,354 @@
+"""
+    Context assembly for the RAG prompt.
+
+    The retriever returns whole parents (PDF pages, full transcripts). Before they go
+    into the prompt, they are split into passages, near-duplicate passages are dropped
+    (the same page loaded twice, repeated boilerplate; by word 5-gram overlap, so
+    translations of a passage are not matched), passages are ranked by BM25
+    relevance to the question, and the best ones are kept within a token budget
+    that also counts the images. The kept passages are put back in
+    document order, under the title of their source.
+"""
+
+import base64
+import io
+import math
+import threading
+from collections import Counter
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from PIL import Image
+
+from config.logger import logger
+from config.settings import (
+    CONTEXT_DEDUP_THRESHOLD,
+    CONTEXT_PASSAGE_TOKENS,
+    CONTEXT_TOKEN_BUDGET,
+    IMAGE_BASE_TOKENS,
+    IMAGE_TILE_TOKENS,
+    PROMPT_ENCODING,
+)
+from chunker import SENTENCE_BOUNDARY
+from hybrid import analyze
+from images import prompt_images
+from tracing import tracer
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency, installed with langchain-openai
+    tiktoken = None
+
+SHINGLE_SIZE = 5
+
+
+class TokenCounter:
+    """
+    Counts prompt tokens with the tiktoken encoding of the LLM.
+
+    The encoding is loaded on first use. If it cannot be (tiktoken missing, or its
+    files not downloadable), counts fall back to an estimate of 4 characters per token.
+    """
+
+    def __init__(self, encoding: str = PROMPT_ENCODING) -> None:
+        self.encoding_name = encoding
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _get_encoding(self):
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                try:
+                    self._encoding = tiktoken.get_encoding(self.encoding_name) if tiktoken else None
+                except Exception as e:
+                    logger.warning(f"Cannot load the {self.encoding_name} encoding ({e}), estimating token counts")
+            return self._encoding
+
+    def count(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is None:
+            return math.ceil(len(text) / 4)
+        return len(encoding.encode(text, disallowed_special=()))
+
+
+token_counter = TokenCounter()
+
+
+def image_tokens(width: int, height: int, base: int = IMAGE_BASE_TOKENS, tile: int = IMAGE_TILE_TOKENS) -> int:
+    """
+    Tokens billed for a high-detail image: it is scaled to fit in 2048x2048, then
+    its shortest side to 768, and costs `base` plus `tile` per 512px tile.
+    """
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return base + tile * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def b64_image_tokens(b64_image: str) -> int:
+    # Only the header is parsed to read the size.
+    with Image.open(io.BytesIO(base64.b64decode(b64_image))) as img:
+        return image_tokens(*img.size)
+
+
+@dataclass
+class ContextStats:
+    """
+    Size of the context before and after assembly, in tokens.
+    """
+
+    parents: int = 0
+    passages: int = 0
+    duplicates: int = 0
+    kept_passages: int = 0
+    images: int = 0
+    kept_images: int = 0
+    tokens_before: int = 0
+    text_tokens: int = 0
+    image_tokens: int = 0
+
+    @property
+    def tokens_after(self) -> int:
+        return self.text_tokens + self.image_tokens
+
+    def as_dict(self) -> Dict[str, int]:
+        return {**asdict(self), "tokens_after": self.tokens_after}
+
+
+@dataclass
+class Passage:
+    parent: int
+    position: int
+    text: str
+    metadata: dict
+    tokens: int
+    score: float = 0.0
+
+
+def split_passages(text: str, max_tokens: int, counter: TokenCounter) -> List[Tuple[str, int]]:
+    """
+    Split a text into passages of whole sentences of about `max_tokens` tokens.
+    Sentences longer than that (unpunctuated transcripts) are cut between words,
+    like `TokenChunker` does.
+
+    Returns:
+        list: (passage, token count) pairs.
+    """
+    passages, current, current_tokens = [], [], 0
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        tokens = counter.count(sentence)
+        pieces = split_words(sentence, max_tokens, counter) if tokens > max_tokens else [(sentence, tokens)]
+        for piece, tokens in pieces:
+            if current and current_tokens + tokens > max_tokens:
+                passages.append((" ".join(current), current_tokens))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        passages.append((" ".join(current), current_tokens))
+    return passages
+
+
+def split_words(sentence: str, max_tokens: int, counter: TokenCounter) -> List[Tuple[str, int]]:
+    """
+    Split a sentence into pieces of at most `max_tokens` tokens between words, and
+    words longer than that between characters.
+
+    Returns:
+        list: (piece, token count) pairs.
+    """
+    parts, estimates = [], []
+    for word in sentence.split():
+        tokens = counter.count(f" {word}")
+        if tokens > max_tokens:
+            # One word above the limit (a URL, an encoded blob): cut it in even slices.
+            step = max(1, len(word) * max_tokens // tokens)
+            slices = [word[i:i + step] for i in range(0, len(word), step)]
+            parts.extend(slices)
+            estimates.extend(counter.count(part) for part in slices)
+        else:
+            parts.append(word)
+            estimates.append(tokens)
+    # Words counted one by one take more tokens than in running text.
+    scale = min(1.0, counter.count(sentence) / max(1, sum(estimates)))
+
+    pieces, start = [], 0
+    while start < len(parts):
+        end, total = start + 1, estimates[start] * scale
+        while end < len(parts) and total + estimates[end] * scale <= max_tokens:
+            total += estimates[end] * scale
+            end += 1
+        piece = " ".join(parts[start:end])
+        tokens = counter.count(piece)
+        while tokens > max_tokens and end - start > 1:
+            end = start + max(1, min(end - start - 1, (end - start) * max_tokens // tokens))
+            piece = " ".join(parts[start:end])
+            tokens = counter.count(piece)
+        pieces.append((piece, tokens))
+        start = end
+    return pieces
+
+
+def shingles(text: str) -> set:
+    words = analyze(text)
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def bm25_scores(question: str, passages: Sequence[Passage], k1: float = 1.2, b: float = 0.75) -> List[float]:
+    """
+    BM25 of each passage for the question, with statistics of the passages themselves.
+    """
+    terms = set(analyze(question))
+    docs = [Counter(analyze(passage.text)) for passage in passages]
+    if not docs or not terms:
+        return [0.0] * len(passages)
+    avg_length = sum(sum(doc.values()) for doc in docs) / len(docs) or 1.0
+    idf = {}
+    for term in terms:
+        df = sum(1 for doc in docs if term in doc)
+        idf[term] = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+    scores = []
+    for doc in docs:
+        norm = k1 * (1 - b + b * sum(doc.values()) / avg_length)
+        scores.append(sum(idf[t] * doc[t] * (k1 + 1) / (doc[t] + norm) for t in terms if t in doc))
+    return scores
+
+
+class ContextAssembler:
+    """
+    Fits retrieved parents into a token budget.
+
+    Args:
+        budget (int): Tokens available for the context, images included.
+        passage_tokens (int): Target size of the passages parents are split into.
+        dedup_threshold (float): Jaccard similarity of word 5-grams above which a
+            passage is a duplicate of a better-ranked one.
+        counter (TokenCounter): Token counter of the LLM.
+    """
+
+    def __init__(
+        self,
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        passage_tokens: int = CONTEXT_PASSAGE_TOKENS,
+        dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+        counter: Optional[TokenCounter] = None,
+    ) -> None:
+        self.budget = budget
+        self.passage_tokens = passage_tokens
+        self.dedup_threshold = dedup_threshold
+        self.counter = counter or token_counter
+
+    def assemble(self, question: str, context: Dict[str, list]) -> Dict[str, Any]:
+        """
+        Assemble the context of a question.
+
+        Args:
+            question (str): The question.
+            context (dict): Output of `parse_docs`: "texts" (parent Documents, in
+                retrieval order) and "images".
+
+        Returns:
+            dict: "texts" (kept passages as Documents with their parent's metadata, in
+            document order), "images" (prompt-ready base64 images) and "stats"
+            (ContextStats as a dict).
+        """
+        stats = ContextStats(parents=len(context["texts"]), images=len(context["images"]))
+        passages = []
+        for parent, doc in enumerate(context["texts"]):
+            text = doc.page_content if isinstance(doc, Document) else str(doc)
+            metadata = doc.metadata if isinstance(doc, Document) else {}
+            stats.tokens_before += self.counter.count(text)
+            for position, (passage, tokens) in enumerate(split_passages(text, self.passage_tokens, self.counter)):
+                passages.append(Passage(parent, position, passage, metadata, tokens))
+        stats.passages = len(passages)
+
+        # Relevance first, retrieval rank to break ties and favour the best parents.
+        for passage, score in zip(passages, bm25_scores(question, passages)):
+            passage.score = score + 1.0 / (60 + passage.parent)
+        ranked = sorted(passages, key=lambda p: p.score, reverse=True)
+
+        # Images keep their retrieval order and may use at most half of the budget.
+        images = prompt_images(context["images"])
+        kept_images = []
+        for image in images:
+            tokens = b64_image_tokens(image)
+            stats.tokens_before += tokens
+            if stats.image_tokens + tokens <= self.budget // 2:
+                kept_images.append(image)
+                stats.image_tokens += tokens
+
+        kept, kept_shingles = [], []
+        remaining = self.budget - stats.image_tokens
+        for passage in ranked:
+            if remaining <= 0:
+                break
+            if passage.tokens > remaining:
+                # The budget cannot take the whole passage: keep its beginning.
+                text, tokens = split_passages(passage.text, remaining, self.counter)[0]
+                if tokens > remaining:
+                    continue
+                passage = replace(passage, text=text, tokens=tokens)
+            passage_shingles = shingles(passage.text)
+            if any(jaccard(passage_shingles, other) >= self.dedup_threshold for other in kept_shingles):
+                stats.duplicates += 1
+                continue
+            kept.append(passage)
+            kept_shingles.append(passage_shingles)
+            remaining -= passage.tokens
+            stats.text_tokens += passage.tokens
+        kept.sort(key=lambda p: (p.parent, p.position))
+
+        stats.kept_passages = len(kept)
+        stats.kept_images = len(kept_images)
+        logger.info(
+            f"Context: {stats.tokens_before} -> {stats.tokens_after} tokens, "
+            f"{stats.kept_passages}/{stats.passages} passages ({stats.duplicates} duplicates), "
+            f"{stats.kept_images}/{stats.images} images"
+        )
+        return {
+            "texts": [Document(page_content=p.text, metadata=p.metadata) for p in kept],
+            "images": kept_images,
+            "stats": stats.as_dict(),
+        }
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def format_context(texts: Sequence[Document]) -> str:
+    """
+    Join passages under a header naming their source, one block per parent.
+    """
+    blocks, last_header = [], None
+    for doc in texts:
+        header = doc.metadata.get("title") or doc.metadata.get("source") or "Document"
+        if doc.metadata.get("page") is not None:
+            header = f"{header}, page {int(doc.metadata['page']) + 1}"
+        if header != last_header:
+            blocks.append(f"[{header}]")
+            last_header = header
+        blocks.append(doc.page_content)
+    return "\n\n".join(blocks)
+
+
+_assembler = ContextAssembler()
+
+
+def assemble_context(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Chain step replacing the parsed "context" of a {"context", "question"} dict by
+    the assembled one.
+    """
+    context = _assembler.assemble(kwargs["question"], kwargs["context"])
+    tracer.current().set(**context["stats"])
+    return context
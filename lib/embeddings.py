@@ -0,0 +1,236 @@
+"""
+    Content-addressed embedding cache in front of any LangChain `Embeddings`.
+
+    Vectors are keyed by sha256(model name + chunk text) and kept on disk in an
+    append-only float32 matrix (read through `numpy.memmap`) with a key index next
+    to it. Only cache misses reach the wrapped model, in large batches.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within the process.
+    fcntl = None
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config.logger import logger
+from config.settings import EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_DIR
+from tracing import tracer
+
+
+class EmbeddingCache:
+    """
+    Disk-backed vector store addressed by content keys.
+
+    Layout of `<directory>/<namespace>`:
+        - `vectors.f32`: float32 rows, appended in insertion order.
+        - `keys.txt`: one key per line, line `i` is the key of row `i`.
+        - `meta.json`: vector dimension.
+
+    Rows are written before their keys, so an interrupted write leaves at most a
+    few unreferenced rows. They are cut off on reload and before the next append.
+    Appends hold an exclusive lock on `<directory>/<namespace>/lock`, and each writer
+    first reads the keys appended by the others, so processes sharing the directory
+    stay aligned.
+    """
+
+    def __init__(self, directory: str, namespace: str) -> None:
+        self.path = os.path.join(directory, namespace.replace("/", "__"))
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.keys_path = os.path.join(self.path, "keys.txt")
+        self.meta_path = os.path.join(self.path, "meta.json")
+        self.lock_path = os.path.join(self.path, "lock")
+        self._lock = threading.Lock()
+        self._index: Dict[str, int] = {}
+        self._keys_offset = 0
+        self._rows = 0
+        self._matrix: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+        if os.path.isfile(self.meta_path):
+            with self._file_lock():
+                self._sync()
+
+    @contextlib.contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.lock_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _sync(self) -> None:
+        """
+        Read the keys appended since the last sync and cut off unreferenced rows.
+        Called with the file lock held.
+        """
+        if self.dim is None:
+            with open(self.meta_path, encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        if os.path.isfile(self.keys_path):
+            with open(self.keys_path, "rb") as f:
+                f.seek(self._keys_offset)
+                appended = f.read()
+            # Only complete lines: a key being written has no newline yet.
+            appended = appended[: appended.rfind(b"\n") + 1]
+            self._keys_offset += len(appended)
+            for key in appended.decode("utf-8").splitlines():
+                self._index.setdefault(key, self._rows)
+                self._rows += 1
+        row_bytes = 4 * self.dim
+        n_rows = self._rows
+        size = os.path.getsize(self.vectors_path) if os.path.isfile(self.vectors_path) else 0
+        if size > n_rows * row_bytes:
+            logger.warning(f"Dropping {(size - n_rows * row_bytes) // row_bytes} unreferenced rows of {self.vectors_path}")
+            os.truncate(self.vectors_path, n_rows * row_bytes)
+        elif size < n_rows * row_bytes:
+            raise RuntimeError(f"{self.vectors_path} holds fewer rows than {self.keys_path} has keys")
+        self._remap()
+
+    def _remap(self) -> None:
+        self._matrix = (
+            np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+            if self._rows
+            else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up vectors by key.
+
+        Args:
+            keys (Sequence[str]): Content keys.
+
+        Returns:
+            List[Optional[np.ndarray]]: The cached vector of each key, or None on a miss.
+        """
+        with self._lock:
+            rows = [self._index.get(key) for key in keys]
+            return [np.array(self._matrix[row]) if row is not None else None for row in rows]
+
+    def put_many(self, keys: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """
+        Append new vectors to the store. Keys already present are skipped.
+
+        Args:
+            keys (Sequence[str]): Content keys.
+            vectors (Sequence[Sequence[float]]): Vectors of the keys, same order.
+        """
+        with self._lock, self._file_lock():
+            if os.path.isfile(self.meta_path):
+                self._sync()
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self._index:
+                    new[key] = vector
+            if not new:
+                return
+            matrix = np.asarray(list(new.values()), dtype=np.float32)
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim}, f)
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Expected vectors of dimension {self.dim}, got {matrix.shape[1]}")
+
+            with open(self.vectors_path, "ab") as f:
+                f.write(matrix.tobytes())
+            lines = "".join(f"{key}\n" for key in new).encode("utf-8")
+            with open(self.keys_path, "ab") as f:
+                f.write(lines)
+            self._keys_offset += len(lines)
+            for key in new:
+                self._index[key] = self._rows
+                self._rows += 1
+            self._remap()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    `Embeddings` wrapper that only embeds texts missing from an `EmbeddingCache`.
+
+    Query embeddings go straight to the wrapped model unless `cache_queries` is set:
+    user questions are rarely repeated and would only grow the cache.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        cache_queries: bool = False,
+    ) -> None:
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache if cache is not None else EmbeddingCache(EMBEDDING_CACHE_DIR, model_name)
+        self.batch_size = batch_size
+        self.cache_queries = cache_queries
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, sending only the cache misses to the model.
+
+        Args:
+            texts (List[str]): Texts to embed.
+
+        Returns:
+            List[List[float]]: One vector per text.
+        """
+        with tracer.span("embed_documents", texts=len(texts)) as span:
+            hits = self.hits
+            vectors = self._embed_documents(texts)
+            span.set(cache_hits=self.hits - hits)
+        return vectors
+
+    def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.key(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Deduplicate the misses: the same boilerplate chunk can appear many times.
+        missing: Dict[str, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        computed: Dict[str, List[float]] = {}
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start : start + self.batch_size]
+            batch_vectors = self.embeddings.embed_documents([missing[key] for key in batch_keys])
+            self.cache.put_many(batch_keys, batch_vectors)
+            computed.update(zip(batch_keys, batch_vectors))
+
+        if missing:
+            logger.info(f"Embedded {len(missing)} new texts, reused {len(texts) - len(missing)} cached vectors")
+        return [
+            computed[key] if vector is None else vector.tolist()
+            for key, vector in zip(keys, vectors)
+        ]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.cache_queries:
+            return self.embed_documents([text])[0]
+        with tracer.span("embed_query"):
+            return self.embeddings.embed_query(text)
@@ -5,7 +5,7 @@
 import os
 
 from concurrent.futures import ProcessPoolExecutor
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from langchain_community.document_loaders import YoutubeLoader
 from config.logger import logger
 from config.settings import TRANSCRIPTS_DIR, YOUTUBE_URLS
@@ -13,6 +13,7 @@ from langchain_core.documents import Document
 
 from config.cache_manager import load_from_cache, save_to_cache
 from utils import extract_year, save_doc_to_file, filter_none_metadata
+from pipeline import bounded_map
 
 
 
@@ -35,6 +36,19 @@ class BaseLoader:
             results = list(executor.map(self._load_single, self.urls.items()))
         return [doc for result in results if result for doc in result]
 
+    def iter_load(self, max_in_flight: int = 4) -> Iterator[List[Document]]:
+        """
+        Load documents concurrently, yielding the documents of each URL as soon as
+        it is loaded, with at most `max_in_flight` transcripts held in memory.
+
+        Yields:
+            The LangChain Documents of one URL.
+        """
+        with ProcessPoolExecutor(max_workers=max_in_flight) as executor:
+            for result in bounded_map(executor, self._load_single, self.urls.items(), max_in_flight):
+                if result:
+                    yield result
+
     def _load_single(self, item: Tuple[str, str]) -> Optional[List[Document]]:
         """
         Abstract method to load a single document. Should be implemented by subclasses.
@@ -58,7 +72,7 @@ class CustomYouTubeLoader(BaseLoader):
             A list of LangChain Documents, or None if loading fails.
         """
         title, url = item
-        cached_data = load_from_cache(url)
+        cached_data = load_from_cache(url, namespace="youtube")
         if cached_data:
             logger.info(f"Loaded YouTube transcript from cache: {title}")
             return cached_data
@@ -79,7 +93,7 @@ class CustomYouTubeLoader(BaseLoader):
                     "year": year
                 }))
             logger.info(f"Successfully loaded transcript for: {title}")
-            save_to_cache(url, docs)
+            save_to_cache(url, docs, namespace="youtube")
             return docs
         except Exception as e:
             logger.error(f"Failed to load transcript for '{title}': {e}", exc_info=True)
@@ -1,14 +1,23 @@
 import os
-import time
+import asyncio
 import base64
-from typing import Dict, Tuple, List
+import hashlib
+import itertools
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
 from config.cache_manager import load_from_cache, save_to_cache
-from config.settings import vision_model
-from config import logger
+from config.settings import (
+    IMAGE_BATCH_SIZE,
+    VISION_BURST,
+    VISION_CONCURRENCY,
+    VISION_REQUESTS_PER_SECOND,
+    get_vision_model,
+)
+from config.logger import logger
+from rate_limit import TokenBucket, retry_with_backoff
 
 
 def encode_image(image_path: str) -> str:
@@ -29,6 +38,40 @@ def encode_image(image_path: str) -> str:
         return ""
 
 
+def list_image_paths(base_path: str) -> List[str]:
+    """
+    List the images of a directory whose filenames start with 'table'.
+
+    Args:
+        base_path (str): Path to the base directory.
+
+    Returns:
+        List[str]: File paths of the images.
+    """
+    return [
+        os.path.join(root, file)
+        for root, _, files in os.walk(base_path)
+        for file in files
+        if file.lower().startswith("table")
+    ]
+
+
+def iter_encoded_images(base_path: str) -> Iterator[Tuple[str, str]]:
+    """
+    Lazily encode the images in a directory whose filenames start with 'table'.
+
+    Args:
+        base_path (str): Path to the base directory.
+
+    Yields:
+        tuple: (file path, base64-encoded image string), one image at a time.
+    """
+    for file_path in list_image_paths(base_path):
+        encoded = encode_image(file_path)
+        if encoded:
+            yield file_path, encoded
+
+
 def encode_all_images(base_path: str) -> Dict[str, str]:
     """
     Encode all images in a directory whose filenames start with 'table'.
@@ -39,15 +82,7 @@ def encode_all_images(base_path: str) -> Dict[str, str]:
     Returns:
         dict: Mapping of file paths to base64-encoded image strings.
     """
-    encoded_images = {}
-    for root, _, files in os.walk(base_path):
-        for file in files:
-            if file.lower().startswith("table"):
-                file_path = os.path.join(root, file)
-                encoded = encode_image(file_path)
-                if encoded:
-                    encoded_images[file_path] = encoded
-    return encoded_images
+    return dict(iter_encoded_images(base_path))
 
 
 def build_vision_chain():
@@ -74,7 +109,7 @@ def build_vision_chain():
     ]
 
     prompt = ChatPromptTemplate.from_messages(messages)
-    return prompt | vision_model | StrOutputParser()
+    return prompt | get_vision_model() | StrOutputParser()
 
 
 def get_image_description_single(base64_image: str, chain) -> str:
@@ -91,35 +126,148 @@ def get_image_description_single(base64_image: str, chain) -> str:
     return chain.invoke({"image": base64_image})
 
 
+class DescriptionEngine:
+    """
+    Describes images concurrently with the vision model, within a rate limit.
+
+    Calls go through a token bucket (`requests_per_second`, bursts of `burst`), at
+    most `concurrency` of them in flight, and are retried with exponential backoff.
+    Descriptions are cached per image content hash, so adding or changing one image
+    only describes that image.
+
+    Args:
+        chain: Runnable turning {"image": base64} into a description. Defaults to
+            build_vision_chain(), built on first use.
+        requests_per_second (float): Sustained request rate.
+        burst (int): Requests allowed at once before the rate applies.
+        concurrency (int): Maximum number of requests in flight.
+        max_attempts (int): Attempts per image before giving up.
+        use_cache (bool): Read and write the per-image description cache.
+    """
+
+    def __init__(
+        self,
+        chain=None,
+        requests_per_second: float = VISION_REQUESTS_PER_SECOND,
+        burst: int = VISION_BURST,
+        concurrency: int = VISION_CONCURRENCY,
+        max_attempts: int = 5,
+        use_cache: bool = True,
+    ) -> None:
+        self.chain = chain
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.use_cache = use_cache
+        self.calls = 0
+        self.cache_hits = 0
+
+    @staticmethod
+    def cache_key(base64_image: str) -> str:
+        return "image-description:" + hashlib.sha256(base64_image.encode("utf-8")).hexdigest()
+
+    async def adescribe(self, base64_image: str, semaphore: asyncio.Semaphore) -> str:
+        """
+        Describe one image, from the cache if possible.
+
+        Args:
+            base64_image (str): Base64 string of the image.
+            semaphore (asyncio.Semaphore): Bounds the requests in flight.
+
+        Returns:
+            str: Generated description.
+        """
+        key = self.cache_key(base64_image)
+        if self.use_cache:
+            cached = load_from_cache(key, namespace="image-description")
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+
+        if self.chain is None:
+            self.chain = build_vision_chain()
+
+        async def call() -> str:
+            await self.bucket.acquire()
+            self.calls += 1
+            return await self.chain.ainvoke({"image": base64_image})
+
+        async with semaphore:
+            description = await retry_with_backoff(call, max_attempts=self.max_attempts)
+        if self.use_cache:
+            save_to_cache(key, description, namespace="image-description")
+        return description
+
+    async def adescribe_many(self, images: List[str]) -> List[str]:
+        """
+        Describe images concurrently.
+
+        Args:
+            images (List[str]): Base64 strings of the images.
+
+        Returns:
+            List[str]: Descriptions, in the order of `images`.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return list(await asyncio.gather(*(self.adescribe(image, semaphore) for image in images)))
+
+    def describe_many(self, images: List[str]) -> List[str]:
+        """
+        Synchronous wrapper of `adescribe_many`, for callers without an event loop.
+        """
+        return asyncio.run(self.adescribe_many(images))
+
+
+def iter_image_descriptions(
+    path: str,
+    batch_size: int = IMAGE_BATCH_SIZE,
+    engine: Optional[DescriptionEngine] = None,
+) -> Iterator[List[Tuple[str, str, str]]]:
+    """
+    Stream images of a folder with their descriptions, a batch at a time, so that
+    only `batch_size` base64 images are held in memory.
+
+    Args:
+        path (str): Path to the folder containing images.
+        batch_size (int): Number of images per yielded batch, described concurrently.
+        engine (DescriptionEngine): Engine generating the descriptions.
+
+    Yields:
+        list: (image path, base64-encoded image, description) tuples.
+    """
+    engine = engine or DescriptionEngine()
+    images = iter_encoded_images(path)
+    while True:
+        batch = list(itertools.islice(images, batch_size))
+        if not batch:
+            break
+        logger.info(f"Describing {len(batch)} images")
+        descriptions = engine.describe_many([base64_image for _, base64_image in batch])
+        yield [
+            (image_path, base64_image, description)
+            for (image_path, base64_image), description in zip(batch, descriptions)
+        ]
+    logger.info(f"Image descriptions: {engine.calls} model calls, {engine.cache_hits} from cache")
+
+
 def generate_unstructured_data_descriptions(
     path: str,
-    sleep_seconds: int = 2
+    engine: Optional[DescriptionEngine] = None,
 ) -> Tuple[Dict[str, str], List[str]]:
     """
-    Generate descriptions and base64 strings for images in a folder, with optional caching.
+    Generate descriptions and base64 strings for images in a folder, with per-image caching.
 
     Args:
         path (str): Path to the folder containing images.
-        sleep_seconds (int): Seconds to sleep between API calls (default: 2).
+        engine (DescriptionEngine): Engine generating the descriptions.
 
     Returns:
         tuple: (Dict of base64-encoded images, List of corresponding descriptions)
     """
-    encoded_images = encode_all_images(path)
-    cached_data = load_from_cache(path)
-
-    if cached_data:
-        logger.info(f"Loaded image descriptions from cache: {os.path.basename(path)}")
-        return encoded_images, cached_data
-
-    chain = build_vision_chain()
+    encoded_images = {}
     descriptions = []
-
-    for image_path, base64_image in encoded_images.items():
-        logger.info(f"Describing image: {os.path.basename(image_path)}")
-        description = get_image_description_single(base64_image, chain)
-        descriptions.append(description)
-        time.sleep(sleep_seconds)
-
-    save_to_cache(path, descriptions)
+    for batch in iter_image_descriptions(path, engine=engine):
+        for image_path, base64_image, description in batch:
+            encoded_images[image_path] = base64_image
+            descriptions.append(description)
     return encoded_images, descriptions
@@ -0,0 +1,301 @@
+"""
+    Hybrid lexical + vector retrieval.
+
+    A compact BM25 inverted index over the chunks catches what the MiniLM embeddings
+    miss: exact figures, years and program names ("Renaulution", "Ampere"). Its ranking
+    is fused with the vectorstore's by reciprocal-rank fusion (RRF), behind the
+    VectorStore interface, so it plugs into MultiVectorRetriever.
+
+    Script to launch to rebuild the index after an ingestion:
+    `python .\\lib\\hybrid.py`
+"""
+
+import json
+import os
+import re
+import shutil
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from config.logger import logger
+from config.settings import BM25_INDEX_DIR, COLLECTION_NAME, CONNECTION_STRING, HYBRID_FETCH_K, RRF_K
+from metadata_filters import MetadataPartitions, normalize_filter
+from tracing import tracer
+
+FRENCH_STOPWORDS = frozenset(
+    "a au aux avec ce ces cet cette d dans de des du elle en est et eu il ils je l la le les leur leurs "
+    "lui m ma mais me meme mes moi mon n ne nos notre nous on ou par pas pour qu que qui s sa se ses "
+    "son sont sur t ta te tes toi ton tu un une vos votre vous y quel quelle quels quelles quoi "
+    "comment combien the of and in to is".split()
+)
+# Words, or numbers with their decimal part: "7,9", "2023", "3.5".
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)*|[a-z]+")
+
+
+def analyze(text_: str) -> List[str]:
+    """
+    French-aware normalization: lowercase, accents folded, stopwords dropped,
+    plural "s"/"x" stripped, numbers kept whole.
+    """
+    folded = unicodedata.normalize("NFKD", text_.lower()).encode("ascii", "ignore").decode("ascii")
+    terms = []
+    for token in TOKEN_PATTERN.findall(folded):
+        if token in FRENCH_STOPWORDS:
+            continue
+        if token[0].isalpha() and len(token) > 3 and token[-1] in "sx":
+            token = token[:-1]
+        terms.append(token.replace(",", "."))
+    return terms
+
+
+class BM25Index:
+    """
+    BM25 over an inverted index stored as flat arrays (CSR layout): the postings of
+    term `t` are `doc_ids[offsets[t]:offsets[t + 1]]` with their term frequencies.
+
+    Layout of an index directory: `postings.npz` and `docs.jsonl` (id, text, metadata).
+    """
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[dict],
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> None:
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.k1 = k1
+        self.b = b
+        n_docs = len(ids)
+        doc_freqs = np.diff(offsets)
+        self.idf = np.log(1 + (n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        # Per-document part of the BM25 denominator, computed once.
+        avg_length = doc_lengths.mean() if n_docs else 1.0
+        self._norms = (k1 * (1 - b + b * doc_lengths / max(avg_length, 1e-9))).astype(np.float32)
+        self._partitions: Optional[MetadataPartitions] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids: List[str], texts: List[str], metadatas: List[dict]) -> "BM25Index":
+        vocabulary: Dict[str, int] = {}
+        rows, cols, freqs, lengths = [], [], [], []
+        for doc, text_ in enumerate(texts):
+            counts = Counter(analyze(text_))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                rows.append(vocabulary.setdefault(term, len(vocabulary)))
+                cols.append(doc)
+                freqs.append(count)
+        terms = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(terms, kind="stable")
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocabulary)), out=offsets[1:])
+        return cls(
+            vocabulary,
+            offsets,
+            np.asarray(cols, dtype=np.int32)[order],
+            np.asarray(freqs, dtype=np.float32)[order],
+            np.asarray(lengths, dtype=np.float32),
+            list(ids),
+            list(texts),
+            list(metadatas),
+        )
+
+    @property
+    def partitions(self) -> MetadataPartitions:
+        if self._partitions is None:
+            self._partitions = MetadataPartitions(self.metadatas)
+        return self._partitions
+
+    def search(self, query: str, k: int, filter_rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Return the `k` best rows for the query as (row, BM25 score) pairs, among
+        `filter_rows` if given.
+        """
+        terms = [self.vocabulary[t] for t in set(analyze(query)) if t in self.vocabulary]
+        if not terms:
+            return []
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in terms:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end]
+            # Each document appears once per term's postings: plain fancy-index add is safe.
+            scores[docs] += self.idf[term] * tf * (self.k1 + 1) / (tf + self._norms[docs])
+        candidates = np.flatnonzero(scores)
+        if filter_rows is not None:
+            candidates = candidates[np.isin(candidates, filter_rows, assume_unique=True)]
+        k = min(k, len(candidates))
+        if not k:
+            return []
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def save(self, path: str) -> None:
+        """
+        Write the index to `path`, replacing the previous one atomically.
+        """
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez(
+            os.path.join(tmp_path, "postings.npz"),
+            terms=np.asarray(terms, dtype=str),
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+        )
+        with open(os.path.join(tmp_path, "docs.jsonl"), "w", encoding="utf-8") as f:
+            for doc_id, text_, metadata in zip(self.ids, self.texts, self.metadatas):
+                f.write(json.dumps({"id": doc_id, "text": text_, "metadata": metadata}, ensure_ascii=False) + "\n")
+
+        old_path = f"{path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.isdir(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        arrays = np.load(os.path.join(path, "postings.npz"))
+        ids, texts, metadatas = [], [], []
+        with open(os.path.join(path, "docs.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                ids.append(row["id"])
+                texts.append(row["text"])
+                metadatas.append(row["metadata"])
+        vocabulary = {term: i for i, term in enumerate(arrays["terms"].tolist())}
+        return cls(
+            vocabulary, arrays["offsets"], arrays["doc_ids"], arrays["term_freqs"], arrays["doc_lengths"],
+            ids, texts, metadatas,
+        )
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = RRF_K) -> List[Document]:
+    """
+    Fuse rankings of documents: each document scores sum(1 / (k + rank)) over the
+    rankings it appears in. Documents are identified by their `id`.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class HybridVectorStore(VectorStore):
+    """
+    Read-only VectorStore fusing a dense vectorstore with a BM25 index by RRF.
+
+    Args:
+        dense (VectorStore): PGVector, or the local ANN index.
+        bm25 (BM25Index): Lexical index over the same chunks.
+        fetch_k (int): Results taken from each ranking before fusion.
+        rrf_k (int): RRF constant: larger values flatten the rank contributions.
+    """
+
+    def __init__(self, dense: VectorStore, bm25: BM25Index, fetch_k: int = HYBRID_FETCH_K, rrf_k: int = RRF_K) -> None:
+        self.dense = dense
+        self.bm25 = bm25
+        self.fetch_k = fetch_k
+        self.rrf_k = rrf_k
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.dense.embeddings
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("HybridVectorStore is read-only: write to PGVector, then rebuild the index")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs: Any):
+        raise NotImplementedError("Build the dense store and the BM25 index, then wrap them")
+
+    def lexical_search(self, query: str, k: int, filter: Optional[dict] = None) -> List[Document]:
+        with tracer.span("bm25_search", k=k):
+            filter_ = normalize_filter(filter)
+            filter_rows = self.bm25.partitions.rows(filter_) if filter_ else None
+            return [
+                Document(id=self.bm25.ids[row], page_content=self.bm25.texts[row], metadata=self.bm25.metadatas[row])
+                for row, _ in self.bm25.search(query, k, filter_rows)
+            ]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        fetch_k = max(k, self.fetch_k)
+        dense = self.dense.similarity_search(query, k=fetch_k, **kwargs)
+        lexical = self.lexical_search(query, fetch_k, kwargs.get("filter"))
+        return reciprocal_rank_fusion([dense, lexical], self.rrf_k)[:k]
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        fetch_k = max(k, self.fetch_k)
+        dense = await self.dense.asimilarity_search(query, k=fetch_k, **kwargs)
+        lexical = self.lexical_search(query, fetch_k, kwargs.get("filter"))
+        return reciprocal_rank_fusion([dense, lexical], self.rrf_k)[:k]
+
+
+def sync_bm25_from_pgvector(engine: Engine, collection_name: str, batch_size: int = 10_000) -> BM25Index:
+    """
+    Build a BM25 index from the chunks of a PGVector collection.
+    """
+    query = text(
+        "SELECT e.id, e.document, e.cmetadata "
+        "FROM langchain_pg_embedding e JOIN langchain_pg_collection c ON e.collection_id = c.uuid "
+        "WHERE c.name = :collection_name ORDER BY e.id"
+    )
+    ids, texts, metadatas = [], [], []
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(
+            query, {"collection_name": collection_name}
+        )
+        for row in result:
+            ids.append(row.id)
+            texts.append(row.document)
+            metadatas.append(row.cmetadata or {})
+    logger.info(f"Indexing {len(ids)} chunks of PGVector collection {collection_name} for BM25")
+    return BM25Index.build(ids, texts, metadatas)
+
+
+def bm25_index_path(collection_name: str = COLLECTION_NAME) -> str:
+    return os.path.join(BM25_INDEX_DIR, str(collection_name))
+
+
+def main():
+    engine = create_engine(CONNECTION_STRING)
+    index = sync_bm25_from_pgvector(engine, COLLECTION_NAME)
+    index.save(bm25_index_path(COLLECTION_NAME))
+    logger.info(f"Saved BM25 index of {len(index)} chunks to {bm25_index_path(COLLECTION_NAME)}")
+
+
+if __name__ == "__main__":
+    main()
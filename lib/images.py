@@ -0,0 +1,201 @@
+"""
+    Image parents of the docstore: format sniffing, thumbnails, and lazy handles.
+
+    Image parents are stored as raw bytes with a JPEG thumbnail and a `kind` tag (see
+    store.PostgresByteStore). Retrieval returns an `ImageHandle` per image: its
+    thumbnail and content hash come with the search results, the full image is only
+    fetched when a prompt needs it, and the prompt-sized version is cached by content
+    hash so the same image is not decoded and resized again on the next request.
+    Answers are displayed with the thumbnails, which never need the full image.
+"""
+
+import base64
+import io
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from config.settings import IMAGE_RESIZE_CACHE_SIZE, IMAGE_THUMBNAIL_SIZE, PROMPT_IMAGE_SIZE
+from tracing import tracer
+
+IMAGE_SIGNATURES = {
+    b"\xFF\xD8\xFF": "jpeg",
+    b"\x89\x50\x4E\x47\x0D\x0A\x1A\x0A": "png",
+    b"\x47\x49\x46\x38": "gif",
+    b"\x52\x49\x46\x46": "webp",
+}
+# 12 base64 characters decode to the 9 bytes covering the longest signature.
+SIGNATURE_B64_LENGTH = 12
+
+
+def image_format(header: bytes) -> Optional[str]:
+    """
+    Return the image format of data starting with `header`, or None.
+    """
+    for signature, format_ in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return format_
+    return None
+
+
+def fit_image(raw: bytes, size: Tuple[int, int], quality: int = 85) -> bytes:
+    """
+    Shrink an image to fit in `size`, keeping its aspect ratio, as JPEG bytes.
+    Images already small enough are only re-encoded.
+    """
+    with Image.open(io.BytesIO(raw)) as img:
+        img.draft("RGB", size)  # lets JPEG decoding downscale on the fly
+        img = img.convert("RGB")
+        img.thumbnail(size, Image.LANCZOS)
+        buffered = io.BytesIO()
+        img.save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue()
+
+
+def make_thumbnail(raw: bytes, size: Tuple[int, int] = IMAGE_THUMBNAIL_SIZE) -> bytes:
+    return fit_image(raw, size, quality=75)
+
+
+class ResizeCache:
+    """
+    Thread-safe LRU of resized images, keyed by (content hash, size).
+    """
+
+    def __init__(self, max_entries: int = IMAGE_RESIZE_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Tuple[int, int]], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, Tuple[int, int]]) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __contains__(self, key: Tuple[str, Tuple[int, int]]) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key: Tuple[str, Tuple[int, int]], value: str) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+resize_cache = ResizeCache()
+tracer.register_cache("image_resize", resize_cache)
+
+
+class ImageHandle:
+    """
+    Lightweight stand-in for an image parent returned by retrieval.
+
+    Args:
+        key (str): Docstore key of the image.
+        content_hash (str): Hash of the stored image, keys the resize cache.
+        thumbnail (bytes): JPEG thumbnail, None for rows stored before thumbnails.
+        loader (Callable): Fetches the base64 payloads of a list of keys.
+        metadata (dict): Filename of the image.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        content_hash: str,
+        thumbnail: Optional[bytes],
+        loader: Callable[[List[str]], List[Optional[str]]],
+        metadata: Optional[dict] = None,
+    ) -> None:
+        self.key = key
+        self.content_hash = content_hash
+        self.thumbnail = thumbnail
+        self.loader = loader
+        self.metadata = metadata or {}
+        self._payload: Optional[str] = None
+
+    def __repr__(self) -> str:
+        return f"ImageHandle({self.key!r}, loaded={self._payload is not None})"
+
+    def b64(self) -> str:
+        """
+        Return the full image as base64, fetching it on first use.
+        """
+        if self._payload is None:
+            load_payloads([self])
+        return self._payload
+
+    def thumbnail_b64(self) -> str:
+        """
+        Return the thumbnail as base64, or the full image if there is none.
+        """
+        if self.thumbnail is None:
+            return self.b64()
+        return base64.b64encode(self.thumbnail).decode("ascii")
+
+    def prompt_b64(self, size: Tuple[int, int] = PROMPT_IMAGE_SIZE) -> str:
+        """
+        Return the image shrunk to fit in `size` as base64 JPEG, cached by content.
+        """
+        cache_key = (self.content_hash, tuple(size))
+        resized = resize_cache.get(cache_key)
+        if resized is None:
+            resized = base64.b64encode(fit_image(base64.b64decode(self.b64()), size)).decode("ascii")
+            resize_cache.put(cache_key, resized)
+        return resized
+
+
+def load_payloads(handles: Sequence[ImageHandle]) -> None:
+    """
+    Fetch the payloads of handles not loaded yet, one query per loader.
+    """
+    by_loader: Dict[Callable, List[ImageHandle]] = {}
+    for handle in handles:
+        if handle._payload is None:
+            by_loader.setdefault(handle.loader, []).append(handle)
+    for loader, pending in by_loader.items():
+        for handle, payload in zip(pending, loader([handle.key for handle in pending])):
+            handle._payload = payload
+
+
+def prompt_images(images: Sequence, size: Tuple[int, int] = PROMPT_IMAGE_SIZE) -> List[str]:
+    """
+    Return the base64 JPEGs to put in a prompt for a list of images.
+
+    Only images missing from the resize cache are fetched, all in one query.
+
+    Args:
+        images: ImageHandles, or base64 strings.
+        size: Bounding box of the prompt images.
+    """
+    with tracer.span("images.prompt", images=len(images)) as span:
+        handles = [image for image in images if isinstance(image, ImageHandle)]
+        missing = [h for h in handles if (h.content_hash, tuple(size)) not in resize_cache]
+        load_payloads(missing)
+        prompt = [image.prompt_b64(size) if isinstance(image, ImageHandle) else image for image in images]
+        if tracer.enabled:
+            span.set(resized=len(missing), bytes=sum(len(image) for image in prompt))
+        return prompt
+
+
+def thumbnail_images(images: Sequence) -> List[str]:
+    """
+    Return the base64 JPEGs to display for a list of images: their thumbnails.
+
+    Only images stored without a thumbnail are fetched, all in one query.
+
+    Args:
+        images: ImageHandles, or base64 strings.
+    """
+    handles = [image for image in images if isinstance(image, ImageHandle)]
+    load_payloads([h for h in handles if h.thumbnail is None])
+    return [image.thumbnail_b64() if isinstance(image, ImageHandle) else image for image in images]
@@ -0,0 +1,404 @@
+"""
+    Incremental, idempotent ingestion into the vectorstore and the docstore.
+
+    Parents get deterministic IDs derived from their source, and their content hash
+    is compared with the `value_hash` column of the docstore: unchanged parents are
+    skipped, changed ones are re-chunked and upserted, and parents that disappeared
+    from a source that was ingested again, or whose source was removed from the
+    corpus, are removed with their chunks. The hash also covers the fingerprint of
+    the chunker (name and settings) and the version of the chunk metadata
+    (CHUNK_METADATA_VERSION), so changing either re-chunks every parent on the next run.
+"""
+
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from langchain_core.documents import Document
+from langchain.retrievers.multi_vector import MultiVectorRetriever
+from sqlalchemy import text
+
+from config.logger import logger
+from config.settings import EMBEDDING_BATCH_SIZE, ID_KEY
+from chunker import TextChunker, TokenChunker
+from metadata_filters import CHUNK_METADATA_VERSION, stamp_filter_metadata
+from store import PostgresByteStore
+
+# Namespace of the deterministic parent and chunk IDs. Never change it: every
+# stored ID would change and the next run would re-ingest the whole corpus.
+DOC_ID_NAMESPACE = uuid.UUID("6f0c3a52-3a1e-4c47-9c1b-5b2f1d9e8a10")
+
+# (key, value, filename) as expected by PostgresByteStore.mset
+DocstoreItem = Tuple[str, Any, str]
+
+
+def document_ids(docs: List[Document]) -> List[str]:
+    """
+    Compute deterministic IDs for documents, based on their source and page.
+
+    Documents sharing the same source and page (e.g. several transcripts of one
+    video) are told apart by their rank among them.
+
+    Args:
+        docs (List[Document]): Loaded documents.
+
+    Returns:
+        List[str]: One ID per document.
+    """
+    seen = Counter()
+    ids = []
+    for doc in docs:
+        name = f"{doc.metadata.get('source', 'unknown_file')}#{doc.metadata.get('page', '')}"
+        ids.append(str(uuid.uuid5(DOC_ID_NAMESPACE, f"{name}#{seen[name]}")))
+        seen[name] += 1
+    return ids
+
+
+def image_id(filename: str) -> str:
+    """
+    Compute the deterministic ID of an image from its file path.
+    """
+    return str(uuid.uuid5(DOC_ID_NAMESPACE, f"image#{filename}"))
+
+
+def chunk_ids(chunks: List[Document]) -> List[str]:
+    """
+    Compute deterministic IDs for chunks from their parent ID and rank.
+
+    Args:
+        chunks (List[Document]): Chunks tagged with their parent ID under ID_KEY,
+            in the order produced by the chunker.
+
+    Returns:
+        List[str]: One ID per chunk.
+    """
+    rank = Counter()
+    ids = []
+    for chunk in chunks:
+        parent_id = chunk.metadata[ID_KEY]
+        ids.append(str(uuid.uuid5(uuid.UUID(parent_id), str(rank[parent_id]))))
+        rank[parent_id] += 1
+    return ids
+
+
+@dataclass
+class IngestionPlan:
+    """
+    What an ingestion run would change.
+    """
+
+    new: List[DocstoreItem] = field(default_factory=list)
+    changed: List[DocstoreItem] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    orphaned: List[str] = field(default_factory=list)
+    # Hash stored with each parent to write, fingerprint included.
+    hashes: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def to_write(self) -> List[DocstoreItem]:
+        return self.new + self.changed
+
+    @property
+    def to_clear(self) -> List[str]:
+        """Parents whose existing chunks must be removed before writing."""
+        return [key for key, _, _ in self.changed] + self.orphaned
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.new)} new, {len(self.changed)} changed, "
+            f"{len(self.unchanged)} unchanged, {len(self.orphaned)} orphaned"
+        )
+
+
+class IngestionPlanner:
+    """
+    Compares docstore items with what is already stored.
+
+    Args:
+        docstore (PostgresByteStore): Docstore of the parents.
+        fingerprint (str): How the parents are turned into chunks (see
+            `TokenChunker.fingerprint`), hashed with their content and the chunk
+            metadata version: a parent whose content is the same but whose chunks were
+            made another way counts as changed.
+    """
+
+    def __init__(self, docstore: PostgresByteStore, fingerprint: str = "") -> None:
+        self.docstore = docstore
+        self.fingerprint = fingerprint
+
+    def value_hash(self, value: Any) -> str:
+        content = self.docstore.extract_hashable_content(value)
+        return self.docstore.compute_hash(f"{CHUNK_METADATA_VERSION}\0{self.fingerprint}\0{content}")
+
+    def plan(self, items: List[DocstoreItem], find_orphans: bool = True) -> IngestionPlan:
+        """
+        Sort docstore items into new, changed and unchanged ones, and find the
+        stored parents of the same files that are not part of `items` any more.
+
+        Args:
+            items (List[DocstoreItem]): (key, value, filename) tuples to ingest.
+            find_orphans (bool): Look for orphaned parents. Disable it when the items
+                of a file are planned over several calls, and use `orphans` at the end.
+
+        Returns:
+            IngestionPlan: The plan.
+        """
+        keys = [key for key, _, _ in items]
+        filenames = {filename for _, _, filename in items}
+        existing = self.docstore.get_value_hashes(
+            keys=keys, filenames=list(filenames) if find_orphans else None
+        )
+
+        plan = IngestionPlan()
+        for item in items:
+            key, value, _ = item
+            value_hash = self.value_hash(value)
+            if key not in existing:
+                plan.new.append(item)
+            elif existing[key][0] == value_hash:
+                plan.unchanged.append(key)
+                continue
+            else:
+                plan.changed.append(item)
+            plan.hashes[key] = value_hash
+
+        if find_orphans:
+            plan.orphaned = self.orphans(keys, filenames, existing)
+        return plan
+
+    def orphans(self, keys: Iterable[str], filenames: Iterable[str], existing=None) -> List[str]:
+        """
+        Return the stored parents of `filenames` that are not in `keys`.
+
+        Args:
+            keys (Iterable[str]): Keys ingested for these files.
+            filenames (Iterable[str]): Files that were ingested.
+            existing (dict): Result of `get_value_hashes` for these files, if known.
+
+        Returns:
+            List[str]: Keys of the orphaned parents.
+        """
+        filenames = set(filenames)
+        if existing is None:
+            existing = self.docstore.get_value_hashes(filenames=list(filenames))
+        wanted = set(keys)
+        return [
+            key for key, (_, filename) in existing.items()
+            if filename in filenames and key not in wanted
+        ]
+
+    def removed_sources(self, sources: Iterable[str]) -> List[str]:
+        """
+        Return the stored parents of files that are not sources of the corpus any more
+        (a deleted PDF, a YouTube URL removed from the settings, a dropped image).
+
+        Args:
+            sources (Iterable[str]): Every source of the run, loaded or not.
+
+        Returns:
+            List[str]: Keys of the orphaned parents.
+        """
+        removed = self.docstore.stored_filenames() - set(sources)
+        if not removed:
+            return []
+        return list(self.docstore.get_value_hashes(filenames=list(removed)))
+
+
+def delete_chunks(docstore: PostgresByteStore, parent_ids: List[str]) -> None:
+    """
+    Delete the vectorstore chunks of the given parents.
+
+    PGVector can only delete by chunk ID, so the rows are matched on the parent ID
+    stored in their metadata.
+
+    Args:
+        docstore (PostgresByteStore): Docstore sharing the database of the vectorstore.
+        parent_ids (List[str]): Parent IDs whose chunks must be removed.
+    """
+    if not parent_ids:
+        return
+    with docstore.engine.begin() as connection:
+        connection.execute(
+            text(
+                "DELETE FROM langchain_pg_embedding e USING langchain_pg_collection c "
+                "WHERE e.collection_id = c.uuid AND c.name = :collection_name "
+                "AND e.cmetadata ->> :id_key = ANY(:parent_ids)"
+            ),
+            {
+                "collection_name": docstore.collection_name,
+                "id_key": ID_KEY,
+                "parent_ids": list(parent_ids),
+            },
+        )
+
+
+def apply_plan(
+    plan: IngestionPlan,
+    retriever: MultiVectorRetriever,
+    chunks: List[Document],
+    dry_run: bool = False,
+    vectors: Optional[List[List[float]]] = None,
+) -> IngestionPlan:
+    """
+    Apply an ingestion plan.
+
+    Vectors are written before the docstore entries: if a run is interrupted, the
+    docstore still holds the old hashes and the next run redoes the work.
+
+    Args:
+        plan (IngestionPlan): Plan returned by IngestionPlanner.plan.
+        retriever (MultiVectorRetriever): Retriever holding the vectorstore and docstore.
+        chunks (List[Document]): Chunks of the parents in `plan.to_write`.
+        dry_run (bool): Only report what would change.
+        vectors (List[List[float]]): Embeddings of `chunks`, if already computed.
+
+    Returns:
+        IngestionPlan: The applied plan.
+    """
+    logger.info(f"Ingestion plan: {plan.summary()}")
+    if dry_run:
+        for key, _, filename in plan.new:
+            logger.info(f"[dry-run] would add {key} ({filename})")
+        for key, _, filename in plan.changed:
+            logger.info(f"[dry-run] would update {key} ({filename})")
+        for key in plan.orphaned:
+            logger.info(f"[dry-run] would remove {key}")
+        return plan
+
+    delete_chunks(retriever.docstore, plan.to_clear)
+    if plan.orphaned:
+        retriever.docstore.mdelete(plan.orphaned)
+    filenames = {key: filename for key, _, filename in plan.to_write}
+    for chunk in chunks:
+        stamp_filter_metadata(chunk, filenames.get(chunk.metadata.get(ID_KEY), ""))
+    if chunks and vectors is not None:
+        retriever.vectorstore.add_embeddings(
+            texts=[chunk.page_content for chunk in chunks],
+            embeddings=vectors,
+            metadatas=[chunk.metadata for chunk in chunks],
+            ids=chunk_ids(chunks),
+        )
+    elif chunks:
+        retriever.vectorstore.add_documents(chunks, ids=chunk_ids(chunks))
+    if plan.to_write:
+        retriever.docstore.mset(
+            [(key, value, filename, plan.hashes.get(key)) for key, value, filename in plan.to_write]
+        )
+    return plan
+
+
+@dataclass
+class IngestionBatch:
+    """
+    Unit of work of the streaming ingestion: the parents of one source file, or
+    one batch of images.
+
+    Args:
+        items: (key, value, filename) tuples of the parents.
+        summaries: For parents embedded through a summary (images), the text to
+            embed for each key. Other parents are chunked.
+    """
+
+    items: List[DocstoreItem]
+    summaries: Optional[Dict[str, str]] = None
+    plan: Optional[IngestionPlan] = None
+    chunks: List[Document] = field(default_factory=list)
+    vectors: Optional[List[List[float]]] = None
+
+
+class StreamingIngestion:
+    """
+    Stage functions of the streaming ingestion pipeline (see pipeline.Pipeline):
+    chunk (plan and split) -> embed -> write, followed by `finish` to remove the
+    orphaned parents of every file seen during the run and of every stored file
+    that is not in `sources`.
+
+    Args:
+        retriever (MultiVectorRetriever): Retriever holding the vectorstore and docstore.
+        chunker (TextChunker or TokenChunker): Splits parents into chunks.
+        dry_run (bool): Only report what would change.
+        embed_batch_size (int): Number of chunks per embedding call.
+        sources (Iterable[str]): Every source of the corpus (filenames as stored in
+            the docstore). A source that fails to load keeps its parents. Without it,
+            only the files seen during the run are checked.
+    """
+
+    def __init__(
+        self,
+        retriever: MultiVectorRetriever,
+        chunker: Union[TextChunker, TokenChunker],
+        dry_run: bool = False,
+        embed_batch_size: int = EMBEDDING_BATCH_SIZE,
+        sources: Optional[Iterable[str]] = None,
+    ) -> None:
+        self.retriever = retriever
+        self.chunker = chunker
+        self.dry_run = dry_run
+        self.embed_batch_size = embed_batch_size
+        self.sources = set(sources) if sources is not None else None
+        self.planner = IngestionPlanner(retriever.docstore, chunker.fingerprint)
+        # Parents embedded through their summary are not chunked.
+        self.summary_planner = IngestionPlanner(retriever.docstore)
+        self.seen: Dict[str, Set[str]] = defaultdict(set)
+        self.totals = IngestionPlan()
+
+    def chunk(self, batch: IngestionBatch) -> Optional[IngestionBatch]:
+        planner = self.summary_planner if batch.summaries is not None else self.planner
+        batch.plan = planner.plan(batch.items, find_orphans=False)
+        for key, _, filename in batch.items:
+            self.seen[filename].add(key)
+        self.totals.unchanged.extend(batch.plan.unchanged)
+        batch.items = []
+        if not batch.plan.to_write:
+            return None
+        if self.dry_run:
+            apply_plan(batch.plan, self.retriever, [], dry_run=True)
+            self._count(batch.plan)
+            return None
+
+        to_write = batch.plan.to_write
+        if batch.summaries is not None:
+            batch.chunks = [
+                Document(page_content=batch.summaries[key], metadata={ID_KEY: key})
+                for key, _, _ in to_write
+            ]
+        else:
+            batch.chunks = self.chunker.split([doc for _, doc, _ in to_write], [key for key, _, _ in to_write])
+        return batch
+
+    def embed(self, batch: IngestionBatch) -> IngestionBatch:
+        embeddings = self.retriever.vectorstore.embeddings
+        texts = [chunk.page_content for chunk in batch.chunks]
+        batch.vectors = []
+        for start in range(0, len(texts), self.embed_batch_size):
+            batch.vectors.extend(embeddings.embed_documents(texts[start:start + self.embed_batch_size]))
+        return batch
+
+    def write(self, batch: IngestionBatch) -> None:
+        apply_plan(batch.plan, self.retriever, batch.chunks, vectors=batch.vectors)
+        self._count(batch.plan)
+
+    def finish(self) -> IngestionPlan:
+        """
+        Remove the parents that disappeared from the files seen during the run,
+        and those of the stored files that are not sources any more.
+
+        Returns:
+            IngestionPlan: Totals of the run, without the parents themselves.
+        """
+        orphans = self.planner.orphans(
+            [key for keys in self.seen.values() for key in keys], self.seen.keys()
+        )
+        if self.sources is not None:
+            orphans += self.planner.removed_sources(self.sources | self.seen.keys())
+        self.totals.orphaned = orphans
+        if orphans:
+            apply_plan(IngestionPlan(orphaned=orphans), self.retriever, [], dry_run=self.dry_run)
+        logger.info(f"Ingestion totals: {self.totals.summary()}")
+        return self.totals
+
+    def _count(self, plan: IngestionPlan) -> None:
+        # Only keep the keys: the values are released with the batch.
+        self.totals.new.extend((key, None, filename) for key, _, filename in plan.new)
+        self.totals.changed.extend((key, None, filename) for key, _, filename in plan.changed)
@@ -6,6 +6,7 @@
 from concurrent.futures import ThreadPoolExecutor
 from langchain_community.document_loaders import YoutubeLoader as LCYoutubeLoader, PyPDFLoader, TextLoader
 from utils import extract_year
+from pipeline import bounded_map
 from config.cache_manager import load_from_cache, save_to_cache
 import os
 
@@ -28,6 +29,19 @@ class BaseLoader:
             results = list(executor.map(self._load_single, self.urls))
         return [doc for result in results if result for doc in result]
 
+    def iter_load(self, max_in_flight=4):
+        """
+        Load documents concurrently, yielding the documents of each source as soon
+        as it is loaded, with at most `max_in_flight` sources held in memory.
+
+        Yields:
+            list: Loaded document objects of one source.
+        """
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            for result in bounded_map(executor, self._load_single, self.urls, max_in_flight):
+                if result:
+                    yield result
+
     def _load_single(self, url):
         raise NotImplementedError
 
@@ -37,7 +51,7 @@ class LocalPDFLoader(BaseLoader):
         super().__init__(file_paths)
 
     def _load_single(self, file_path):
-        cached_data = load_from_cache(file_path)
+        cached_data = load_from_cache(file_path, namespace="pdf", source=file_path)
         if cached_data:
             print(f"Loaded local PDF from cache: {os.path.basename(file_path)}")
             return cached_data
@@ -53,7 +67,7 @@ class LocalPDFLoader(BaseLoader):
                     "year": year
                 })
             print(f"Loaded local PDF: {os.path.basename(file_path)}")
-            save_to_cache(file_path, docs)
+            save_to_cache(file_path, docs, namespace="pdf", source=file_path)
             return docs
         except Exception as e:
             print(f" Failed to load local PDF '{file_path}': {e}")
@@ -65,7 +79,7 @@ class LocalTextLoader(BaseLoader):
         super().__init__(file_paths)
 
     def _load_single(self, file_path):
-        cached_data = load_from_cache(file_path)
+        cached_data = load_from_cache(file_path, namespace="txt", source=file_path)
         if cached_data:
             print(f"Loaded local TXT from cache: {os.path.basename(file_path)}")
             return cached_data
@@ -92,7 +106,7 @@ class LocalTextLoader(BaseLoader):
                     "year": year
                 })
             print(f"Loaded local TXT: {os.path.basename(file_path)}")
-            save_to_cache(file_path, docs)
+            save_to_cache(file_path, docs, namespace="txt", source=file_path)
             return docs
         except Exception as e:
             print(f"Failed to load local TXT '{file_path}': {e}")
@@ -102,7 +116,7 @@ class LocalTextLoader(BaseLoader):
 class YouTubeLoader(BaseLoader):
     def _load_single(self, item):
         title, url = item
-        cached_data = load_from_cache(url)
+        cached_data = load_from_cache(url, namespace="youtube")
         if cached_data:
             print(f"Loaded YouTube transcript from cache: {title}")
             return cached_data
@@ -122,7 +136,7 @@ class YouTubeLoader(BaseLoader):
                     "year": year
                 })
             print(f"Loaded transcript for: {title}")
-            save_to_cache(url, docs)
+            save_to_cache(url, docs, namespace="youtube")
             return docs
         except Exception as e:
             print(f"Failed to load transcript for '{title}': {e}")
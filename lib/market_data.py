@@ -0,0 +1,133 @@
+"""
+    Market data access for the agent tools.
+
+    Tools fetch data through a MarketDataClient, which shares one ticker object per
+    symbol and memoizes each (data kind, symbol) result with a TTL fitting how often
+    that data changes: quotes and news for minutes, holders and splits for days.
+    The backend is pluggable, so the tools can run against a fake one offline.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config.logger import logger
+
+# Seconds a fetched result stays fresh, per data kind.
+DEFAULT_TTLS = {
+    "info": 5 * 60,
+    "news": 10 * 60,
+    "upgrades_downgrades": 60 * 60,
+    "calendar": 6 * 60 * 60,
+    "mutualfund_holders": 24 * 60 * 60,
+    "institutional_holders": 24 * 60 * 60,
+    "splits": 3 * 24 * 60 * 60,
+}
+
+# Ticker method fetching each data kind.
+FETCHERS: Dict[str, Callable[[Any], Any]] = {
+    "info": lambda ticker: ticker.get_info(),
+    "news": lambda ticker: ticker.get_news(),
+    "upgrades_downgrades": lambda ticker: ticker.get_upgrades_downgrades(),
+    "calendar": lambda ticker: ticker.get_calendar(),
+    "mutualfund_holders": lambda ticker: ticker.get_mutualfund_holders(),
+    "institutional_holders": lambda ticker: ticker.get_institutional_holders(),
+    "splits": lambda ticker: ticker.get_splits(),
+}
+
+
+class YFinanceBackend:
+    """
+    Yahoo Finance backend: one shared `yf.Ticker` per symbol, so its session and
+    the data it already downloaded are reused across tool calls.
+    """
+
+    def __init__(self) -> None:
+        self._tickers: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def ticker(self, symbol: str) -> Any:
+        # yfinance is imported by the first fetch, not at startup.
+        import yfinance as yf
+
+        with self._lock:
+            if symbol not in self._tickers:
+                self._tickers[symbol] = yf.Ticker(symbol)
+            return self._tickers[symbol]
+
+
+@dataclass
+class FetchStats:
+    calls: int = 0
+    hits: int = 0
+    fetch_seconds: float = 0.0
+
+    @property
+    def mean_fetch_ms(self) -> float:
+        misses = self.calls - self.hits
+        return self.fetch_seconds / misses * 1000 if misses else 0.0
+
+
+class MarketDataClient:
+    """
+    TTL-memoized access to market data.
+
+    Concurrent calls for the same (kind, symbol) wait for a single fetch instead of
+    all hitting the backend.
+
+    Args:
+        backend: Object whose `ticker(symbol)` returns a yfinance-like ticker.
+        ttls (dict): Seconds a result stays fresh, per data kind.
+    """
+
+    def __init__(self, backend: Any = None, ttls: Optional[Dict[str, float]] = None) -> None:
+        self.backend = backend if backend is not None else YFinanceBackend()
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._results: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+        self.stats: Dict[str, FetchStats] = defaultdict(FetchStats)
+
+    def fetch(self, kind: str, symbol: str) -> Any:
+        """
+        Return the `kind` data of `symbol`, fetching it if missing or expired.
+
+        Args:
+            kind (str): One of the FETCHERS keys.
+            symbol (str): Ticker symbol, e.g. "RNO.PA".
+
+        Returns:
+            The data, as returned by the backend ticker.
+        """
+        key = (kind, symbol)
+        with self._lock:
+            key_lock = self._key_locks[key]
+            self.stats[kind].calls += 1
+        with key_lock:
+            cached = self._results.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.ttls[kind]:
+                with self._lock:
+                    self.stats[kind].hits += 1
+                return cached[1]
+
+            start = time.perf_counter()
+            result = FETCHERS[kind](self.backend.ticker(symbol))
+            elapsed = time.perf_counter() - start
+            self._results[key] = (time.monotonic(), result)
+            with self._lock:
+                self.stats[kind].fetch_seconds += elapsed
+            logger.info(f"Fetched {kind} of {symbol} in {elapsed * 1000:.0f}ms")
+            return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+    def report(self) -> None:
+        for kind, stats in sorted(self.stats.items()):
+            logger.info(f"{kind}: {stats.calls} calls, {stats.hits} cached, {stats.mean_fetch_ms:.0f}ms per fetch")
+
+
+market = MarketDataClient()
@@ -0,0 +1,330 @@
+"""
+    Local market-data store read by the agent tools.
+
+    Time series (prices, ratings upgrades/downgrades, splits) and holders are stored as
+    append-only Parquet part files per ticker and table: a refresh only writes the rows
+    not stored yet, and parts are compacted once they pile up. Reads
+    load a table once (until its parts change) and answer date ranges with a binary
+    search on the sorted date index. Company information, calendar and news are stored
+    as JSON snapshots.
+
+    The agent tools only read this store, so a user request never waits on Yahoo. The
+    store is refreshed in the background by the agent, or with:
+    `python .\\lib\\market_store.py`
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config.logger import logger
+from config.settings import MARKET_DATA_DIR, MARKET_REFRESH_INTERVAL, MARKET_SYMBOLS
+from market_data import MarketDataClient, market
+
+TIME_SERIES = ("prices", "upgrades_downgrades", "splits")
+HOLDERS = ("mutualfund_holders", "institutional_holders")
+SNAPSHOTS = ("info", "calendar", "news")
+
+# Parts of a table merged into one file above this count.
+MAX_PARTS = 16
+# Attempts of a read whose part files are removed by a compaction meanwhile.
+READ_ATTEMPTS = 3
+
+
+def _to_frame(data: Any, table: str) -> pd.DataFrame:
+    if isinstance(data, pd.Series):
+        data = data.to_frame(name=data.name or table)
+    if data is None or not isinstance(data, pd.DataFrame):
+        return pd.DataFrame()
+    return data
+
+
+class ParquetTable:
+    """
+    Append-only table of Parquet part files in a directory, read as one DataFrame
+    sorted by its index.
+
+    Appends write `part-<ns>.parquet` files. Compaction merges the current files into
+    `base-<ns>.parquet`, named after the newest part it holds, then removes them: a
+    reader, in this process or another one, only uses the newest base and the parts
+    written after it, so it never reads a row twice while the old files are removed.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._frame: Optional[pd.DataFrame] = None
+        self._parts: Tuple[str, ...] = ()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(name: str) -> int:
+        # "part-<ns>.parquet" or "base-<ns>.parquet"
+        return int(name[len("part-") : -len(".parquet")])
+
+    def parts(self) -> Tuple[str, ...]:
+        """
+        Return the files holding the table: the newest base and the parts written after it.
+        """
+        if not os.path.isdir(self.path):
+            return ()
+        names = [f for f in os.listdir(self.path) if f.endswith(".parquet")]
+        bases = sorted((f for f in names if f.startswith("base-")), key=self._stamp)
+        covered = self._stamp(bases[-1]) if bases else -1
+        parts = sorted((f for f in names if f.startswith("part-") and self._stamp(f) > covered), key=self._stamp)
+        return tuple(bases[-1:] + parts)
+
+    def read(self) -> pd.DataFrame:
+        """
+        Return the whole table, reloading it only if parts were added since the last read.
+        """
+        with self._lock:
+            return self._read()
+
+    def _read(self) -> pd.DataFrame:
+        for attempt in range(1, READ_ATTEMPTS + 1):
+            parts = self.parts()
+            if self._frame is not None and parts == self._parts:
+                return self._frame
+            try:
+                frames = [pd.read_parquet(os.path.join(self.path, part)) for part in parts]
+            except FileNotFoundError:
+                # Merged into a new base by another process meanwhile: list the files again.
+                if attempt == READ_ATTEMPTS:
+                    raise
+                continue
+            frame = pd.concat(frames) if frames else pd.DataFrame()
+            # Parts only hold rows newer than the previous ones: this is a merge of sorted runs.
+            self._frame = frame.sort_index(kind="stable") if len(frame) else frame
+            self._parts = parts
+        return self._frame
+
+    def append(self, rows: pd.DataFrame) -> None:
+        """
+        Write `rows` as a new part, atomically, then compact if there are too many parts.
+        """
+        if rows.empty:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        name = f"part-{time.time_ns()}.parquet"
+        tmp_path = os.path.join(self.path, f".{name}.tmp")
+        rows.to_parquet(tmp_path)
+        os.replace(tmp_path, os.path.join(self.path, name))
+        if len(self.parts()) > MAX_PARTS:
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Merge the files of the table into one base, then remove the merged files.
+        """
+        with self._lock:
+            frame = self._read()
+            parts = self._parts
+            if len(parts) < 2:
+                return
+            name = f"base-{self._stamp(parts[-1])}.parquet"
+            tmp_path = os.path.join(self.path, f".{name}.tmp")
+            frame.to_parquet(tmp_path)
+            os.replace(tmp_path, os.path.join(self.path, name))
+            for part in parts:
+                if part != name:
+                    try:
+                        os.remove(os.path.join(self.path, part))
+                    except FileNotFoundError:
+                        pass
+            self._parts = (name,)
+
+    def last_index(self) -> Optional[Any]:
+        frame = self.read()
+        return frame.index[-1] if len(frame) else None
+
+
+class MarketStore:
+    """
+    Local store of market data, per ticker.
+
+    Args:
+        root (str): Directory of the store.
+        client (MarketDataClient): Fetches the data on refresh.
+    """
+
+    def __init__(self, root: str = MARKET_DATA_DIR, client: MarketDataClient = market) -> None:
+        self.root = root
+        self.client = client
+        self._tables: Dict[Tuple[str, str], ParquetTable] = {}
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+
+    def table(self, name: str, symbol: str) -> ParquetTable:
+        with self._lock:
+            if (name, symbol) not in self._tables:
+                self._tables[(name, symbol)] = ParquetTable(os.path.join(self.root, symbol, name))
+            return self._tables[(name, symbol)]
+
+    def _snapshot_path(self, kind: str, symbol: str) -> str:
+        return os.path.join(self.root, symbol, f"{kind}.json")
+
+    # ------------------------ reads ------------------------
+
+    def range(self, name: str, symbol: str, start: Any = None, end: Any = None) -> pd.DataFrame:
+        """
+        Return the rows of a time series between two dates, both included.
+
+        Args:
+            name (str): One of TIME_SERIES.
+            symbol (str): Ticker symbol.
+            start, end: Dates (str, datetime or Timestamp), or None for no bound.
+
+        Returns:
+            pd.DataFrame: The rows, sorted by date. Empty if nothing is stored yet.
+        """
+        frame = self.table(name, symbol).read()
+        if frame.empty:
+            logger.warning(f"No {name} stored for {symbol}")
+            return frame
+        index = frame.index
+        lo = 0 if start is None else index.searchsorted(self._timestamp(start, index), side="left")
+        hi = len(index) if end is None else index.searchsorted(self._timestamp(end, index), side="right")
+        return frame.iloc[lo:hi]
+
+    @staticmethod
+    def _timestamp(value: Any, index: pd.DatetimeIndex) -> pd.Timestamp:
+        timestamp = pd.Timestamp(value)
+        if index.tz is not None and timestamp.tz is None:
+            return timestamp.tz_localize(index.tz)
+        if index.tz is None and timestamp.tz is not None:
+            return timestamp.tz_localize(None)
+        return timestamp
+
+    def latest(self, name: str, symbol: str) -> pd.DataFrame:
+        """
+        Return the latest stored snapshot of a holders table.
+        """
+        frame = self.table(name, symbol).read()
+        if frame.empty:
+            logger.warning(f"No {name} stored for {symbol}")
+            return frame
+        return frame.loc[frame.index == frame.index[-1]].reset_index(drop=True)
+
+    def snapshot(self, kind: str, symbol: str) -> Any:
+        """
+        Return a JSON snapshot (info, calendar or news), or an empty dict.
+        """
+        path = self._snapshot_path(kind, symbol)
+        if not os.path.isfile(path):
+            logger.warning(f"No {kind} stored for {symbol}")
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)["data"]
+
+    # ------------------------ refresh ------------------------
+
+    def refresh(self, symbol: str) -> None:
+        """
+        Fetch what changed since the last refresh and append it.
+
+        Prices are fetched from the day after the last stored one. The other kinds
+        go through the client, so they are only refetched once their TTL expired.
+        """
+        self._try("prices", symbol, lambda: self._refresh_prices(symbol))
+        for name in ("upgrades_downgrades", "splits"):
+            self._try(name, symbol, lambda: self._append_newer(name, symbol, self.client.fetch(name, symbol)))
+        for name in HOLDERS:
+            self._try(name, symbol, lambda: self._append_holders(name, symbol, self.client.fetch(name, symbol)))
+        for kind in SNAPSHOTS:
+            self._try(kind, symbol, lambda: self._write_snapshot(kind, symbol, self.client.fetch(kind, symbol)))
+
+    def refresh_all(self, symbols: List[str] = MARKET_SYMBOLS) -> None:
+        start = time.perf_counter()
+        for symbol in symbols:
+            self.refresh(symbol)
+        logger.info(f"Refreshed market data of {', '.join(symbols)} in {time.perf_counter() - start:.1f}s")
+
+    def start_background_refresh(self, symbols: List[str] = MARKET_SYMBOLS, interval: float = MARKET_REFRESH_INTERVAL) -> None:
+        """
+        Refresh the store every `interval` seconds from a daemon thread, starting now.
+        """
+        if self._refresher is not None or interval <= 0:
+            return
+
+        def loop() -> None:
+            while True:
+                try:
+                    self.refresh_all(symbols)
+                except Exception as e:
+                    logger.error(f"Market data refresh failed: {e}")
+                time.sleep(interval)
+
+        self._refresher = threading.Thread(target=loop, name="market-refresh", daemon=True)
+        self._refresher.start()
+
+    def _try(self, name: str, symbol: str, refresh) -> None:
+        # Some kinds do not exist for some tickers (no holders for an index).
+        try:
+            refresh()
+        except Exception as e:
+            logger.warning(f"Could not refresh {name} of {symbol}: {e}")
+
+    def _refresh_prices(self, symbol: str) -> None:
+        table = self.table("prices", symbol)
+        last = table.last_index()
+        ticker = self.client.backend.ticker(symbol)
+        if last is None:
+            history = ticker.history(period="max", auto_adjust=False)
+        else:
+            history = ticker.history(start=(last + pd.Timedelta(days=1)).strftime("%Y-%m-%d"), auto_adjust=False)
+        self._append_newer("prices", symbol, history)
+
+    def _append_newer(self, name: str, symbol: str, data: Any) -> None:
+        frame = _to_frame(data, name)
+        if frame.empty:
+            return
+        table = self.table(name, symbol)
+        stored = table.read()
+        frame = frame.sort_index()
+        if len(stored):
+            # Rows of the last stored date may have been published after the last
+            # refresh (two ratings the same day): compare whole rows on that date.
+            last = stored.index[-1]
+            frame = frame[frame.index >= last]
+            tail = stored[stored.index >= last]
+            combined = pd.concat([tail, frame]).reset_index()
+            frame = frame[~combined.duplicated().to_numpy()[len(tail) :]]
+        table.append(frame)
+        if len(frame):
+            logger.info(f"Appended {len(frame)} {name} rows for {symbol}")
+
+    def _append_holders(self, name: str, symbol: str, data: Any) -> None:
+        frame = _to_frame(data, name).reset_index(drop=True)
+        if frame.empty:
+            return
+        stored = self.table(name, symbol).read()
+        if len(stored) and stored.loc[stored.index == stored.index[-1]].reset_index(drop=True).equals(frame):
+            return
+        # A full timestamp, not the day: holders can change twice a day, and `latest`
+        # must not merge two snapshots. Naive UTC, like the snapshots already stored.
+        as_of = pd.Timestamp(datetime.now(timezone.utc).replace(tzinfo=None))
+        self.table(name, symbol).append(frame.set_index(pd.DatetimeIndex([as_of] * len(frame), name="as_of")))
+
+    def _write_snapshot(self, kind: str, symbol: str, data: Any) -> None:
+        path = self._snapshot_path(kind, symbol)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": datetime.now(timezone.utc).isoformat(), "data": data}, f, default=str)
+        os.replace(tmp_path, path)
+
+
+market_store = MarketStore()
+
+
+def main():
+    market_store.refresh_all()
+
+
+if __name__ == "__main__":
+    main()
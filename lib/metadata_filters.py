@@ -0,0 +1,290 @@
+"""
+    Query-time metadata filters on the chunks: year, source, source type and title.
+
+    Filters are given explicitly (`retriever.invoke(question, filter={"year": 2022})`)
+    or parsed from the question ("la marge opérationnelle en 2022"). They are
+    normalized to `{"key": {"$in": [str, ...]}}` predicates, which PGVector pushes
+    down as `cmetadata ->> 'key' IN (...)`: the expression indexes created by
+    `ensure_metadata_indexes` serve them, and the comparison as text makes years
+    stored as numbers (PDFs) and as strings (transcripts) match alike. The local
+    index and the BM25 index evaluate the same filters on row partitions.
+"""
+
+import asyncio
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain.retrievers.multi_vector import MultiVectorRetriever, SearchType
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from config.logger import logger
+from tracing import tracer
+from utils import extract_year
+
+FILTER_KEYS = ("year", "source", "source_type", "title")
+
+# A year only counts when the words around it make it one: "vendu 2000 voitures" is a quantity.
+YEAR_PATTERN = re.compile(
+    r"\b(?:en|in|année|annee|year|exercice|fiscal|fy|depuis|since|rapport à|compared to|vs"
+    r"|rapport annuel|annual report)\s+((?:19|20)\d{2})\b"
+    r"|\b((?:19|20)\d{2})\s+(?:results|résultats|resultats|annual report|rapport annuel)\b"
+)
+YEAR_RANGE_PATTERN = re.compile(r"\b(?:entre|de|from|between)\s+((?:19|20)\d{2})\s+(?:et|à|a|to|and)\s+((?:19|20)\d{2})\b")
+# Phrases restricting a question to a kind of source, with the source types they allow.
+# "rapport" alone is not one: "par rapport à" only compares.
+SOURCE_TYPE_PATTERNS = [
+    (["youtube"], re.compile(r"\b(?:youtube|vidéos?|videos?|interviews?)\b")),
+    (["pdf", "image"], re.compile(
+        r"\b(?:rapports? annuels?|(?:dans|selon|d'après|d’après) le rapport"
+        r"|annual reports?|(?:in|according to) the report)\b"
+    )),
+]
+
+
+def normalize_filter(filter_: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Normalize a filter to PGVector's syntax, with one `$in` over strings per key.
+
+    Args:
+        filter_: {key: value}, {key: [values]} or {key: {"$in"|"$eq": ...}}, over FILTER_KEYS.
+
+    Returns:
+        dict: `{"key": {"$in": [...]}}`, `{"$and": [...]}` for several keys, or None.
+    """
+    if not filter_:
+        return None
+    clauses = []
+    for key, value in filter_.items():
+        if key not in FILTER_KEYS:
+            raise ValueError(f"Cannot filter on {key!r}, expected one of {FILTER_KEYS}")
+        if isinstance(value, dict):
+            (operator, value), = value.items()
+            if operator not in ("$in", "$eq"):
+                raise ValueError(f"Unsupported operator {operator!r} on {key!r}")
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        clauses.append({key: {"$in": sorted({str(v) for v in values})}})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def filter_clauses(filter_: Optional[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Return the allowed values of each key of a normalized filter.
+    """
+    if not filter_:
+        return {}
+    clauses = filter_.get("$and", [filter_])
+    return {key: condition["$in"] for clause in clauses for key, condition in clause.items()}
+
+
+def parse_filters(question: str) -> Optional[Dict[str, Any]]:
+    """
+    Infer a filter from the years and source phrases of a question.
+
+    Args:
+        question: The user question.
+
+    Returns:
+        dict: A normalized filter, or None if the question names no year nor source.
+    """
+    lowered = question.lower()
+    filter_: Dict[str, Any] = {}
+    year_range = YEAR_RANGE_PATTERN.search(lowered)
+    if year_range:
+        first, last = sorted(int(year) for year in year_range.groups())
+        filter_["year"] = list(range(first, last + 1))
+    else:
+        years = [before or after for before, after in YEAR_PATTERN.findall(lowered)]
+        if years:
+            filter_["year"] = years
+    source_types = {t for types, pattern in SOURCE_TYPE_PATTERNS if pattern.search(lowered) for t in types}
+    if source_types:
+        filter_["source_type"] = sorted(source_types)
+    return normalize_filter(filter_)
+
+
+def source_type(source: Optional[str]) -> str:
+    if source and source.startswith(("http://", "https://")):
+        return "youtube"
+    if source and source.lower().endswith(".pdf"):
+        return "pdf"
+    return "text"
+
+
+# Version of the metadata `stamp_filter_metadata` gives the chunks. It is part of the
+# ingestion hash: bump it when chunks get new metadata, and the next ingestion run
+# rewrites the chunks of every parent, including those stored before.
+CHUNK_METADATA_VERSION = 1
+
+
+def stamp_filter_metadata(chunk: Document, filename: str) -> Document:
+    """
+    Give a chunk the metadata the filters need.
+
+    Text chunks inherit year, source and title from their parent and get their
+    source type. Image summaries get them from the image path, which is
+    `<extracted data>/<PDF name>/<figure|table>-<page>-<n>.jpg`.
+    """
+    metadata = chunk.metadata
+    if "source" in metadata:
+        metadata.setdefault("source_type", source_type(metadata["source"]))
+        return chunk
+    pdf_name = os.path.basename(os.path.dirname(filename))
+    metadata.update({"source_type": "image", "source": f"{pdf_name}.pdf", "title": f"{pdf_name}.pdf"})
+    year = extract_year(pdf_name)
+    if year is not None:
+        metadata["year"] = year
+    return chunk
+
+
+def ensure_metadata_indexes(engine: Engine) -> None:
+    """
+    Create the expression indexes serving the filters on `langchain_pg_embedding`.
+    """
+    with engine.begin() as connection:
+        for key in FILTER_KEYS:
+            connection.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS ix_cmetadata_{key} "
+                    f"ON langchain_pg_embedding (collection_id, (cmetadata ->> '{key}'))"
+                )
+            )
+    logger.info(f"Metadata indexes on {', '.join(FILTER_KEYS)} are in place")
+
+
+class MetadataPartitions:
+    """
+    Rows of a local index grouped by the value of each filter key, so a filtered
+    search only scores the rows of the selected partitions.
+
+    Args:
+        metadatas: Metadata of each row.
+    """
+
+    def __init__(self, metadatas: Iterable[dict]) -> None:
+        groups: Dict[str, Dict[str, List[int]]] = {key: {} for key in FILTER_KEYS}
+        for row, metadata in enumerate(metadatas):
+            for key in FILTER_KEYS:
+                if metadata.get(key) is not None:
+                    groups[key].setdefault(str(metadata[key]), []).append(row)
+        self.partitions = {
+            key: {value: np.asarray(rows, dtype=np.int64) for value, rows in values.items()}
+            for key, values in groups.items()
+        }
+
+    def rows(self, filter_: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Return the sorted rows matching a normalized filter, or None if it is empty.
+        """
+        rows = None
+        for key, values in filter_clauses(filter_).items():
+            parts = [self.partitions[key][v] for v in values if v in self.partitions[key]]
+            matching = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+            rows = matching if rows is None else np.intersect1d(rows, matching, assume_unique=True)
+        return rows
+
+
+class FilteredMultiVectorRetriever(MultiVectorRetriever):
+    """
+    MultiVectorRetriever accepting a metadata filter per query.
+
+    `invoke(question, filter=...)` searches with an explicit filter. Without one,
+    the filter is parsed from the question if `infer_filters` is set; when such an
+    inferred filter matches nothing, the search is retried without it.
+
+    With a `reranker` (see rerank.py), `reranker.candidates` chunks are fetched and
+    only the parents of the best `reranker.top_n` after reranking are returned.
+    """
+
+    infer_filters: bool = True
+    reranker: Optional[Any] = None
+
+    def _query_filter(self, query: str, filter_: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if filter_:
+            return normalize_filter(filter_)
+        return parse_filters(query) if self.infer_filters else None
+
+    def _search_kwargs(self, filter_: Optional[Dict[str, Any]]) -> dict:
+        search_kwargs = {**self.search_kwargs, "filter": filter_} if filter_ else self.search_kwargs
+        if self.reranker is not None:
+            search_kwargs = {**search_kwargs, "k": self.reranker.candidates}
+        return search_kwargs
+
+    def _search(self, query: str, search_kwargs: dict) -> List[Document]:
+        with tracer.span("vector_search", k=search_kwargs.get("k"), filtered="filter" in search_kwargs) as span:
+            sub_docs = self._search_vectorstore(query, search_kwargs)
+            span.set(results=len(sub_docs))
+        return sub_docs
+
+    async def _asearch(self, query: str, search_kwargs: dict) -> List[Document]:
+        with tracer.span("vector_search", k=search_kwargs.get("k"), filtered="filter" in search_kwargs) as span:
+            sub_docs = await self._asearch_vectorstore(query, search_kwargs)
+            span.set(results=len(sub_docs))
+        return sub_docs
+
+    def _search_vectorstore(self, query: str, search_kwargs: dict) -> List[Document]:
+        if self.search_type == SearchType.mmr:
+            return self.vectorstore.max_marginal_relevance_search(query, **search_kwargs)
+        if self.search_type == SearchType.similarity_score_threshold:
+            return [doc for doc, _ in self.vectorstore.similarity_search_with_relevance_scores(query, **search_kwargs)]
+        return self.vectorstore.similarity_search(query, **search_kwargs)
+
+    async def _asearch_vectorstore(self, query: str, search_kwargs: dict) -> List[Document]:
+        if self.search_type == SearchType.mmr:
+            return await self.vectorstore.amax_marginal_relevance_search(query, **search_kwargs)
+        if self.search_type == SearchType.similarity_score_threshold:
+            hits = await self.vectorstore.asimilarity_search_with_relevance_scores(query, **search_kwargs)
+            return [doc for doc, _ in hits]
+        return await self.vectorstore.asimilarity_search(query, **search_kwargs)
+
+    def _mget(self, ids: List[str]) -> List[Any]:
+        # Image parents come back as lazy handles when the docstore supports it.
+        mget = getattr(self.docstore, "mget_handles", self.docstore.mget)
+        return [d for d in mget(ids) if d is not None]
+
+    async def _amget(self, ids: List[str]) -> List[Any]:
+        amget = getattr(self.docstore, "amget_handles", self.docstore.amget)
+        return [d for d in await amget(ids) if d is not None]
+
+    def _parent_ids(self, sub_docs: List[Document]) -> List[str]:
+        # Keep the order of the chunks, one entry per parent.
+        return list(dict.fromkeys(d.metadata[self.id_key] for d in sub_docs if self.id_key in d.metadata))
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        query_filter = self._query_filter(query, filter)
+        sub_docs = self._search(query, self._search_kwargs(query_filter))
+        if not sub_docs and query_filter and not filter:
+            logger.info(f"No chunk matches the inferred filter {query_filter}, searching without it")
+            sub_docs = self._search(query, self._search_kwargs(None))
+        if self.reranker is not None:
+            with tracer.span("rerank", candidates=len(sub_docs)):
+                sub_docs = self.reranker.rerank(query, sub_docs)
+        return self._mget(self._parent_ids(sub_docs))
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        query_filter = self._query_filter(query, filter)
+        sub_docs = await self._asearch(query, self._search_kwargs(query_filter))
+        if not sub_docs and query_filter and not filter:
+            logger.info(f"No chunk matches the inferred filter {query_filter}, searching without it")
+            sub_docs = await self._asearch(query, self._search_kwargs(None))
+        if self.reranker is not None:
+            # Scoring is CPU-bound: keep it off the event loop.
+            with tracer.span("rerank", candidates=len(sub_docs)):
+                sub_docs = await asyncio.to_thread(self.reranker.rerank, query, sub_docs)
+        return await self._amget(self._parent_ids(sub_docs))
@@ -0,0 +1,32 @@
+"""
+    Script to launch to re-encode legacy pickled docstore rows with the binary codec.
+
+    Legacy rows are read transparently, so the migration can run at any time:
+    `python .\\lib\\migrate_docstore.py --dry-run`
+"""
+
+import argparse
+
+from config.logger import logger
+from config.settings import COLLECTION_NAME, CONNECTION_STRING
+from registry import registry
+from store import PostgresByteStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-encode legacy pickled docstore rows.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows rewritten per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the legacy rows")
+    args = parser.parse_args()
+
+    engine, async_engine = registry.engines(CONNECTION_STRING)
+    store = PostgresByteStore(CONNECTION_STRING, COLLECTION_NAME, engine=engine, async_engine=async_engine)
+    migrated = store.migrate_legacy_rows(batch_size=args.batch_size, dry_run=args.dry_run)
+    if args.dry_run:
+        logger.info(f"{migrated} legacy rows would be migrated")
+    else:
+        logger.info(f"Migrated {migrated} legacy rows to the {store.codec.name} codec")
+
+
+if __name__ == "__main__":
+    main()
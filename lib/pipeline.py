@@ -0,0 +1,182 @@
+"""
+    Streaming pipeline with bounded queues between stages.
+
+    Each stage runs in its own thread and hands its output to the next one through a
+    bounded queue: a slow stage blocks the stages upstream of it (backpressure), so
+    at most `queue_size` items wait between two stages whatever the corpus size.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from tqdm import tqdm
+
+from config.logger import logger
+from config.settings import PIPELINE_QUEUE_SIZE
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """
+    A pipeline stage. `fn` maps one item to the next stage's item, or to None to drop it.
+    """
+
+    name: str
+    fn: Callable[[Any], Any]
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0
+    busy_seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.busy_seconds if self.busy_seconds else 0.0
+
+
+class Pipeline:
+    """
+    Runs a source iterable through a list of stages.
+
+    Args:
+        stages (List[Stage]): Stages, in order.
+        queue_size (int): Maximum number of items waiting between two stages.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = PIPELINE_QUEUE_SIZE) -> None:
+        self.stages = stages
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def run(self, source: Iterable, name: str = "load", sink: Optional[Callable[[Any], None]] = None) -> List[StageStats]:
+        """
+        Run the pipeline until the source is exhausted.
+
+        Args:
+            source (Iterable): Items fed to the first stage.
+            name (str): Name of the source stage in the progress report.
+            sink (Callable): Called with every output of the last stage.
+
+        Returns:
+            List[StageStats]: Items processed and busy time of every stage.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        stats = [StageStats(name)] + [StageStats(stage.name) for stage in self.stages]
+        bars = [tqdm(desc=s.name, unit="item", position=i, leave=False) for i, s in enumerate(stats)]
+        self._stop.clear()
+        self._error = None
+
+        threads = [threading.Thread(target=self._feed, args=(source, queues[0], stats[0], bars[0]), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            out = queues[i + 1] if i + 1 < len(queues) else None
+            threads.append(
+                threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[i], out, sink, stats[i + 1], bars[i + 1]),
+                    daemon=True,
+                )
+            )
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for bar in bars:
+            bar.close()
+
+        elapsed = time.perf_counter() - start
+        for s in stats:
+            logger.info(f"Stage {s.name}: {s.items} items, busy {s.busy_seconds:.1f}s, {s.throughput:.2f} items/s")
+        logger.info(f"Pipeline finished in {elapsed:.1f}s")
+        if self._error is not None:
+            raise self._error
+        return stats
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, stage_name: str, error: BaseException) -> None:
+        logger.error(f"Stage {stage_name} failed: {error}")
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _feed(self, source: Iterable, out: queue.Queue, stats: StageStats, bar: tqdm) -> None:
+        try:
+            iterator = iter(source)
+            while True:
+                start = time.perf_counter()
+                item = next(iterator, _DONE)
+                stats.busy_seconds += time.perf_counter() - start
+                if item is _DONE or not self._put(out, item):
+                    break
+                stats.items += 1
+                bar.update()
+        except BaseException as e:
+            self._fail(stats.name, e)
+        finally:
+            self._put(out, _DONE)
+
+    def _work(self, stage: Stage, inp: queue.Queue, out: Optional[queue.Queue], sink, stats: StageStats, bar: tqdm) -> None:
+        try:
+            while True:
+                item = self._get(inp)
+                if item is _DONE:
+                    break
+                start = time.perf_counter()
+                result = stage.fn(item)
+                stats.busy_seconds += time.perf_counter() - start
+                stats.items += 1
+                bar.update()
+                if result is None:
+                    continue
+                if out is not None:
+                    if not self._put(out, result):
+                        break
+                elif sink is not None:
+                    sink(result)
+        except BaseException as e:
+            self._fail(stage.name, e)
+        finally:
+            if out is not None:
+                self._put(out, _DONE)
+
+
+def bounded_map(executor: Executor, fn: Callable, items: Iterable, max_in_flight: int) -> Iterator:
+    """
+    Like `executor.map`, but keeps at most `max_in_flight` results in memory.
+
+    `executor.map` submits every item at once, so results pile up while a slow
+    consumer works through them. Results are yielded in input order.
+    """
+    pending = deque()
+    for item in items:
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, item))
+    while pending:
+        yield pending.popleft().result()
@@ -1,63 +1,99 @@
-import streamlit as st
 from retriever import get_retriever
+from registry import registry
 from utils import parse_docs
+from images import prompt_images, thumbnail_images
+from context_budget import assemble_context, format_context
+from tracing import traced_runnable, tracer
+from service_client import get_service_client
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage
-from config.settings import model
+from config.settings import get_model
 
 def build_prompt(kwargs):
     docs_by_type = kwargs["context"]
     user_question = kwargs["question"]
-    context_text = ""
-    if len(docs_by_type["texts"]) > 0:
-        for text_element in docs_by_type["texts"]:
-            context_text += text_element.page_content
+    context_text = format_context(docs_by_type["texts"])
     prompt_template = f"""
     Answer the question based only on the following context, which can include text, tables, and the below image.
     Context: {context_text}
     Question: {user_question}
     """
     prompt_content = [{"type": "text", "text": prompt_template}]
-    if len(docs_by_type["images"]) > 0:
-        for image in docs_by_type["images"]:
-            prompt_content.append(
-                {
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{image}"},
-                }
-            )
+    images = prompt_images(docs_by_type["images"]) if len(docs_by_type["images"]) > 0 else []
+    for image in images:
+        prompt_content.append(
+            {
+                "type": "image_url",
+                "image_url": {"url": f"data:image/jpeg;base64,{image}"},
+            }
+        )
+    tracer.current().set(bytes=len(prompt_template) + sum(len(image) for image in images), images=len(images))
     return ChatPromptTemplate.from_messages(
         [
             HumanMessage(content=prompt_content),
         ]
     )
 
-def get_response_with_sources(retriever, question):
-    chain_with_sources = {
-        "context": retriever | RunnableLambda(parse_docs),
+def build_rag_chain(retriever, llm=None, assemble=True):
+    """
+    Build the chain answering a question with its sources, usable with `invoke` or `ainvoke`.
+
+    Args:
+        retriever: Retriever returning the parent documents of a question.
+        llm: Chat model answering from the context, defaults to the configured model.
+        assemble: Deduplicate and rank the retrieved passages and fit them to the
+            token budget (see context_budget.py), instead of passing whole parents.
+
+    Returns:
+        Runnable: Maps a question to a dict with "context", "question" and "response".
+        With `assemble`, the context has a "stats" entry with its size in tokens.
+        With TRACING enabled, each step runs in a span (see tracing.py).
+    """
+    chain = {
+        "context": traced_runnable("retrieve", retriever) | traced_runnable("parse_docs", RunnableLambda(parse_docs)),
         "question": RunnablePassthrough(),
-    } | RunnablePassthrough().assign(
-        response=(RunnableLambda(build_prompt) | model | StrOutputParser())
+    }
+    if assemble:
+        chain = chain | RunnablePassthrough().assign(
+            context=traced_runnable("assemble_context", RunnableLambda(assemble_context))
+        )
+    return chain | RunnablePassthrough().assign(
+        response=(
+            traced_runnable("build_prompt", RunnableLambda(build_prompt))
+            | traced_runnable("llm", llm or get_model())
+            | StrOutputParser()
+        )
     )
-    return chain_with_sources.invoke(question)
+
+def get_response_with_sources(retriever, question):
+    with tracer.span("rag.chain"):
+        return build_rag_chain(retriever).invoke(question)
+
+def get_cached_response_with_sources(retriever, question):
+    """
+    Same as get_response_with_sources, but answers a question similar to an already
+    answered one from the semantic answer cache.
+    """
+    with tracer.span("rag.query", question_chars=len(question)):
+        answer_cache = registry.answer_cache()
+        if answer_cache is None:
+            return get_response_with_sources(retriever, question)
+        return answer_cache.get_or_compute(question, lambda: get_response_with_sources(retriever, question))
 
 def show_retriever_app(question):
-    # Initialize retriever
-    retriever = get_retriever()
+    import streamlit as st
+    from app_views import show_rag_response
+
+    # With RAG_SERVICE_URL set, the retrieval service answers; otherwise, this process.
+    client = get_service_client()
     with st.spinner("Processing..."):
-        response = get_response_with_sources(retriever, question)
-    
-        # Display the response
-        st.write(response['response'])
-        st.subheader("Context:")
-        for text in response['context']['texts']:
-            st.write("Source:", text.metadata.get('source', 'Unknown'))
-            st.write("Chunk:", text.page_content)
-            st.write("---")
-
-        # Display images if any
-        for i, image in enumerate(response['context']['images']):
-            st.image(f"data:image/jpeg;base64,{image}", caption=f"Image {i+1}", use_container_width =True)
+        if client is not None:
+            response = client.answer(question)
+        else:
+            response = get_cached_response_with_sources(get_retriever(), question)
+            context = response['context']
+            response = {**response, 'context': {**context, 'images': thumbnail_images(context['images'])}}
 
+        show_rag_response(response)
@@ -0,0 +1,233 @@
+"""
+    Long-lived retrieval and answer service.
+
+    The embedding model, the retriever with its connection pools, the LLM client and
+    the agent are loaded once and kept warm, so the Streamlit app (any number of its
+    workers) is a thin client (see service_client.py) instead of loading its own.
+    Concurrent `/embed` requests are batched into shared model calls (see batching.py).
+
+    JSON over HTTP, one thread per request:
+    - GET  /health: status and batching counters.
+    - POST /embed {"texts": [...]}: {"embeddings": [[...], ...]}
+    - POST /retrieve {"question": ..., "filter": {...}}: {"texts": [...], "images": [...]}
+    - POST /answer {"question": ...}: {"question", "response", "context": {"texts", "images"}}
+    - POST /agent {"question": ...}: {"output": ...}
+    - GET  /metrics: Prometheus metrics when TRACING is enabled.
+
+    Documents are sent as {"page_content", "metadata"} and images as their base64
+    JPEG thumbnails, for display. Start it, then set RAG_SERVICE_URL for the app:
+    `python .\\lib\\rag_service.py --port 8600`
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import HumanMessage
+from langchain_core.retrievers import BaseRetriever
+
+from config.logger import logger
+from config.settings import RAG_SERVICE_HOST, RAG_SERVICE_PORT, get_model
+from batching import EmbeddingBatcher
+from images import thumbnail_images
+from rag_app import build_rag_chain, get_cached_response_with_sources
+from registry import registry
+from retriever import get_retriever
+from tracing import tracer
+from utils import parse_docs
+
+WARM_UP_QUESTION = "Quelle est la marge opérationnelle de Renault en 2023 ?"
+
+
+def documents_to_json(docs: List[Any]) -> List[Dict[str, Any]]:
+    return [
+        {"page_content": doc.page_content, "metadata": doc.metadata}
+        if isinstance(doc, Document)
+        else {"page_content": str(doc), "metadata": {}}
+        for doc in docs
+    ]
+
+
+def context_to_json(context: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {"texts": documents_to_json(context["texts"]), "images": thumbnail_images(context["images"])}
+    if "stats" in context:
+        payload["stats"] = context["stats"]
+    return payload
+
+
+def _field(request: Any, name: str) -> Any:
+    if not isinstance(request, dict) or name not in request:
+        raise ValueError(f"Missing field {name!r}")
+    return request[name]
+
+
+class RAGService:
+    """
+    The components served, shared by every request.
+
+    Args:
+        retriever (BaseRetriever): Defaults to `get_retriever()`.
+        embeddings (Embeddings): Model of `/embed`, defaults to the shared embedding model.
+        llm (BaseChatModel): Chat model answering `/answer`. By default the configured
+            model, behind the semantic answer cache.
+        agent: Executor answering `/agent`, defaults to the finance agent.
+    """
+
+    def __init__(
+        self,
+        retriever: Optional[BaseRetriever] = None,
+        embeddings: Optional[Embeddings] = None,
+        llm: Optional[BaseChatModel] = None,
+        agent: Optional[Any] = None,
+    ) -> None:
+        self.retriever = retriever or get_retriever()
+        self.embeddings = embeddings or registry.embeddings()
+        self.batcher = EmbeddingBatcher(self.embeddings)
+        self.llm = llm
+        self.chain = build_rag_chain(self.retriever, llm) if llm is not None else None
+        self._agent = agent
+        self._agent_lock = threading.Lock()
+
+    @property
+    def agent(self) -> Any:
+        with self._agent_lock:
+            if self._agent is None:
+                from renault_agent import get_finance_agent_executor
+
+                self._agent = get_finance_agent_executor()
+            return self._agent
+
+    def warm_up(self) -> None:
+        """
+        Load the models and open the connection pools before the first request.
+        """
+        logger.info("Warming up the service")
+        self.embed([WARM_UP_QUESTION])
+        self.retriever.invoke(WARM_UP_QUESTION)
+        if self.llm is None:
+            get_model()
+        self.agent  # builds the agent and its tools
+        logger.info("Service ready")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.batcher.embed(texts)
+
+    def retrieve(self, question: str, filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        with tracer.span("service.retrieve"):
+            docs = self.retriever.invoke(question, filter=filter) if filter else self.retriever.invoke(question)
+            return context_to_json(parse_docs(docs))
+
+    def answer(self, question: str) -> Dict[str, Any]:
+        if self.chain is None:
+            response = get_cached_response_with_sources(self.retriever, question)
+        else:
+            with tracer.span("rag.query", question_chars=len(question)):
+                response = self.chain.invoke(question)
+        return {"question": question, "response": response["response"], "context": context_to_json(response["context"])}
+
+    def ask_agent(self, question: str) -> Dict[str, Any]:
+        response = self.agent.invoke({"messages": [HumanMessage(content=question)]})
+        return {"output": response.get("output", "")}
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "embedding_requests": self.batcher.requests,
+            "embedding_batches": self.batcher.batches,
+            "mean_batch_size": round(self.batcher.mean_batch_size, 2),
+        }
+
+    def close(self) -> None:
+        self.batcher.close()
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    server: "ServiceServer"
+
+    def _send(self, status: int, payload: Any, content_type: str = "application/json") -> None:
+        body = payload if isinstance(payload, bytes) else json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self._send(200, self.server.service.health())
+        elif self.path == "/metrics":
+            self._send(200, tracer.prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self) -> None:
+        service = self.server.service
+        routes = {
+            "/embed": lambda request: {"embeddings": service.embed([str(text) for text in _field(request, "texts")])},
+            "/retrieve": lambda request: service.retrieve(_field(request, "question"), request.get("filter")),
+            "/answer": lambda request: service.answer(_field(request, "question")),
+            "/agent": lambda request: service.ask_agent(_field(request, "question")),
+        }
+        if self.path not in routes:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = routes[self.path](json.loads(self.rfile.read(length) or b"{}"))
+        except ValueError as e:
+            # Malformed JSON, missing field or invalid filter.
+            self._send(400, {"error": str(e)})
+            return
+        except Exception as e:
+            logger.exception(f"{self.path} failed")
+            self._send(500, {"error": repr(e)})
+            return
+        self._send(200, payload)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class ServiceServer(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer holding the service its handlers call.
+    """
+
+    # Concurrent clients queue their connections instead of being refused.
+    request_queue_size = 128
+
+    def __init__(self, service: RAGService, host: str = RAG_SERVICE_HOST, port: int = RAG_SERVICE_PORT) -> None:
+        super().__init__((host, port), _ServiceHandler)
+        self.service = service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve retrieval and answers over HTTP.")
+    parser.add_argument("--host", default=RAG_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=RAG_SERVICE_PORT)
+    args = parser.parse_args()
+
+    from market_store import market_store
+
+    # The agent tools read the local market-data store, kept fresh in the background.
+    market_store.start_background_refresh()
+    service = RAGService()
+    service.warm_up()
+    server = ServiceServer(service, args.host, args.port)
+    logger.info(f"Serving on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+    Asyncio rate limiting and retry helpers for calls to external APIs.
+"""
+
+import asyncio
+import functools
+import importlib
+import random
+import time
+from typing import Awaitable, Callable, Optional, Tuple, Type, TypeVar
+
+from config.logger import logger
+
+T = TypeVar("T")
+
+# Error classes of the OpenAI and Groq SDKs worth retrying: the others (authentication,
+# bad request, not found...) fail the same way on every attempt.
+TRANSIENT_SDK_ERRORS = ("RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError")
+
+
+@functools.lru_cache(maxsize=None)
+def transient_errors() -> Tuple[Type[BaseException], ...]:
+    """
+    Return the exception types worth retrying, imported on first use to keep the
+    SDKs out of the startup path.
+    """
+    errors = [TimeoutError, ConnectionError, asyncio.TimeoutError]
+    for sdk in ("openai", "groq"):
+        try:
+            module = importlib.import_module(sdk)
+        except ImportError:  # optional dependency, one per LLM provider
+            continue
+        errors.extend(getattr(module, name) for name in TRANSIENT_SDK_ERRORS if hasattr(module, name))
+    return tuple(errors)
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket: allows bursts of `capacity` calls, then `rate` calls per second.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = None
+        self._lock_loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # asyncio locks are bound to one event loop, while the bucket may be shared
+        # by successive `asyncio.run` calls: keep the tokens, renew the lock.
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """
+        Wait until `tokens` tokens are available and take them.
+        """
+        # The lock makes waiters queue in order instead of all waking up together.
+        async with self._get_lock():
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+async def retry_with_backoff(
+    fn: Callable[[], Awaitable[T]],
+    max_attempts: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    retry_on: Optional[Tuple[Type[BaseException], ...]] = None,
+) -> T:
+    """
+    Await `fn()`, retrying with exponential backoff and full jitter.
+
+    Args:
+        fn (Callable): Coroutine factory, called once per attempt.
+        max_attempts (int): Attempts before the last error is raised.
+        base_delay (float): Upper bound of the first delay, in seconds.
+        max_delay (float): Upper bound of any delay, in seconds.
+        retry_on (tuple): Exception types worth retrying. Defaults to rate-limit,
+            timeout, connection and server errors (`transient_errors`); other errors
+            are raised at once.
+
+    Returns:
+        The result of `fn()`.
+    """
+    retry_on = retry_on if retry_on is not None else transient_errors()
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return await fn()
+        except retry_on as e:
+            if attempt == max_attempts:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            logger.warning(f"Attempt {attempt}/{max_attempts} failed ({e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
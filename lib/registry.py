@@ -0,0 +1,348 @@
+"""
+    Process-wide registry for the heavy retrieval components.
+
+    The embedding model, the SQLAlchemy engines (one connection pool per connection
+    string) and the MultiVectorRetriever are built once per process and shared by
+    every caller: Streamlit reruns, agent tools and ingestion scripts. The libraries
+    behind them (sentence-transformers, langchain_postgres) are imported by the first
+    call needing them, so importing the registry stays cheap.
+"""
+
+import atexit
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain.retrievers.multi_vector import MultiVectorRetriever
+
+from config.settings import (
+    ANSWER_CACHE_ENABLED,
+    COLLECTION_NAME,
+    CONNECTION_STRING,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MODEL_NAME,
+    ID_KEY,
+    METADATA_FILTERS,
+    PG_MAX_OVERFLOW,
+    PG_POOL_SIZE,
+    QUERY_MICRO_BATCHING,
+)
+from config.logger import logger
+from answer_cache import SemanticAnswerCache
+from ann_index import IVFIndex, LocalVectorStore, index_path
+from batching import MicroBatchEmbeddings
+from embeddings import CachedEmbeddings
+from hybrid import BM25Index, HybridVectorStore, bm25_index_path
+from metadata_filters import FilteredMultiVectorRetriever
+from rerank import Reranker, get_reranker
+from store import Base, PostgresByteStore, ensure_schema
+from tracing import tracer
+
+
+class ComponentRegistry:
+    """
+    Lazily builds and caches the retrieval components of the process.
+
+    All accessors are thread-safe: Streamlit serves sessions from several threads
+    and the first requests may race to build the same component.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._embeddings: Dict[str, Embeddings] = {}
+        self._engines: Dict[str, Tuple[Engine, AsyncEngine]] = {}
+        self._retrievers: Dict[Tuple[str, str, bool, bool, str], MultiVectorRetriever] = {}
+        self._async_retrievers: Dict[Tuple[str, str, bool, bool, str], MultiVectorRetriever] = {}
+        self._rerankers: Dict[str, Optional[Reranker]] = {}
+        self._answer_caches: Dict[Tuple[str, str], SemanticAnswerCache] = {}
+
+    def embeddings(self, model_name: str = EMBEDDING_MODEL_NAME) -> Embeddings:
+        """
+        Return the embedding model, loading it on first use.
+
+        The model sits behind the on-disk embedding cache, so re-ingesting unchanged
+        chunks does not run it again. With QUERY_MICRO_BATCHING, the questions of
+        concurrent requests are embedded together (see batching.py).
+
+        Args:
+            model_name (str): Sentence-transformers model name.
+
+        Returns:
+            Embeddings: The shared embedding model.
+        """
+        with self._lock:
+            if model_name not in self._embeddings:
+                from langchain_huggingface import HuggingFaceEmbeddings
+
+                logger.info(f"Loading embedding model: {model_name}")
+                model: Embeddings = HuggingFaceEmbeddings(
+                    model_name=model_name,
+                    encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE},
+                )
+                if QUERY_MICRO_BATCHING:
+                    model = MicroBatchEmbeddings(model)
+                self._embeddings[model_name] = CachedEmbeddings(model, model_name)
+                tracer.register_cache(f"embeddings:{model_name}", self._embeddings[model_name])
+            return self._embeddings[model_name]
+
+    def engines(self, conninfo: str = CONNECTION_STRING) -> Tuple[Engine, AsyncEngine]:
+        """
+        Return the sync and async engines for a connection string.
+
+        The docstore schema is created once, when the engines are first built.
+
+        Args:
+            conninfo (str): SQLAlchemy connection string.
+
+        Returns:
+            Tuple[Engine, AsyncEngine]: The shared engines and their connection pools.
+        """
+        with self._lock:
+            if conninfo not in self._engines:
+                logger.info("Creating database engines")
+                engine = create_engine(
+                    conninfo,
+                    pool_size=PG_POOL_SIZE,
+                    max_overflow=PG_MAX_OVERFLOW,
+                    pool_pre_ping=True,
+                )
+                async_engine = create_async_engine(
+                    conninfo,
+                    pool_size=PG_POOL_SIZE,
+                    max_overflow=PG_MAX_OVERFLOW,
+                    pool_pre_ping=True,
+                )
+                Base.metadata.create_all(engine)
+                ensure_schema(engine)
+                self._engines[conninfo] = (engine, async_engine)
+            return self._engines[conninfo]
+
+    def retriever(
+        self,
+        collection_name: str = COLLECTION_NAME,
+        conninfo: str = CONNECTION_STRING,
+        local_index: bool = False,
+        hybrid: bool = False,
+        rerank: str = "none",
+    ) -> MultiVectorRetriever:
+        """
+        Return the MultiVectorRetriever of a collection, building it on first use.
+
+        Args:
+            collection_name (str): PGVector collection and docstore collection name.
+            conninfo (str): SQLAlchemy connection string.
+            local_index (bool): Search the local ANN index of the collection (see
+                ann_index.py) instead of PGVector. Such a retriever is read-only: ingestion
+                must use the PGVector one. Falls back to PGVector if no index was built.
+            hybrid (bool): Fuse the vector search with the BM25 index of the collection
+                (see hybrid.py). Read-only too; falls back to vector search if no BM25
+                index was built.
+            rerank (str): Reranker of the over-fetched chunks (see rerank.py), "none"
+                to return the vector search order.
+
+        Returns:
+            MultiVectorRetriever: Retriever backed by PGVector and PostgresByteStore.
+        """
+        with self._lock:
+            cache_key = (conninfo, collection_name, local_index, hybrid, rerank)
+            if cache_key not in self._retrievers:
+                vectorstore = None
+                if local_index:
+                    vectorstore = self.local_vectorstore(collection_name)
+                if hybrid:
+                    if vectorstore is None:
+                        vectorstore = self.pgvector(collection_name, conninfo)
+                    vectorstore = self.hybrid_vectorstore(vectorstore, collection_name)
+                self._retrievers[cache_key] = build_retriever(
+                    self.embeddings(), *self.engines(conninfo), collection_name, conninfo,
+                    vectorstore=vectorstore, reranker=self.reranker(rerank),
+                )
+            return self._retrievers[cache_key]
+
+    def async_retriever(
+        self,
+        collection_name: str = COLLECTION_NAME,
+        conninfo: str = CONNECTION_STRING,
+        local_index: bool = False,
+        hybrid: bool = False,
+        rerank: str = "none",
+    ) -> MultiVectorRetriever:
+        """
+        Return a retriever for `ainvoke`: PGVector runs in async mode on the shared
+        AsyncEngine and the docstore is read with `amget`, so no thread is blocked
+        on Postgres.
+
+        PGVector in async mode rejects sync calls, hence a separate retriever from
+        `retriever()`. Args are the same.
+        """
+        with self._lock:
+            cache_key = (conninfo, collection_name, local_index, hybrid, rerank)
+            if cache_key not in self._async_retrievers:
+                engine, async_engine = self.engines(conninfo)
+                vectorstore = self.local_vectorstore(collection_name) if local_index else None
+                if vectorstore is None:
+                    vectorstore = self.pgvector(collection_name, conninfo, async_mode=True)
+                if hybrid:
+                    vectorstore = self.hybrid_vectorstore(vectorstore, collection_name)
+                self._async_retrievers[cache_key] = build_retriever(
+                    self.embeddings(), engine, async_engine, collection_name, conninfo,
+                    vectorstore=vectorstore, reranker=self.reranker(rerank),
+                )
+            return self._async_retrievers[cache_key]
+
+    def answer_cache(
+        self,
+        collection_name: str = COLLECTION_NAME,
+        conninfo: str = CONNECTION_STRING,
+    ) -> Optional[SemanticAnswerCache]:
+        """
+        Return the semantic answer cache of a collection, or None if it is disabled.
+
+        The cache is cleared whenever the docstore collection changes, so answers
+        never outlive a re-ingestion.
+
+        Args:
+            collection_name (str): Collection the answers were retrieved from.
+            conninfo (str): SQLAlchemy connection string.
+
+        Returns:
+            SemanticAnswerCache: The shared answer cache.
+        """
+        if not ANSWER_CACHE_ENABLED:
+            return None
+        with self._lock:
+            cache_key = (conninfo, collection_name)
+            if cache_key not in self._answer_caches:
+                engine, async_engine = self.engines(conninfo)
+                docstore = PostgresByteStore(conninfo, collection_name, engine=engine, async_engine=async_engine)
+                self._answer_caches[cache_key] = SemanticAnswerCache(
+                    self.embeddings(), version_fn=docstore.collection_version
+                )
+                tracer.register_cache(f"answers:{collection_name}", self._answer_caches[cache_key])
+            return self._answer_caches[cache_key]
+
+    def local_vectorstore(self, collection_name: str = COLLECTION_NAME) -> Optional[LocalVectorStore]:
+        """
+        Load the local ANN index of a collection, or return None if it was never built.
+        """
+        path = index_path(collection_name)
+        if not os.path.isdir(path):
+            logger.warning(f"No local ANN index in {path}, falling back to PGVector")
+            return None
+        index = IVFIndex.load(path)
+        logger.info(f"Loaded local ANN index of {len(index)} chunks")
+        return LocalVectorStore(self.embeddings(), index)
+
+    def pgvector(self, collection_name: str = COLLECTION_NAME, conninfo: str = CONNECTION_STRING, async_mode: bool = False) -> VectorStore:
+        """
+        Build a PGVector store of a collection on the shared engines.
+        """
+        from langchain_postgres import PGVector
+
+        engine, async_engine = self.engines(conninfo)
+        return PGVector(
+            embeddings=self.embeddings(),
+            collection_name=collection_name,
+            connection=async_engine if async_mode else engine,
+            use_jsonb=True,
+            async_mode=async_mode,
+        )
+
+    def hybrid_vectorstore(self, dense: VectorStore, collection_name: str = COLLECTION_NAME) -> VectorStore:
+        """
+        Wrap a vectorstore with the BM25 index of a collection, or return it unchanged
+        if the index was never built.
+        """
+        path = bm25_index_path(collection_name)
+        if not os.path.isdir(path):
+            logger.warning(f"No BM25 index in {path}, falling back to vector search")
+            return dense
+        index = BM25Index.load(path)
+        logger.info(f"Loaded BM25 index of {len(index)} chunks")
+        return HybridVectorStore(dense, index)
+
+    def reranker(self, name: str = "none") -> Optional[Reranker]:
+        """
+        Return the shared reranker named `name`, loading its model on first use, or
+        None for "none". Sync and async retrievers share it, and its latency estimate.
+        """
+        with self._lock:
+            if name not in self._rerankers:
+                self._rerankers[name] = get_reranker(name)
+            return self._rerankers[name]
+
+    def close(self) -> None:
+        """
+        Dispose every connection pool and drop the cached components.
+        """
+        with self._lock:
+            for engine, async_engine in self._engines.values():
+                engine.dispose()
+                # Only release the pooled connections: no event loop is needed for that.
+                async_engine.sync_engine.dispose(close=False)
+            self._engines.clear()
+            self._retrievers.clear()
+            self._async_retrievers.clear()
+            self._answer_caches.clear()
+            self._rerankers.clear()
+            for embeddings in self._embeddings.values():
+                if isinstance(embeddings.embeddings, MicroBatchEmbeddings):
+                    embeddings.embeddings.close()
+            self._embeddings.clear()
+
+
+def build_retriever(
+    embeddings: Embeddings,
+    engine: Optional[Engine],
+    async_engine: Optional[AsyncEngine],
+    collection_name: str = COLLECTION_NAME,
+    conninfo: str = CONNECTION_STRING,
+    vectorstore: Optional[VectorStore] = None,
+    reranker: Optional[Reranker] = None,
+) -> MultiVectorRetriever:
+    """
+    Build a new MultiVectorRetriever from the given components.
+
+    Args:
+        embeddings (Embeddings): Embedding model used by the vectorstore.
+        engine (Engine): Shared sync engine, or None to let each store create its own.
+        async_engine (AsyncEngine): Shared async engine, or None.
+        collection_name (str): Collection name.
+        conninfo (str): SQLAlchemy connection string.
+        vectorstore (VectorStore): Vectorstore to search, defaults to PGVector.
+        reranker (Reranker): Reranks over-fetched chunks before the parents are loaded.
+
+    Returns:
+        MultiVectorRetriever: An instance of MultiVectorRetriever configured with
+        PGVector for vector storage and PostgresByteStore for document storage,
+        accepting per-query metadata filters (see metadata_filters.py).
+    """
+    logger.info("Initializing MultiVectorRetriever")
+    if vectorstore is None:
+        from langchain_postgres import PGVector
+
+        vectorstore = PGVector(
+            embeddings=embeddings,
+            collection_name=collection_name,
+            connection=engine if engine is not None else conninfo,
+            use_jsonb=True,
+        )
+    store = PostgresByteStore(conninfo, collection_name, engine=engine, async_engine=async_engine)
+    retriever = FilteredMultiVectorRetriever(
+        vectorstore=vectorstore,
+        docstore=store,
+        id_key=ID_KEY,
+        infer_filters=METADATA_FILTERS,
+        reranker=reranker,
+    )
+    logger.info("MultiVectorRetriever initialized successfully")
+    return retriever
+
+
+registry = ComponentRegistry()
+atexit.register(registry.close)
@@ -1,15 +1,17 @@
 """
   Renault Agent with different tools 
 """
+import functools
 from langchain_core.tools import tool
 from datetime import date
-from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain.agents import create_tool_calling_agent
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.prompts import MessagesPlaceholder
-import yfinance as yf
-from rag_app import get_response_with_sources
+from agent_executor import ParallelAgentExecutor
+from market_store import market_store
+from rag_app import get_cached_response_with_sources
 from retriever import get_retriever
-from config.settings import model
+from config.settings import get_model
 
 
 @tool
@@ -17,10 +19,7 @@ def company_information(ticker: str) -> dict:
     """Use this tool to retrieve company information like address, industry, sector, company officers, business summary, website,
     marketCap, current price, ebitda, total debt, total revenue, debt-to-equity, etc."""
 
-    ticker_obj = yf.Ticker(ticker)
-    ticker_info = ticker_obj.get_info()
-
-    return ticker_info
+    return market_store.snapshot("info", ticker)
 
 
 @tool
@@ -29,9 +28,7 @@ def last_dividend_and_earnings_date(ticker: str) -> dict:
     Use this tool to retrieve company's last dividend date and earnings release dates.
     It does not provide information about historical dividend yields.
     """
-    ticker_obj = yf.Ticker(ticker)
-
-    return ticker_obj.get_calendar()
+    return market_store.snapshot("calendar", ticker)
 
 
 @tool
@@ -40,8 +37,7 @@ def summary_of_mutual_fund_holders(ticker: str) -> dict:
     Use this tool to retrieve company's top mutual fund holders.
     It also returns their percentage of share, stock count and value of holdings.
     """
-    ticker_obj = yf.Ticker(ticker)
-    mf_holders = ticker_obj.get_mutualfund_holders()
+    mf_holders = market_store.latest("mutualfund_holders", ticker)
 
     return mf_holders.to_dict(orient="records")
 
@@ -52,8 +48,7 @@ def summary_of_institutional_holders(ticker: str) -> dict:
     Use this tool to retrieve company's top institutional holders.
     It also returns their percentage of share, stock count and value of holdings.
     """
-    ticker_obj = yf.Ticker(ticker)
-    inst_holders = ticker_obj.get_institutional_holders()
+    inst_holders = market_store.latest("institutional_holders", ticker)
 
     return inst_holders.to_dict(orient="records")
 
@@ -64,14 +59,11 @@ def stock_grade_updrages_downgrades(ticker: str) -> dict:
     Use this to retrieve grade ratings upgrades and downgrades details of particular stock.
     It'll provide name of firms along with 'To Grade' and 'From Grade' details. Grade date is also provided.
     """
-    ticker_obj = yf.Ticker(ticker)
-
     curr_year = date.today().year
 
-    upgrades_downgrades = ticker_obj.get_upgrades_downgrades()
-    upgrades_downgrades = upgrades_downgrades.loc[
-        upgrades_downgrades.index > f"{curr_year}-01-01"
-    ]
+    upgrades_downgrades = market_store.range("upgrades_downgrades", ticker, start=f"{curr_year}-01-01")
+    if upgrades_downgrades.empty:
+        return []
     upgrades_downgrades = upgrades_downgrades[
         upgrades_downgrades["Action"].isin(["up", "down"])
     ]
@@ -84,10 +76,22 @@ def stock_splits_history(ticker: str) -> dict:
     """
     Use this tool to retrieve company's historical stock splits data.
     """
-    ticker_obj = yf.Ticker(ticker)
-    hist_splits = ticker_obj.get_splits()
+    hist_splits = market_store.range("splits", ticker)
 
-    return hist_splits.to_dict()
+    return hist_splits["Stock Splits"].to_dict() if not hist_splits.empty else {}
+
+
+@tool
+def stock_price_history(ticker: str, start_date: str, end_date: str) -> dict:
+    """
+    Use this tool to retrieve daily closing prices of a stock or index between two dates (YYYY-MM-DD).
+    Use ticker RNO.PA for Renault and ^FCHI for the CAC40.
+    """
+    prices = market_store.range("prices", ticker, start=start_date, end=end_date)
+    if prices.empty:
+        return {}
+
+    return {day.strftime("%Y-%m-%d"): round(close, 2) for day, close in prices["Close"].items()}
 
 
 @tool
@@ -95,16 +99,14 @@ def stock_news(ticker: str) -> dict:
     """
     Use this to retrieve latest news articles discussing particular stock ticker.
     """
-    ticker_obj = yf.Ticker(ticker)
-
-    return ticker_obj.get_news()
+    return market_store.snapshot("news", ticker)
 
 
 @tool
 def company_retriever_tool(query: str) -> dict:
     """Use this tool to retrieve knowledge about Renault between 2020 and 2024 from the document database."""
     renault_retriever = get_retriever()
-    response = get_response_with_sources(renault_retriever, query)
+    response = get_cached_response_with_sources(renault_retriever, query)
 
     return response["response"]
 
@@ -117,9 +119,9 @@ tools = [
     summary_of_mutual_fund_holders,
     summary_of_institutional_holders,
     stock_grade_updrages_downgrades,
+    stock_price_history,
     stock_news,
 ]
-
 prompt = ChatPromptTemplate.from_messages(
     [
         (
@@ -137,6 +139,10 @@ prompt = ChatPromptTemplate.from_messages(
 )
 
 
-finance_agent = create_tool_calling_agent(model, tools, prompt)
-
-finance_agent_executor = AgentExecutor(agent=finance_agent, tools=tools, verbose=True)
+@functools.lru_cache(maxsize=None)
+def get_finance_agent_executor() -> ParallelAgentExecutor:
+    """
+    Return the finance agent, building it and its chat model on first use.
+    """
+    finance_agent = create_tool_calling_agent(get_model(), tools, prompt)
+    return ParallelAgentExecutor(agent=finance_agent, tools=tools, verbose=True)
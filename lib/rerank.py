@@ -0,0 +1,181 @@
+"""
+    Optional second retrieval stage: rerank over-fetched chunks before their parents
+    are loaded.
+
+    The vectorstore returns `candidates` chunks instead of the final few; a scorer
+    rescores them against the question in one batched CPU pass, and only the parents
+    of the `top_n` best chunks go to the LLM. Two scorers:
+    - CrossEncoderScorer: a small cross-encoder reading (question, chunk) pairs.
+      Most accurate, cost grows with the candidates' length.
+    - LateInteractionScorer: MaxSim between the token embeddings of the question and
+      of the chunks (ColBERT-style), with the chunk token embeddings cached, so a
+      chunk is only encoded the first time it is a candidate.
+
+    The stage keeps a moving average of the scoring time per candidate and reranks
+    fewer candidates when the full depth would exceed the latency budget.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config.logger import logger
+from config.settings import (
+    EMBEDDING_MODEL_NAME,
+    RERANK_CANDIDATES,
+    RERANK_LATENCY_BUDGET_MS,
+    RERANK_MODEL,
+    RERANK_TOKEN_CACHE_SIZE,
+    RERANK_TOP_N,
+)
+
+
+class CrossEncoderScorer:
+    """
+    Scores (question, chunk) pairs with a sentence-transformers CrossEncoder.
+
+    Args:
+        model_name (str): Cross-encoder model, multilingual by default for the French corpus.
+        max_length (int): Tokens per pair, longer chunks are truncated.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name: str = RERANK_MODEL, max_length: int = 256) -> None:
+        from sentence_transformers import CrossEncoder
+
+        logger.info(f"Loading cross-encoder {model_name}")
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+
+    def score(self, query: str, texts: Sequence[str]) -> np.ndarray:
+        pairs = [(query, text) for text in texts]
+        return np.asarray(self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False))
+
+
+class LateInteractionScorer:
+    """
+    MaxSim over token embeddings of the embedding model: each question token is
+    matched with its most similar chunk token, and the similarities are summed.
+
+    Args:
+        model_name (str): Sentence-transformers model producing the token embeddings.
+        cache_size (int): Chunks whose token embeddings are kept in memory.
+    """
+
+    name = "late-interaction"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, cache_size: int = RERANK_TOKEN_CACHE_SIZE) -> None:
+        from sentence_transformers import SentenceTransformer
+
+        logger.info(f"Loading {model_name} for late-interaction reranking")
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _token_embeddings(self, texts: Sequence[str]) -> List[np.ndarray]:
+        vectors = self.model.encode(
+            list(texts), output_value="token_embeddings", batch_size=len(texts), show_progress_bar=False
+        )
+        vectors = [v.float().cpu().numpy() for v in vectors]
+        # Normalized rows: the dot products below are cosine similarities.
+        return [v / np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-12) for v in vectors]
+
+    def _chunk_embeddings(self, texts: Sequence[str]) -> List[np.ndarray]:
+        keys = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        with self._lock:
+            cached = {key: self._cache[key] for key in keys if key in self._cache}
+            for key in cached:
+                self._cache.move_to_end(key)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        if missing:
+            for i, vectors in zip(missing, self._token_embeddings([texts[i] for i in missing])):
+                cached[keys[i]] = vectors
+            with self._lock:
+                for i in missing:
+                    self._cache[keys[i]] = cached[keys[i]]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [cached[key] for key in keys]
+
+    def score(self, query: str, texts: Sequence[str]) -> np.ndarray:
+        query_vectors = self._token_embeddings([query])[0]
+        return np.asarray([float((query_vectors @ chunk.T).max(axis=1).sum()) for chunk in self._chunk_embeddings(texts)])
+
+
+SCORERS = {CrossEncoderScorer.name: CrossEncoderScorer, LateInteractionScorer.name: LateInteractionScorer}
+
+
+class Reranker:
+    """
+    Reranks over-fetched chunks within a latency budget.
+
+    Args:
+        scorer: Object with a `score(query, texts) -> np.ndarray` method.
+        candidates (int): Chunks fetched from the vectorstore and rescored.
+        top_n (int): Chunks kept after reranking.
+        latency_budget_ms (float): Target scoring time per query. When the full depth
+            would exceed it, only the first candidates (in retrieval order) are
+            rescored, never fewer than `top_n`. 0 disables the budget.
+    """
+
+    def __init__(
+        self,
+        scorer,
+        candidates: int = RERANK_CANDIDATES,
+        top_n: int = RERANK_TOP_N,
+        latency_budget_ms: float = RERANK_LATENCY_BUDGET_MS,
+    ) -> None:
+        self.scorer = scorer
+        self.candidates = candidates
+        self.top_n = top_n
+        self.latency_budget = latency_budget_ms / 1000
+        self._seconds_per_candidate: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def depth(self) -> int:
+        """
+        Number of candidates that can be rescored within the latency budget.
+        """
+        with self._lock:
+            per_candidate = self._seconds_per_candidate
+        if not self.latency_budget or per_candidate is None:
+            return self.candidates
+        return max(self.top_n, min(self.candidates, int(self.latency_budget / per_candidate)))
+
+    def rerank(self, query: str, docs: List[Document]) -> List[Document]:
+        """
+        Return the `top_n` best documents of `docs` (in retrieval order) for the query.
+        """
+        if len(docs) <= 1:
+            return docs[:self.top_n]
+        depth = self.depth()
+        head, tail = docs[:depth], docs[depth:]
+        start = time.perf_counter()
+        scores = self.scorer.score(query, [doc.page_content for doc in head])
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            per_candidate = elapsed / len(head)
+            previous = self._seconds_per_candidate
+            self._seconds_per_candidate = per_candidate if previous is None else 0.8 * previous + 0.2 * per_candidate
+        if tail:
+            logger.debug(f"Reranked {len(head)}/{len(docs)} candidates to stay within the latency budget")
+        order = np.argsort(-scores, kind="stable")
+        # Candidates beyond the depth keep their retrieval order, after the reranked ones.
+        return ([head[i] for i in order] + tail)[:self.top_n]
+
+
+def get_reranker(name: str) -> Optional[Reranker]:
+    """
+    Build the reranker named by the RERANK setting, or None for "none".
+    """
+    if name == "none":
+        return None
+    if name not in SCORERS:
+        raise ValueError(f"Unknown reranker {name!r}, expected one of {['none', *SCORERS]}")
+    return Reranker(SCORERS[name]())
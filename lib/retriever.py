@@ -2,25 +2,43 @@
     Script to launch to update vectorstore and docstore
 """
 
-import uuid
-from typing import List
+import argparse
+import itertools
+from typing import Iterator, List
 
 from langchain_core.documents import Document
-from langchain_postgres import PGVector
 from langchain.retrievers.multi_vector import MultiVectorRetriever
-from langchain_huggingface import HuggingFaceEmbeddings
 
 from config.settings import (
     COLLECTION_NAME,
-    CONNECTION_STRING,
     DATA_EXTRACTED_PATH,
+    HYBRID_SEARCH,
     ID_KEY,
-    LOCAL_FILES,
+    LOCAL_ANN_INDEX,
+    RERANK,
     YOUTUBE_URLS,
+    local_files,
+)
+from registry import registry
+from ann_index import index_path, sync_from_pgvector
+from chunker import get_chunker
+from hybrid import bm25_index_path, sync_bm25_from_pgvector
+from metadata_filters import ensure_metadata_indexes
+from ingestion import (
+    IngestionBatch,
+    IngestionPlan,
+    IngestionPlanner,
+    StreamingIngestion,
+    apply_plan,
+    document_ids,
+    image_id,
+)
+from pipeline import Pipeline, Stage
+from get_unstructured_data_descriptions import (
+    generate_unstructured_data_descriptions,
+    iter_image_descriptions,
+    list_image_paths,
 )
-from store import PostgresByteStore
-from chunker import TextChunker
-from get_unstructured_data_descriptions import generate_unstructured_data_descriptions
 from extract_youtube_transcriptions import CustomYouTubeLoader
 from loaders import LocalPDFLoader
 from config.logger import logger
@@ -28,29 +46,19 @@ from config.logger import logger
 
 def get_retriever() -> MultiVectorRetriever:
     """
-    Initialize and return a MultiVectorRetriever.
+    Return the process-wide MultiVectorRetriever used to answer questions.
+
+    The embedding model and the database connection pools are loaded on the first
+    call and reused afterwards (see registry.ComponentRegistry). With LOCAL_ANN_INDEX
+    enabled, the search is served by the local ANN index instead of PGVector. With
+    HYBRID_SEARCH enabled, it is fused with a BM25 search (see hybrid.py). With
+    RERANK set, more chunks are fetched and reranked (see rerank.py).
 
     Returns:
         MultiVectorRetriever: An instance of MultiVectorRetriever configured with
         PGVector for vector storage and PostgresByteStore for document storage.
     """
-    embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    logger.info("Initializing MultiVectorRetriever")
-    embeddings = embedding_model
-    vectorstore = PGVector(
-        embeddings=embeddings,
-        collection_name=COLLECTION_NAME,
-        connection=CONNECTION_STRING,
-        use_jsonb=True,
-    )
-    store = PostgresByteStore(CONNECTION_STRING, COLLECTION_NAME)
-    retriever = MultiVectorRetriever(
-        vectorstore=vectorstore,
-        docstore=store,
-        id_key=ID_KEY,
-    )
-    logger.info("MultiVectorRetriever initialized successfully")
-    return retriever
+    return registry.retriever(local_index=LOCAL_ANN_INDEX, hybrid=HYBRID_SEARCH, rerank=RERANK)
 
 
 def load_all_documents() -> List[Document]:
@@ -62,76 +70,139 @@ def load_all_documents() -> List[Document]:
     """
     docs = []
     logger.info("Starting to load documents")
-    docs.extend(LocalPDFLoader(LOCAL_FILES[3:4]).load())
+    docs.extend(LocalPDFLoader(local_files()[3:4]).load())
     docs.extend(CustomYouTubeLoader(YOUTUBE_URLS).load())
     return docs
 
 
-def process_documents(docs: List[Document], retriever: MultiVectorRetriever) -> None:
+def process_documents(docs: List[Document], retriever: MultiVectorRetriever, dry_run: bool = False) -> IngestionPlan:
     """
     Process a list of documents by splitting them into chunks and adding them to the retriever.
 
+    Only documents that are new or whose content changed since the last run are
+    chunked and written; documents that disappeared from their source are removed.
+
     Args:
         docs (List[Document]): The list of documents to process.
         retriever (MultiVectorRetriever): The retriever to add the processed documents to.
+        dry_run (bool): Only report what would change.
+
+    Returns:
+        IngestionPlan: What was (or would be) changed.
     """
     logger.info(f"Processing {len(docs)} documents")
-    doc_ids = [str(uuid.uuid4()) for _ in docs]
-    # Split text into chunks
-    splitter = TextChunker(chunk_size=500, chunk_overlap=50)
-    chunks = splitter.split_text(docs, doc_ids)
-    logger.info(f"Split documents into {len(chunks)} chunks")
-
-    logger.info("Adding chunks to vectorstore")
-    retriever.vectorstore.add_documents(chunks)
-    
-    logger.info("Updating docstore")
     items = [
         (doc_id, doc, doc.metadata.get("source", "unknown_file"))
-        for doc_id, doc in zip(doc_ids, docs)
+        for doc_id, doc in zip(document_ids(docs), docs)
     ]
-    retriever.docstore.mset(items)
+    splitter = get_chunker()
+    plan = IngestionPlanner(retriever.docstore, splitter.fingerprint).plan(items)
+
+    chunks = []
+    if plan.to_write and not dry_run:
+        # Split text into chunks
+        chunks = splitter.split(
+            [doc for _, doc, _ in plan.to_write], [doc_id for doc_id, _, _ in plan.to_write]
+        )
+        logger.info(f"Split documents into {len(chunks)} chunks")
+
+    apply_plan(plan, retriever, chunks, dry_run=dry_run)
     logger.info("Document processing completed")
+    return plan
 
 
-def process_images(retriever: MultiVectorRetriever) -> None:
+def process_images(retriever: MultiVectorRetriever, dry_run: bool = False) -> IngestionPlan:
     """
     Process images by generating descriptions and adding them to the retriever.
 
     Args:
         retriever (MultiVectorRetriever): The retriever to add the processed images to.
+        dry_run (bool): Only report what would change.
+
+    Returns:
+        IngestionPlan: What was (or would be) changed.
     """
     logger.info("Starting image processing")
     encoded_images, img_descriptions = generate_unstructured_data_descriptions(DATA_EXTRACTED_PATH)
     logger.info(f"Generated descriptions for {len(encoded_images)} images")
 
-    img_ids = [str(uuid.uuid4()) for _ in encoded_images]
+    items = [(image_id(filename), img, filename) for filename, img in encoded_images.items()]
+    plan = IngestionPlanner(retriever.docstore).plan(items)
 
-    logger.info("Adding image summaries to vectorstore")
+    descriptions = {image_id(filename): summary for filename, summary in zip(encoded_images, img_descriptions)}
     summary_img = [
-        Document(page_content=summary, metadata={ID_KEY: img_id})
-        for img_id, summary in zip(img_ids, img_descriptions)
+        Document(page_content=descriptions[img_id], metadata={ID_KEY: img_id})
+        for img_id, _, _ in plan.to_write
     ]
-    retriever.vectorstore.add_documents(summary_img)
-
-    logger.info("Adding images to docstore")
-    items = [
-        (img_id, img, filename)
-        for img_id, (filename, img) in zip(img_ids, encoded_images.items())
-    ]
-    retriever.docstore.mset(items)
+    apply_plan(plan, retriever, summary_img, dry_run=dry_run)
     logger.info("Image processing completed")
+    return plan
+
+
+def iter_sources() -> Iterator[IngestionBatch]:
+    """
+    Stream the sources to ingest: one batch per PDF file or YouTube video, then
+    the extracted images a batch at a time.
+
+    Yields:
+        IngestionBatch: Parents of one source, with deterministic IDs.
+    """
+    pdf_batches = LocalPDFLoader(local_files()[3:4]).iter_load()
+    youtube_batches = CustomYouTubeLoader(YOUTUBE_URLS).iter_load()
+    for docs in itertools.chain(pdf_batches, youtube_batches):
+        yield IngestionBatch(
+            items=[
+                (doc_id, doc, doc.metadata.get("source", "unknown_file"))
+                for doc_id, doc in zip(document_ids(docs), docs)
+            ]
+        )
+
+    for images in iter_image_descriptions(DATA_EXTRACTED_PATH):
+        yield IngestionBatch(
+            items=[(image_id(filename), img, filename) for filename, img, _ in images],
+            summaries={image_id(filename): summary for filename, _, summary in images},
+        )
+
+
+def list_sources() -> List[str]:
+    """
+    List every source of the corpus, as stored in the docstore: PDF paths, YouTube
+    URLs and extracted image paths. Stored parents of any other file are orphans.
+    """
+    return [*local_files()[3:4], *YOUTUBE_URLS.values(), *list_image_paths(DATA_EXTRACTED_PATH)]
 
 
 def main():
     """
     Main function to orchestrate the document and image processing workflow.
+
+    Sources are streamed through load -> chunk -> embed -> write stages with bounded
+    queues between them, so memory use does not grow with the corpus size.
     """
+    parser = argparse.ArgumentParser(description="Update the vectorstore and the docstore.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+
     logger.info("Starting main workflow")
-    retriever = get_retriever()
-    docs = load_all_documents()
-    process_documents(docs, retriever)
-    process_images(retriever)
+    retriever = registry.retriever()
+    ingestion = StreamingIngestion(retriever, get_chunker(), dry_run=args.dry_run, sources=list_sources())
+    pipeline = Pipeline(
+        [
+            Stage("chunk", ingestion.chunk),
+            Stage("embed", ingestion.embed),
+            Stage("write", ingestion.write),
+        ]
+    )
+    pipeline.run(iter_sources(), name="load")
+    ingestion.finish()
+    if not args.dry_run:
+        ensure_metadata_indexes(retriever.docstore.engine)
+    if LOCAL_ANN_INDEX and not args.dry_run:
+        index = sync_from_pgvector(retriever.docstore.engine, COLLECTION_NAME)
+        index.save(index_path(COLLECTION_NAME))
+    if HYBRID_SEARCH and not args.dry_run:
+        bm25 = sync_bm25_from_pgvector(retriever.docstore.engine, COLLECTION_NAME)
+        bm25.save(bm25_index_path(COLLECTION_NAME))
     logger.info("Main workflow completed")
 
 
@@ -0,0 +1,246 @@
+"""
+    Codecs for the values of the docstore.
+
+    Values are written in a compact, schema-tagged binary layout:
+
+        header  : b"RB" | version (1 byte) | tag (1 byte) | flags (1 byte)
+        payload : depends on the tag, optionally zstd-compressed as a whole
+
+    Tags:
+        DOCUMENT : >II (id length, metadata length) | id | metadata JSON | page_content
+        TEXT     : UTF-8 string
+        BASE64   : decoded bytes of a base64 string (images), re-encoded on read
+        PICKLE   : any other value (dicts, lists...), pickled like the legacy format
+
+    Metadata values must be JSON types, numpy scalars and arrays (stored as plain
+    numbers and lists) or dates and datetimes (tagged, decoded back to the same
+    type). Any other type raises a TypeError instead of being turned into a string.
+
+    Rows written before this format are pickles and are still read transparently.
+"""
+
+import base64
+import binascii
+import datetime
+import json
+import pickle
+import struct
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+from langchain_core.documents.base import Document
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+MAGIC = b"RB"
+VERSION = 1
+HEADER = struct.Struct(">2sBBB")
+DOCUMENT_LENGTHS = struct.Struct(">II")
+
+TAG_DOCUMENT = 1
+TAG_TEXT = 2
+TAG_BASE64 = 3
+TAG_PICKLE = 4
+
+FLAG_ZSTD = 1
+
+# Payloads smaller than this are not worth a compression frame.
+MIN_COMPRESSED_SIZE = 1024
+# Shorter strings are stored as text even if they happen to be valid base64.
+MIN_BASE64_SIZE = 256
+# Keys of the JSON objects standing for dates and datetimes in metadata.
+DATETIME_TAG = "$datetime"
+DATE_TAG = "$date"
+
+
+def encode_metadata_value(value: Any) -> Any:
+    """
+    `json.dumps` hook for the metadata values that are not JSON types.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    # datetime is a subclass of date, test it first.
+    if isinstance(value, datetime.datetime):
+        return {DATETIME_TAG: value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {DATE_TAG: value.isoformat()}
+    raise TypeError(f"Cannot store metadata value of type {type(value).__name__}")
+
+
+def decode_metadata_object(obj: Dict[str, Any]) -> Any:
+    """
+    `json.loads` hook turning the tagged objects back into dates and datetimes.
+    """
+    if len(obj) == 1:
+        if DATETIME_TAG in obj:
+            return datetime.datetime.fromisoformat(obj[DATETIME_TAG])
+        if DATE_TAG in obj:
+            return datetime.date.fromisoformat(obj[DATE_TAG])
+    return obj
+
+
+class Codec:
+    """
+    Turns docstore values into bytes and back.
+    """
+
+    name = "base"
+
+    def encode(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class PickleCodec(Codec):
+    """
+    The original docstore format: pickled values with dicts turned into sorted
+    OrderedDicts. Kept to read legacy rows and as a benchmark baseline.
+    """
+
+    name = "pickle"
+
+    def encode(self, value: Any) -> bytes:
+        return pickle.dumps(self.recursive_ordered_dict(value))
+
+    def decode(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+    def recursive_ordered_dict(self, obj):
+        if isinstance(obj, dict):
+            return OrderedDict((k, self.recursive_ordered_dict(v)) for k, v in sorted(obj.items()))
+        elif isinstance(obj, list):
+            return [self.recursive_ordered_dict(v) for v in obj]
+        else:
+            return obj
+
+
+class BinaryCodec(Codec):
+    """
+    Schema-tagged binary codec, with optional zstd compression.
+
+    Args:
+        compression: None, or "zstd" (requires the `zstandard` package).
+        level: zstd compression level.
+        legacy: Codec used for rows that do not start with the magic bytes.
+    """
+
+    name = "binary"
+
+    def __init__(self, compression: Optional[str] = None, level: int = 3, legacy: Optional[Codec] = None):
+        if compression not in (None, "zstd"):
+            raise ValueError(f"Unsupported docstore compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("zstd compression requires the `zstandard` package: pip install zstandard")
+        self.compression = compression
+        self.level = level
+        self.legacy = legacy if legacy is not None else PickleCodec()
+        self.legacy_pickle = PickleCodec()
+
+    def encode(self, value: Any) -> bytes:
+        if isinstance(value, Document):
+            tag, payload = TAG_DOCUMENT, self._encode_document(value)
+        elif isinstance(value, str):
+            tag, payload = self._encode_string(value)
+        else:
+            # Values the legacy pickle store accepted keep working, explicitly tagged.
+            tag, payload = TAG_PICKLE, self.legacy_pickle.encode(value)
+
+        flags = 0
+        if self.compression == "zstd" and len(payload) >= MIN_COMPRESSED_SIZE:
+            # zstd compressors are not thread-safe, create one per call.
+            payload = zstandard.ZstdCompressor(level=self.level).compress(payload)
+            flags |= FLAG_ZSTD
+        return HEADER.pack(MAGIC, VERSION, tag, flags) + payload
+
+    def decode(self, data: bytes) -> Any:
+        if not is_encoded(data):
+            return self.legacy.decode(data)
+        _, version, tag, flags = HEADER.unpack_from(data)
+        if version > VERSION:
+            raise ValueError(f"Docstore value written by a newer format version ({version})")
+        payload = memoryview(data)[HEADER.size :]
+        if flags & FLAG_ZSTD:
+            if zstandard is None:
+                raise ImportError("Reading zstd-compressed values requires the `zstandard` package")
+            payload = memoryview(zstandard.ZstdDecompressor().decompress(payload))
+
+        if tag == TAG_DOCUMENT:
+            return self._decode_document(payload)
+        if tag == TAG_TEXT:
+            return str(payload, "utf-8")
+        if tag == TAG_BASE64:
+            return base64.b64encode(payload).decode("ascii")
+        if tag == TAG_PICKLE:
+            return self.legacy_pickle.decode(bytes(payload))
+        raise ValueError(f"Unknown docstore value tag: {tag}")
+
+    @staticmethod
+    def _encode_document(doc: Document) -> bytes:
+        doc_id = (doc.id or "").encode("utf-8")
+        metadata = json.dumps(
+            doc.metadata, sort_keys=True, ensure_ascii=False, default=encode_metadata_value
+        ).encode("utf-8")
+        return b"".join(
+            [
+                DOCUMENT_LENGTHS.pack(len(doc_id), len(metadata)),
+                doc_id,
+                metadata,
+                doc.page_content.encode("utf-8"),
+            ]
+        )
+
+    @staticmethod
+    def _decode_document(payload: memoryview) -> Document:
+        id_length, metadata_length = DOCUMENT_LENGTHS.unpack_from(payload)
+        start = DOCUMENT_LENGTHS.size
+        doc_id = str(payload[start : start + id_length], "utf-8") or None
+        start += id_length
+        metadata = json.loads(bytes(payload[start : start + metadata_length]), object_hook=decode_metadata_object)
+        page_content = str(payload[start + metadata_length :], "utf-8")
+        # The fields were validated when the document was written, skip pydantic validation.
+        return Document.model_construct(id=doc_id, page_content=page_content, metadata=metadata)
+
+    @staticmethod
+    def _encode_string(value: str):
+        if len(value) >= MIN_BASE64_SIZE:
+            try:
+                raw = base64.b64decode(value, validate=True)
+            except (binascii.Error, ValueError):
+                raw = None
+            # Only keep the binary form if it gives back the exact same string.
+            if raw is not None and base64.b64encode(raw).decode("ascii") == value:
+                return TAG_BASE64, raw
+        return TAG_TEXT, value.encode("utf-8")
+
+
+def is_encoded(data: bytes) -> bool:
+    """
+    Tell whether a stored value uses the binary format (and not a legacy pickle).
+    """
+    return data[:2] == MAGIC
+
+
+def get_codec(name: str = "binary", compression: Optional[str] = None) -> Codec:
+    """
+    Return a codec by name.
+
+    Args:
+        name (str): "binary" or "pickle".
+        compression (str): Compression of the binary codec, None or "zstd".
+
+    Returns:
+        Codec: The codec.
+    """
+    if name == BinaryCodec.name:
+        return BinaryCodec(compression=compression)
+    if name == PickleCodec.name:
+        return PickleCodec()
+    raise ValueError(f"Unknown docstore codec: {name}")
@@ -0,0 +1,96 @@
+"""
+    Client of the retrieval service (rag_service.py), for the Streamlit app.
+
+    With RAG_SERVICE_URL set, the app sends questions to the service instead of
+    loading the models and the retriever itself. Only the standard library and
+    langchain_core's Document are imported, so a thin client starts fast.
+"""
+
+import json
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from config.settings import RAG_SERVICE_TIMEOUT, RAG_SERVICE_URL
+
+
+class ServiceError(RuntimeError):
+    """Raised when the service answers with an error or cannot be reached."""
+
+
+class RAGServiceClient:
+    """
+    Calls the endpoints of the retrieval service.
+
+    Args:
+        url (str): Base URL of the service, like "http://localhost:8600".
+        timeout (float): Seconds to wait for a response.
+    """
+
+    def __init__(self, url: str = RAG_SERVICE_URL, timeout: float = RAG_SERVICE_TIMEOUT) -> None:
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path: str, payload: Optional[dict] = None) -> Dict[str, Any]:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(
+            f"{self.url}{path}", data=data, headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise ServiceError(f"{path} failed with {e.code}: {e.read().decode('utf-8', 'replace')}") from e
+        except urllib.error.URLError as e:
+            raise ServiceError(f"Cannot reach the service at {self.url}: {e.reason}") from e
+
+    @staticmethod
+    def _context(payload: Dict[str, Any]) -> Dict[str, Any]:
+        context = dict(payload)
+        context["texts"] = [Document(**doc) for doc in payload["texts"]]
+        return context
+
+    def health(self) -> Dict[str, Any]:
+        return self._request("/health")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self._request("/embed", {"texts": texts})["embeddings"]
+
+    def retrieve(self, question: str, filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Retrieve the context of a question.
+
+        Returns:
+            dict: "texts" (Documents) and "images" (base64 JPEG thumbnails), like `parse_docs`.
+        """
+        payload = {"question": question, "filter": filter} if filter else {"question": question}
+        return self._context(self._request("/retrieve", payload))
+
+    def answer(self, question: str) -> Dict[str, Any]:
+        """
+        Answer a question with the RAG chain of the service.
+
+        Returns:
+            dict: "question", "response" and "context", like `get_cached_response_with_sources`.
+        """
+        response = self._request("/answer", {"question": question})
+        response["context"] = self._context(response["context"])
+        return response
+
+    def agent(self, question: str) -> Dict[str, Any]:
+        """
+        Answer a question with the finance agent of the service.
+
+        Returns:
+            dict: The agent's "output".
+        """
+        return self._request("/agent", {"question": question})
+
+
+def get_service_client() -> Optional[RAGServiceClient]:
+    """
+    Return a client of the service at RAG_SERVICE_URL, or None to run everything in process.
+    """
+    return RAGServiceClient() if RAG_SERVICE_URL else None
@@ -1,12 +1,20 @@
-from sqlalchemy import create_engine, Column, String, LargeBinary, select, delete
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, Column, String, LargeBinary, select, delete, or_, case, inspect, null, text
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.ext.declarative import declarative_base
-import pickle
+import base64
+import binascii
 import hashlib
-from collections import OrderedDict
 from langchain_core.stores import BaseStore
 from langchain_core.documents.base import Document
+from config.settings import DOCSTORE_BATCH_SIZE, DOCSTORE_CODEC, DOCSTORE_COMPRESSION, DOCSTORE_WORKERS
+from serialization import get_codec, is_encoded
+from images import ImageHandle, SIGNATURE_B64_LENGTH, image_format, make_thumbnail
+from tracing import tracer
 
 Base = declarative_base()
 
@@ -17,17 +25,69 @@ class ByteStore(Base):
     value = Column(LargeBinary)
     value_hash = Column(String)
     filename = Column(String, nullable=True)  
-    
+    kind = Column(String, nullable=True)  # "document", "text" or "image"
+    thumbnail = Column(LargeBinary, nullable=True)
+
+
+def ensure_schema(engine):
+    """
+    Add the columns of newer versions to a bytestore table created by an older one.
+    """
+    existing = {column["name"] for column in inspect(engine).get_columns(ByteStore.__tablename__)}
+    with engine.begin() as connection:
+        for column in ByteStore.__table__.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {ByteStore.__tablename__} ADD COLUMN {column.name} {column_type}"))
+
+
+def value_kind(value):
+    """
+    Return the kind tag of a docstore value: "document", "image" (base64 image) or "text".
+    """
+    if isinstance(value, Document):
+        return "document"
+    if isinstance(value, str) and image_format(_b64_prefix(value)) is not None:
+        return "image"
+    return "text"
+
+
+def _b64_prefix(value):
+    try:
+        return base64.b64decode(value[:SIGNATURE_B64_LENGTH])
+    except (binascii.Error, ValueError):
+        return b""
+
+
 class PostgresByteStore(BaseStore):
-    def __init__(self, conninfo, collection_name):
+    def __init__(self, conninfo, collection_name, engine=None, async_engine=None, codec=None,
+                 batch_size=DOCSTORE_BATCH_SIZE, workers=DOCSTORE_WORKERS):
+        """
+        Args:
+            conninfo: SQLAlchemy connection string.
+            collection_name: Name of the collection the keys belong to.
+            engine: Optional shared sync engine. When given, the schema is expected
+                to exist already (see registry.ComponentRegistry.engines).
+            async_engine: Optional shared async engine.
+            codec: serialization.Codec used for the values. Defaults to the binary
+                codec configured by DOCSTORE_CODEC and DOCSTORE_COMPRESSION.
+            batch_size: Number of rows per upsert statement in mset/amset.
+            workers: Number of threads serializing and hashing the rows.
+        """
         self.conninfo = conninfo
         self.collection_name = collection_name
+        self.codec = codec if codec is not None else get_codec(DOCSTORE_CODEC, DOCSTORE_COMPRESSION)
+        self.batch_size = batch_size
+        self.workers = workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
 
-        self.engine = create_engine(conninfo)
-        self.async_engine = create_async_engine(conninfo)
+        self.engine = engine if engine is not None else create_engine(conninfo)
+        self.async_engine = async_engine if async_engine is not None else create_async_engine(conninfo)
 
-        Base.metadata.bind = self.engine
-        Base.metadata.create_all(self.engine)
+        if engine is None:
+            Base.metadata.create_all(self.engine)
+            ensure_schema(self.engine)
 
         self.Session = scoped_session(sessionmaker(bind=self.engine))
         self.async_session_factory = sessionmaker(self.async_engine, class_=AsyncSession, expire_on_commit=False)
@@ -37,15 +97,10 @@ class PostgresByteStore(BaseStore):
         return hash_obj.hexdigest()
 
     def serialize_value(self, value):
-        return pickle.dumps(self.recursive_ordered_dict(value))
+        return self.codec.encode(value)
 
-    def recursive_ordered_dict(self, obj):
-        if isinstance(obj, dict):
-            return OrderedDict((k, self.recursive_ordered_dict(v)) for k, v in sorted(obj.items()))
-        elif isinstance(obj, list):
-            return [self.recursive_ordered_dict(v) for v in obj]
-        else:
-            return obj
+    def deserialize_value(self, data):
+        return self.codec.decode(data)
 
     def extract_hashable_content(self, value):
         if isinstance(value, Document):
@@ -58,50 +113,270 @@ class PostgresByteStore(BaseStore):
     def get(self, key):
         with self.Session() as session:
             result = session.execute(select(ByteStore).filter_by(collection_name=self.collection_name, key=key)).scalar()
-            return pickle.loads(result.value) if result else None
+            return self.deserialize_value(result.value) if result else None
 
     def set(self, key, value, filename=None):
-        with self.Session() as session:
-            serialized_value = self.serialize_value(value)
-            hashable_content = self.extract_hashable_content(value)
-            entry = ByteStore(
-                collection_name=self.collection_name,
-                key=key,
-                value=serialized_value,
-                value_hash=self.compute_hash(hashable_content),
-                filename=filename  
-            )
-            session.merge(entry)
-            session.commit()
+        self.mset([(key, value, filename)])
 
     def mget(self, keys):
-        results = {}
-        with self.Session() as session:
-            query_results = session.execute(select(ByteStore).where(ByteStore.collection_name == self.collection_name, ByteStore.key.in_(keys))).scalars()
-            for result in query_results:
-                results[result.key] = pickle.loads(result.value)
+        with tracer.span("docstore.mget", keys=len(keys)) as span:
+            with self.Session() as session:
+                rows = session.execute(select(ByteStore).where(ByteStore.collection_name == self.collection_name, ByteStore.key.in_(keys))).scalars().all()
+            return self.decode_rows(keys, rows, span)
+
+    def decode_rows(self, keys, rows, span):
+        if tracer.enabled:
+            span.set(rows=len(rows), bytes=sum(len(row.value) for row in rows))
+        with tracer.span("docstore.decode"):
+            results = {row.key: self.deserialize_value(row.value) for row in rows}
         return [results.get(key) for key in keys]
 
-    def mset(self, items):
-        with self.Session() as session:
-            for key, value, filename in items:
-                serialized_value = self.serialize_value(value)
-                hashable_content = self.extract_hashable_content(value)
-                entry = ByteStore(
-                    collection_name=self.collection_name,
-                    key=key,
-                    value=serialized_value,
-                    value_hash=self.compute_hash(hashable_content),
-                    filename=filename  
-                )
-                session.merge(entry)
+    def handles_query(self, keys):
+        # The value of image rows stays in the database: only their thumbnail is read.
+        return select(
+            ByteStore.key,
+            ByteStore.kind,
+            ByteStore.value_hash,
+            ByteStore.filename,
+            ByteStore.thumbnail,
+            case((ByteStore.kind == "image", null()), else_=ByteStore.value).label("value"),
+        ).where(ByteStore.collection_name == self.collection_name, ByteStore.key.in_(keys))
+
+    def to_handle(self, row):
+        if row.kind == "image":
+            return ImageHandle(row.key, row.value_hash, row.thumbnail, self.mget, {"filename": row.filename})
+        value = self.deserialize_value(row.value)
+        if row.kind is None and value_kind(value) == "image":
+            # Row written before images were tagged: the payload is already here.
+            handle = ImageHandle(row.key, row.value_hash, None, self.mget, {"filename": row.filename})
+            handle._payload = value
+            return handle
+        return value
+
+    def mget_handles(self, keys):
+        """
+        Like mget, but image values are returned as lazy ImageHandles carrying
+        their thumbnail: the full images are only fetched if a prompt needs them.
+        """
+        with tracer.span("docstore.mget_handles", keys=len(keys)) as span:
+            with self.Session() as session:
+                rows = session.execute(self.handles_query(keys)).all()
+            return self.handles_from_rows(keys, rows, span)
+
+    def handles_from_rows(self, keys, rows, span):
+        if tracer.enabled:
+            span.set(rows=len(rows), bytes=sum(len(row.value or b"") + len(row.thumbnail or b"") for row in rows))
+        with tracer.span("docstore.decode"):
+            results = {row.key: self.to_handle(row) for row in rows}
+        return [results.get(key) for key in keys]
+
+    def prepare_row(self, item):
+        key, value, *rest = item
+        kind = value_kind(value)
+        return {
+            "collection_name": self.collection_name,
+            "key": key,
+            "value": self.serialize_value(value),
+            # The caller may give the hash, like ingestion, which also hashes how the value is chunked.
+            "value_hash": rest[1] if len(rest) > 1 and rest[1] else self.compute_hash(self.extract_hashable_content(value)),
+            "filename": rest[0] if rest else None,
+            "kind": kind,
+            "thumbnail": self.thumbnail(value) if kind == "image" else None,
+        }
+
+    @staticmethod
+    def thumbnail(b64_image):
+        try:
+            return make_thumbnail(base64.b64decode(b64_image))
+        except Exception:
+            # Undecodable images are still stored, the full image is shown instead.
+            return None
+
+    @property
+    def executor(self):
+        """
+        Pool serializing and hashing the rows, created on the first write and shared
+        by mset and amset.
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="docstore")
+            return self._executor
+
+    def split_batches(self, items, batch_size=None):
+        batch_size = batch_size or self.batch_size
+        # Keep the last value of duplicated keys: a single INSERT ... ON CONFLICT
+        # statement cannot update the same row twice.
+        items = list({item[0]: item for item in items}.values())
+        return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+    def submit_batch(self, batch):
+        return [self.executor.submit(self.prepare_row, item) for item in batch]
+
+    def iter_prepared_batches(self, items, batch_size=None):
+        """
+        Serialize and hash items in the worker pool, one batch ahead of the caller.
+
+        Args:
+            items: (key, value, filename) tuples. (key, value) pairs are accepted too.
+            batch_size: Number of rows per batch, defaults to DOCSTORE_BATCH_SIZE.
+
+        Yields:
+            list: Rows ready to be upserted.
+        """
+        batches = self.split_batches(items, batch_size)
+        if not batches:
+            return
+        pending = self.submit_batch(batches[0])
+        for next_batch in batches[1:] + [[]]:
+            rows = [future.result() for future in pending]
+            pending = self.submit_batch(next_batch)
+            yield rows
+
+    async def aiter_prepared_batches(self, items, batch_size=None):
+        """
+        Async version of `iter_prepared_batches`: the event loop awaits the pool
+        instead of blocking on it while rows are serialized, hashed and thumbnailed.
+        """
+        batches = self.split_batches(items, batch_size)
+        if not batches:
+            return
+        pending = self.submit_batch(batches[0])
+        for next_batch in batches[1:] + [[]]:
+            rows = await asyncio.gather(*(asyncio.wrap_future(future) for future in pending))
+            pending = self.submit_batch(next_batch)
+            yield list(rows)
+
+    def upsert_statement(self):
+        insert = postgresql.insert if self.engine.dialect.name == "postgresql" else sqlite.insert
+        statement = insert(ByteStore)
+        return statement.on_conflict_do_update(
+            index_elements=[ByteStore.collection_name, ByteStore.key],
+            set_={
+                "value": statement.excluded.value,
+                "value_hash": statement.excluded.value_hash,
+                "filename": statement.excluded.filename,
+                "kind": statement.excluded.kind,
+                "thumbnail": statement.excluded.thumbnail,
+            },
+        )
+
+    def mset(self, items, batch_size=None):
+        """
+        Upsert items with batched INSERT ... ON CONFLICT DO UPDATE statements.
+
+        Args:
+            items: (key, value, filename) tuples. (key, value) pairs are accepted too.
+            batch_size: Number of rows per statement, defaults to DOCSTORE_BATCH_SIZE.
+        """
+        statement = self.upsert_statement()
+        with tracer.span("docstore.mset") as span, self.Session() as session:
+            for rows in self.iter_prepared_batches(items, batch_size):
+                self.trace_batch(span, rows)
+                session.execute(statement, rows)
             session.commit()
 
+    @staticmethod
+    def trace_batch(span, rows):
+        if tracer.enabled:
+            span.add("rows", len(rows))
+            span.add("bytes", sum(len(row["value"]) for row in rows))
+
     def mdelete(self, keys):
         with self.Session() as session:
             session.execute(delete(ByteStore).where(ByteStore.collection_name == self.collection_name, ByteStore.key.in_(keys)))
             session.commit()
 
+    def get_value_hashes(self, keys=None, filenames=None):
+        """
+        Return the stored content hash and filename of existing entries.
+
+        Args:
+            keys: Keys to look up.
+            filenames: Also return every entry stored under one of these filenames.
+
+        Returns:
+            dict: Mapping of key to a (value_hash, filename) tuple.
+        """
+        conditions = []
+        if keys:
+            conditions.append(ByteStore.key.in_(keys))
+        if filenames:
+            conditions.append(ByteStore.filename.in_(filenames))
+        if not conditions:
+            return {}
+        with self.Session() as session:
+            query = select(ByteStore.key, ByteStore.value_hash, ByteStore.filename).where(
+                ByteStore.collection_name == self.collection_name, or_(*conditions)
+            )
+            return {row.key: (row.value_hash, row.filename) for row in session.execute(query)}
+
+    def stored_filenames(self):
+        """
+        Return the distinct filenames of the entries of the collection.
+
+        Returns:
+            set: Filenames (source paths or URLs).
+        """
+        with self.Session() as session:
+            query = select(ByteStore.filename).where(ByteStore.collection_name == self.collection_name).distinct()
+            return {row.filename for row in session.execute(query)}
+
+    def collection_version(self):
+        """
+        Return a fingerprint of the collection, which changes whenever an entry is
+        added, updated or deleted.
+
+        Only keys and content hashes are read, the values stay in the database.
+
+        Returns:
+            str: Hex digest of the sorted (key, value_hash) pairs.
+        """
+        digest = hashlib.sha256()
+        with self.Session() as session:
+            query = (
+                select(ByteStore.key, ByteStore.value_hash)
+                .where(ByteStore.collection_name == self.collection_name)
+                .order_by(ByteStore.key)
+            )
+            for row in session.execute(query):
+                digest.update(f"{row.key}\0{row.value_hash}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def migrate_legacy_rows(self, batch_size=500, dry_run=False):
+        """
+        Re-encode the rows still stored as pickles with the current codec, and tag
+        the rows written before kinds and thumbnails.
+
+        Args:
+            batch_size: Number of rows rewritten per transaction.
+            dry_run: Only count the legacy rows.
+
+        Returns:
+            int: Number of legacy rows found.
+        """
+        migrated = 0
+        keys = list(self.yield_keys())
+        for start in range(0, len(keys), batch_size):
+            with self.Session() as session:
+                rows = session.execute(
+                    select(ByteStore).where(
+                        ByteStore.collection_name == self.collection_name,
+                        ByteStore.key.in_(keys[start:start + batch_size]),
+                    )
+                ).scalars()
+                for row in rows:
+                    if is_encoded(row.value) and row.kind is not None:
+                        continue
+                    migrated += 1
+                    if not dry_run:
+                        value = self.deserialize_value(row.value)
+                        row.value = self.serialize_value(value)
+                        row.kind = value_kind(value)
+                        row.thumbnail = self.thumbnail(value) if row.kind == "image" else None
+                session.commit()
+        return migrated
+
     def yield_keys(self, prefix=None):
         with self.Session() as session:
             query = select(ByteStore.key).where(ByteStore.collection_name == self.collection_name)
@@ -113,47 +388,35 @@ class PostgresByteStore(BaseStore):
     # Async methods
 
     async def aset(self, key, value, filename=None):
-        async with self.async_session_factory() as session:
-            serialized_value = self.serialize_value(value)
-            hashable_content = self.extract_hashable_content(value)
-            entry = ByteStore(
-                collection_name=self.collection_name,
-                key=key,
-                value=serialized_value,
-                value_hash=self.compute_hash(hashable_content),
-                filename=filename  
-            )
-            session.merge(entry)
-            await session.commit()
+        await self.amset([(key, value, filename)])
 
-    async def amset(self, items):
-        async with self.async_session_factory() as session:
-            for key, value, filename in items:
-                serialized_value = self.serialize_value(value)
-                hashable_content = self.extract_hashable_content(value)
-                entry = ByteStore(
-                    collection_name=self.collection_name,
-                    key=key,
-                    value=serialized_value,
-                    value_hash=self.compute_hash(hashable_content),
-                    filename=filename  
-                )
-                session.merge(entry)
-            await session.commit()
+    async def amset(self, items, batch_size=None):
+        statement = self.upsert_statement()
+        with tracer.span("docstore.mset") as span:
+            async with self.async_session_factory() as session:
+                async for rows in self.aiter_prepared_batches(items, batch_size):
+                    self.trace_batch(span, rows)
+                    await session.execute(statement, rows)
+                await session.commit()
 
     async def aget(self, key):
         async with self.async_session_factory() as session:
             result = await session.execute(select(ByteStore).filter_by(collection_name=self.collection_name, key=key))
             byte_store = result.scalars().first()
-            return pickle.loads(byte_store.value) if byte_store else None
+            return self.deserialize_value(byte_store.value) if byte_store else None
 
     async def amget(self, keys):
-        results = {}
-        async with self.async_session_factory() as session:
-            query_results = await session.execute(select(ByteStore).where(ByteStore.collection_name == self.collection_name, ByteStore.key.in_(keys)))
-            for result in query_results.scalars():
-                results[result.key] = pickle.loads(result.value)
-        return [results.get(key) for key in keys]
+        with tracer.span("docstore.mget", keys=len(keys)) as span:
+            async with self.async_session_factory() as session:
+                query_results = await session.execute(select(ByteStore).where(ByteStore.collection_name == self.collection_name, ByteStore.key.in_(keys)))
+                rows = query_results.scalars().all()
+            return self.decode_rows(keys, rows, span)
+
+    async def amget_handles(self, keys):
+        with tracer.span("docstore.mget_handles", keys=len(keys)) as span:
+            async with self.async_session_factory() as session:
+                rows = (await session.execute(self.handles_query(keys))).all()
+            return self.handles_from_rows(keys, rows, span)
 
     async def amdelete(self, keys):
         async with self.async_session_factory() as session:
@@ -0,0 +1,364 @@
+"""
+    Timing and tracing of the query path.
+
+    `tracer.span(name, **attributes)` times a block of code. Spans opened inside it,
+    in the same thread, task or copied context, become its children, and a span
+    without a parent is the root of a trace: one request. When a root ends, its trace
+    is appended as one JSON line to TRACE_FILE and kept in `tracer.recent`.
+
+    Durations, errors and payload sizes (the `bytes` attribute of the spans) are also
+    aggregated per span name, and exported with the hit rates of the registered caches
+    in the Prometheus text format by `tracer.prometheus()`, or on the /metrics
+    endpoint of `start_metrics_server` (/traces returns the recent traces as JSON).
+
+    With TRACING disabled, `span` returns a shared no-op span: the cost of an
+    instrumented block is one attribute check.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from config.logger import logger
+from config.settings import METRICS_HOST, METRICS_PORT, TRACE_BUFFER_SIZE, TRACE_FILE, TRACING
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    A timed block of a trace. Use `set` and `add` to attach attributes.
+    """
+
+    __slots__ = ("tracer", "name", "attributes", "trace_id", "span_id", "parent", "spans",
+                 "start_time", "_start", "duration", "error", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.duration = 0.0
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, key: str, value: float) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def __enter__(self) -> "Span":
+        self.parent = _current_span.get()
+        self.trace_id = self.parent.trace_id if self.parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        # Every span of a trace is collected in the list of its root.
+        self.spans: List[Span] = self.parent.spans if self.parent else []
+        self._token = _current_span.set(self)
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.duration = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Exited in another context than it was entered in (generator spans).
+            _current_span.set(self.parent)
+        self.spans.append(self)
+        self.tracer._record(self)
+        return False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "start": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """
+    Span returned when tracing is disabled.
+    """
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def add(self, key: str, value: float) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _SpanStats:
+    __slots__ = ("count", "errors", "seconds", "bytes", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+
+class Tracer:
+    """
+    Records spans, aggregates them per name, and exports metrics and traces.
+
+    Args:
+        enabled (bool): Record spans. When False, `span` returns a no-op span.
+        trace_file (str): JSON-lines file receiving one trace per root span, None to
+            only keep the traces in memory.
+        buffer_size (int): Number of recent traces kept in `recent`.
+    """
+
+    def __init__(self, enabled: bool = TRACING, trace_file: Optional[str] = TRACE_FILE or None, buffer_size: int = TRACE_BUFFER_SIZE) -> None:
+        self.enabled = enabled
+        self.trace_file = trace_file
+        self.recent: deque = deque(maxlen=buffer_size)
+        self._stats: Dict[str, _SpanStats] = {}
+        self._caches: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **attributes: Any):
+        """
+        Return a context manager timing a block as a span named `name`.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def current(self):
+        """
+        Return the innermost open span, or the no-op span.
+        """
+        span = _current_span.get() if self.enabled else None
+        return span or NOOP_SPAN
+
+    def traced(self, name: Optional[str] = None) -> Callable:
+        """
+        Decorator running every call of a function, sync or async, in a span.
+        """
+
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__qualname__
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    with Span(self, span_name, {}):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with Span(self, span_name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+
+        return decorator
+
+    def register_cache(self, name: str, cache: Any) -> None:
+        """
+        Export the hit rate of a cache with `hits` and `misses` counters. A cache
+        registered again under the same name replaces the previous one.
+        """
+        with self._lock:
+            self._caches[name] = cache
+
+    def _record(self, span: Span) -> None:
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = _SpanStats()
+            stats.count += 1
+            stats.seconds += span.duration
+            stats.errors += span.error is not None
+            stats.bytes += int(span.attributes.get("bytes", 0))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if span.duration <= bound:
+                    stats.buckets[i] += 1
+                    break
+        if span.parent is None:
+            self._finish_trace(span)
+
+    def _finish_trace(self, root: Span) -> None:
+        trace = {
+            "trace_id": root.trace_id,
+            "name": root.name,
+            "start": root.start_time,
+            "duration_ms": round(root.duration * 1000, 3),
+            "spans": [span.as_dict() for span in sorted(root.spans, key=lambda s: s.start_time)],
+        }
+        self.recent.append(trace)
+        if self.trace_file:
+            line = json.dumps(trace, default=str, ensure_ascii=False)
+            with self._lock:
+                os.makedirs(os.path.dirname(self.trace_file) or ".", exist_ok=True)
+                with open(self.trace_file, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            caches = dict(self._caches)
+        stats = {}
+        for name, cache in caches.items():
+            hits, misses = cache.hits, cache.misses
+            stats[name] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+        return stats
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return the aggregated metrics as a JSON-serializable dict.
+        """
+        with self._lock:
+            spans = {
+                name: {
+                    "count": s.count,
+                    "errors": s.errors,
+                    "mean_ms": s.seconds / s.count * 1000 if s.count else 0.0,
+                    "bytes": s.bytes,
+                }
+                for name, s in sorted(self._stats.items())
+            }
+        return {"spans": spans, "caches": self.cache_stats()}
+
+    def prometheus(self) -> str:
+        """
+        Return the aggregated metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP rag_span_duration_seconds Duration of the query-path stages.",
+            "# TYPE rag_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            stats = sorted((name, s.count, s.errors, s.seconds, s.bytes, list(s.buckets)) for name, s in self._stats.items())
+        for name, count, _, seconds, _, buckets in stats:
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, buckets):
+                cumulative += n
+                lines.append(f'rag_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'rag_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {count}')
+            lines.append(f'rag_span_duration_seconds_sum{{span="{name}"}} {seconds:.6f}')
+            lines.append(f'rag_span_duration_seconds_count{{span="{name}"}} {count}')
+        lines += ["# HELP rag_span_errors_total Stages that raised.", "# TYPE rag_span_errors_total counter"]
+        lines += [f'rag_span_errors_total{{span="{name}"}} {errors}' for name, _, errors, _, _, _ in stats]
+        lines += ["# HELP rag_payload_bytes_total Bytes read or produced by the stages.", "# TYPE rag_payload_bytes_total counter"]
+        lines += [f'rag_payload_bytes_total{{span="{name}"}} {size}' for name, _, _, _, size, _ in stats if size]
+        caches = self.cache_stats()
+        for metric, kind, help_ in [
+            ("hits", "counter", "Cache hits."),
+            ("misses", "counter", "Cache misses."),
+            ("hit_rate", "gauge", "Cache hit rate."),
+        ]:
+            name = f"rag_cache_{metric}_total" if kind == "counter" else f"rag_cache_{metric}"
+            lines += [f"# HELP {name} {help_}", f"# TYPE {name} {kind}"]
+            lines += [f'{name}{{cache="{cache}"}} {values[metric]}' for cache, values in sorted(caches.items())]
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+        self.recent.clear()
+
+
+tracer = Tracer()
+
+
+def traced_runnable(name: str, runnable: Runnable) -> Runnable:
+    """
+    Wrap a chain step so that its `invoke` and `ainvoke` run in a span. Returns the
+    step unchanged when tracing is disabled.
+    """
+    if not tracer.enabled:
+        return runnable
+
+    def invoke(input: Any, config: RunnableConfig) -> Any:
+        with tracer.span(name):
+            return runnable.invoke(input, config)
+
+    async def ainvoke(input: Any, config: RunnableConfig) -> Any:
+        with tracer.span(name):
+            return await runnable.ainvoke(input, config)
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=name)
+
+
+def run_in_context(func: Callable) -> Callable:
+    """
+    Bind a callable to the current context, so that spans it opens in a worker
+    thread are children of the current span.
+    """
+    if not tracer.enabled:
+        return func
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path == "/metrics":
+            body, content_type = tracer.prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+        elif self.path == "/traces":
+            body = json.dumps({"metrics": tracer.snapshot(), "traces": list(tracer.recent)}, default=str).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics and /traces on `host:port` from a daemon thread, once per process.
+    Does nothing if tracing is disabled or the port is 0.
+    """
+    global _metrics_server
+    if not tracer.enabled or not port:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
+            logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return _metrics_server
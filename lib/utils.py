@@ -4,12 +4,14 @@ Utility functions for file operations and image processing.
 """
 
 import base64
+import hashlib
 import io
 import re
 from typing import Any, Dict, Optional
-from IPython.display import display
 from PIL import Image
 from config.logger import logger
+from config.settings import PROMPT_IMAGE_SIZE
+from images import ImageHandle, SIGNATURE_B64_LENGTH, image_format, resize_cache
 from langchain.schema.document import Document
 
 
@@ -67,6 +69,8 @@ def display_base64_image(base64_code: str) -> None:
     Args:
         base64_code (str): Base64 encoded string of the image.
     """
+    from IPython.display import display
+
     try:
         image_data = base64.b64decode(base64_code)
         display(Image(data=image_data))
@@ -76,8 +80,19 @@ def display_base64_image(base64_code: str) -> None:
 
 def resize_base64_image(base64_string, size=(128, 128)):
     """
-    Resize an image encoded as a Base64 string
+    Resize an image encoded as a Base64 string, cached by content hash in the
+    shared resize cache: the same image is only decoded and resized once, and the
+    cache does not keep the multi-MB input strings alive.
     """
+    cache_key = ("b64:" + hashlib.sha256(base64_string.encode("ascii")).hexdigest(), tuple(size))
+    resized = resize_cache.get(cache_key)
+    if resized is None:
+        resized = _resize_base64_image(base64_string, size)
+        resize_cache.put(cache_key, resized)
+    return resized
+
+
+def _resize_base64_image(base64_string, size):
     # Decode the Base64 string
     img_data = base64.b64decode(base64_string)
     img = Image.open(io.BytesIO(img_data))
@@ -94,20 +109,12 @@ def resize_base64_image(base64_string, size=(128, 128)):
 
 def is_image_data(b64data):
     """
-    Check if the base64 data is an image by looking at the start of the data
+    Check if the base64 data is an image by looking at the start of the data.
+    Only the first characters are decoded, whatever the size of the image.
     """
-    image_signatures = {
-        b"\xFF\xD8\xFF": "jpg",
-        b"\x89\x50\x4E\x47\x0D\x0A\x1A\x0A": "png",
-        b"\x47\x49\x46\x38": "gif",
-        b"\x52\x49\x46\x46": "webp",
-    }
     try:
-        header = base64.b64decode(b64data)[:8]  # Decode and get the first 8 bytes
-        for sig, format in image_signatures.items():
-            if header.startswith(sig):
-                return True
-        return False
+        header = base64.b64decode(b64data[:SIGNATURE_B64_LENGTH])
+        return image_format(header) is not None
     except Exception:
         return False
     
@@ -126,10 +133,14 @@ def split_image_text_types(docs):
 
     for doc in docs:
         # Check if the document is of type Document and extract page_content if so
+        if isinstance(doc, ImageHandle):
+            b64_images.append(doc.prompt_b64(PROMPT_IMAGE_SIZE))
+            continue
         if isinstance(doc, Document):
             doc = doc.page_content
-        if looks_like_base64(doc) and is_image_data(doc):
-            doc = resize_base64_image(doc, size=(1300, 600))
+        # The prefix check is cheap, the regex scans the whole string.
+        if is_image_data(doc) and looks_like_base64(doc):
+            doc = resize_base64_image(doc, size=PROMPT_IMAGE_SIZE)
             b64_images.append(doc)
         else:
             texts.append(doc)
@@ -141,7 +152,7 @@ def parse_docs(docs):
     b64_images = []
     texts = []
     for doc in docs:
-        if isinstance(doc, str) and is_image_data(doc):
+        if isinstance(doc, ImageHandle) or (isinstance(doc, str) and is_image_data(doc)):
             b64_images.append(doc)
         else:
             texts.append(doc)